@@ -4,6 +4,9 @@ const Poll = require('../models/poll');
 const Contact = require('../models/contact');
 const LostItem = require('../models/LostItem');
 const { asyncHandler } = require('../utils/asyncHandler');
+const axios = require('axios');
+
+const ML_URL = process.env.ML_SERVICE_URL || (process.env.NODE_ENV === 'production' ? 'https://civix-ml.onrender.com' : 'http://localhost:8000');
 
 const getAdminAnalytics = asyncHandler(async (req, res) => {
     // --- 1. User Stats ---
@@ -157,6 +160,20 @@ const getAdminAnalytics = asyncHandler(async (req, res) => {
         insights.push(`⚠️ Primary Concern: '${topCat._id}' accounts for ${Math.round((topCat.count / totalIssues) * 100)}% of reports.`);
     }
 
+    // Insight 2b: Emerging Hotspots (incremental grid in the ML service, no issue rescan)
+    let hotspots = [];
+    try {
+        const hotspotRes = await axios.get(`${ML_URL}/api/hotspots/`, { params: { limit: 5 }, timeout: 3000 });
+        hotspots = hotspotRes.data.clusters || [];
+        const bursting = hotspots.filter(h => h.bursting);
+        if (bursting.length > 0) {
+            const top = bursting[0];
+            insights.push(`📍 Emerging Hotspot: ${Math.round(top.recent)} recent '${top.category}' reports near (${top.center.lat.toFixed(3)}, ${top.center.lng.toFixed(3)}).`);
+        }
+    } catch (err) {
+        console.error('[ML Hotspots] Unavailable:', err.message);
+    }
+
     // Insight 3: Unresolved Backlog
     if (pendingIssues > resolvedIssues && pendingIssues > 5) {
         insights.push(`🚨 Backlog Alert: ${pendingIssues} pending issues. Resolution pace needs to increase.`);
@@ -208,6 +225,7 @@ const getAdminAnalytics = asyncHandler(async (req, res) => {
             totalVotes: totalPollVotes,
             weeklyData: engagementData // Sending the real aggregation
         },
+        hotspots, // Top emerging clusters from the ML service
         recentActivity: activityFeed, // Sending real feed
         aiInsights: insights, // Sending generated insights
         contact: {
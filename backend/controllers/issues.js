@@ -60,7 +60,7 @@ const assignIssueToOfficer = async (issue, category) => {
 };
 
 const createIssue = asyncHandler(async (req, res) => {
-  const { title, description, phone, email, notifyByEmail, issueType, isPrivate, location, category, lat, lng } = req.body;
+  const { title, description, phone, email, notifyByEmail, issueType, isPrivate, location, category, lat, lng, draftToken } = req.body;
 
   console.log("Creating Issue - Request Body:", { title, description, email, phone }); // LOG 1
 
@@ -122,21 +122,37 @@ const createIssue = asyncHandler(async (req, res) => {
     const mlPayload = { title, description };
 
     // 2. Generate Embedding & Predictions
+    // The form analysed the draft while it was typed; if the text still matches, this does no model work
+    let pRes, fRes, eRes;
+    if (draftToken) {
+      try {
+        const { data } = await axios.post(`${ML_URL}/api/drafts/resolve/`, { ...mlPayload, draft_token: draftToken });
+        console.log(`Draft analysis: ${data.draft}`);
+        [pRes, fRes, eRes] = [data.priority, data.fake, data.embedding].map(d => ({ status: 'fulfilled', value: { data: d } }));
+      } catch (draftError) {
+        console.warn("Draft Resolve Failed, analysing now:", draftError.message);
+      }
+    }
+
     // We run parallel requests for maximum speed
-    const [pRes, fRes, cRes, eRes] = await Promise.allSettled([
-      axios.post(`${ML_URL}/api/predict-priority/`, mlPayload),
-      axios.post(`${ML_URL}/api/detect-fake/`, mlPayload),
-      axios.post(`${ML_URL}/api/categorize/`, mlPayload),
-      axios.post(`${ML_URL}/api/get-embedding/`, { text: title + " " + description })
-    ]);
+    // The embedding call also categorizes: nearest category centroid, LLM only when ambiguous
+    if (!pRes) {
+      [pRes, fRes, eRes] = await Promise.allSettled([
+        axios.post(`${ML_URL}/api/predict-priority/`, mlPayload),
+        axios.post(`${ML_URL}/api/detect-fake/`, mlPayload),
+        axios.post(`${ML_URL}/api/get-embedding/`, { text: title + " " + description, categorize: true })
+      ]);
+    }
 
     if (pRes.status === 'fulfilled') mlData.priority = pRes.value.data.priority;
     if (fRes.status === 'fulfilled') {
       mlData.isFake = fRes.value.data.is_fake;
       mlData.fakeConfidence = fRes.value.data.confidence;
     }
-    if (cRes.status === 'fulfilled') mlData.category = cRes.value.data.category; // Auto-Categorization
-    if (eRes.status === 'fulfilled') mlData.embedding = eRes.value.data.embedding;
+    if (eRes.status === 'fulfilled') {
+      mlData.embedding = eRes.value.data.embedding;
+      if (eRes.value.data.category) mlData.category = eRes.value.data.category; // Auto-Categorization
+    }
 
   } catch (error) {
     console.error("ML Service Error (Non-Blocking):", error.message);
@@ -174,6 +190,12 @@ const createIssue = asyncHandler(async (req, res) => {
   await issue.save();
   console.log("Issue Saved with AI Data");
 
+  // Fold the new issue into the ML service's hotspot grid and work queues (fire-and-forget)
+  if (lat && lng && !mlData.isFake) {
+    sendHotspotEvent(issue);
+  }
+  sendRankingUpdate(issue);
+
   // === ASYNC IMAGE VALIDATION (Background) ===
   // Validate image spam/relevance in background without blocking user
   if (fileUrl) {
@@ -191,7 +213,7 @@ const createIssue = asyncHandler(async (req, res) => {
         .select('title description complaintId _id');
 
       const duplicateCheck = await axios.post(`${ML_URL}/api/find-duplicates/`, {
-        candidate: { title, description },
+        candidate: { _id: issue._id, title, description },
         existing_issues: activeIssues
       });
 
@@ -258,6 +280,65 @@ const createIssue = asyncHandler(async (req, res) => {
   });
 });
 
+// Helper: Send moderator corrections to the ML service so the local models learn from them
+// (fire-and-forget; the ML service batches them into partial_fit updates)
+const sendMlFeedback = async (issue, corrections) => {
+  if (!corrections.length) return;
+  try {
+    const { data } = await axios.post(`${ML_URL}/api/feedback/`, {
+      corrections: corrections.map(c => ({
+        ...c,
+        title: issue.title,
+        description: issue.description,
+        issue_id: issue._id.toString()
+      }))
+    });
+    if (data.errors?.length) {
+      console.warn(`[ML Feedback] Corrections rejected for issue ${issue._id}:`, JSON.stringify(data.errors));
+    }
+  } catch (err) {
+    console.error('[ML Feedback] Failed to send corrections:', JSON.stringify(err.response?.data?.errors) || err.message);
+  }
+};
+
+// Incremental hotspot state lives in the ML service, so analytics never rescans issues
+const sendHotspotEvent = async (issue) => {
+  try {
+    await axios.post(`${ML_URL}/api/hotspots/ingest/`, {
+      id: issue._id.toString(),
+      lat: issue.coordinates.lat,
+      lng: issue.coordinates.lng,
+      category: issue.category,
+      created_at: issue.createdAt
+    }, { timeout: 5000 });
+  } catch (err) {
+    console.error('[ML Hotspots] Failed to record issue:', err.message);
+  }
+};
+
+// Officer work queues are ranked incrementally in the ML service (priority, age, incident size,
+// upvotes, predicted resolution time), so dashboards don't re-sort on every page load
+const RANKING_CLOSED_STATUSES = ['Resolved', 'Rejected', 'Closed', 'Spam'];
+
+const sendRankingUpdate = async (issue, overrides = {}) => {
+  try {
+    await axios.post(`${ML_URL}/api/ranking/`, {
+      id: issue._id.toString(),
+      status: issue.status,
+      officer: issue.assignedOfficer ? issue.assignedOfficer.toString() : null,
+      category: issue.category,
+      priority: issue.priority,
+      upvotes: issue.upvotes?.length || 0,
+      created_at: issue.createdAt,
+      lat: issue.coordinates?.lat,
+      lng: issue.coordinates?.lng,
+      ...overrides
+    }, { timeout: 5000 });
+  } catch (err) {
+    console.error('[ML Ranking] Failed to update issue:', err.message);
+  }
+};
+
 const getAllIssues = asyncHandler(async (req, res) => {
   const issues = await Issue.find().sort({ createdAt: -1 }).lean();
   return res.json(issues);
@@ -265,7 +346,7 @@ const getAllIssues = asyncHandler(async (req, res) => {
 
 const updateIssueStatus = asyncHandler(async (req, res) => {
   const { id } = req.params;
-  const { newStatus, remarks } = req.body;
+  const { newStatus, remarks, priority, category } = req.body;
 
   console.log(`[UpdateStatus] Request for ID: ${id}, New Status: ${newStatus}`);
 
@@ -282,7 +363,26 @@ const updateIssueStatus = asyncHandler(async (req, res) => {
       console.log(`[UpdateStatus] Generated missing complaintId: ${issue.complaintId}`);
     }
 
+    // Moderator corrections of the AI verdicts (compared before they are overwritten)
+    const corrections = [];
+    const ai = issue.aiAnalysis || {};
+    if (priority && priority !== (ai.priority || issue.priority)) {
+      corrections.push({ task: 'priority', label: priority });
+    }
+    if (category && category !== (ai.category || issue.category)) {
+      corrections.push({ task: 'category', label: category });
+    }
+    if (newStatus === 'Spam' && !issue.isFake) {
+      corrections.push({ task: 'fake', label: true });
+    } else if (['In Progress', 'Resolved'].includes(newStatus) && issue.isFake) {
+      corrections.push({ task: 'fake', label: false });
+    }
+
     issue.status = newStatus;
+    if (priority) issue.priority = priority;
+    if (category) issue.category = category;
+    if (newStatus === 'Spam') issue.isFake = true;
+    else if (corrections.some(c => c.task === 'fake')) issue.isFake = false;
 
     if (newStatus === 'Escalated') {
       issue.priority = 'High';
@@ -297,6 +397,9 @@ const updateIssueStatus = asyncHandler(async (req, res) => {
     await issue.save();
     console.log(`[UpdateStatus] Status updated to ${newStatus}`);
 
+    sendMlFeedback(issue, corrections);
+    sendRankingUpdate(issue);
+
     // Update User Trust Score based on status
     if (["Resolved", "In Progress", "Rejected"].includes(newStatus)) {
       if (issue.email) {
@@ -371,6 +474,7 @@ const deleteIssue = asyncHandler(async (req, res) => {
   if (!issue) {
     return res.status(404).json({ error: "Issue not found" });
   }
+  sendRankingUpdate(issue, { open: false });
 
   return res.json({ message: "Issue deleted successfully", issue });
 });
@@ -462,7 +566,7 @@ const findDuplicatesForIssue = asyncHandler(async (req, res) => {
       .select('title description complaintId _id priority status');
 
     const response = await axios.post(`${ML_URL}/api/find-duplicates/`, {
-      candidate: { title: issue.title, description: issue.description },
+      candidate: { _id: issue._id, title: issue.title, description: issue.description },
       existing_issues: activeIssues
     });
 
@@ -514,9 +618,33 @@ const getAssignedIssues = asyncHandler(async (req, res) => {
     return res.status(404).json({ error: "User profile not found. Please contact Admin." });
   }
 
+  // Ranked queue from the ML service; used only when it holds every open issue of this officer
+  // (run scripts/backfill_ranking.js once), otherwise the creation-date sort below
+  const limit = Math.min(parseInt(req.query.limit) || 500, 500);
+  const page = Math.max(parseInt(req.query.page) || 1, 1);
+  try {
+    const [queue, openCount] = await Promise.all([
+      axios.get(`${ML_URL}/api/ranking/queue/`, {
+        params: { officer: user._id.toString(), limit, offset: (page - 1) * limit },
+        timeout: 3000
+      }),
+      Issue.countDocuments({ assignedOfficer: user._id, status: { $nin: RANKING_CLOSED_STATUSES } })
+    ]);
+    if (queue.data.total === openCount) {
+      const ranked = queue.data.issues;
+      const found = await Issue.find({ _id: { $in: ranked.map(r => r.id) } }).lean();
+      const byId = new Map(found.map(issue => [issue._id.toString(), issue]));
+      res.set('X-Total-Count', String(queue.data.total));
+      return res.json(ranked.filter(r => byId.has(r.id)).map(r => ({ ...byId.get(r.id), rankScore: r.score })));
+    }
+    console.warn(`[Officer Dashboard] Ranking has ${queue.data.total} of ${openCount} open issues, sorting by date`);
+  } catch (err) {
+    console.error('[ML Ranking] Queue unavailable, sorting by date:', err.message);
+  }
+
   const issues = await Issue.find({
     assignedOfficer: user._id,
-    status: { $nin: ['Resolved', 'Rejected'] }
+    status: { $nin: RANKING_CLOSED_STATUSES }
   }).sort({ createdAt: -1 }).lean();
 
   res.json(issues);
@@ -611,6 +739,7 @@ const manualAssignIssue = asyncHandler(async (req, res) => {
     byUser: 'Moderator'
   });
   await issue.save();
+  sendRankingUpdate(issue);
 
   // Update Officer Load
   officer.activeTasks = (officer.activeTasks || 0) + 1;
@@ -745,6 +874,7 @@ const submitResolution = asyncHandler(async (req, res) => {
   });
 
   await issue.save();
+  sendRankingUpdate(issue);
   res.status(200).json(issue);
 });
 
@@ -782,6 +912,7 @@ const reviewResolution = asyncHandler(async (req, res) => {
   }
 
   await issue.save();
+  sendRankingUpdate(issue);
   res.status(200).json(issue);
 });
 
@@ -820,6 +951,7 @@ const acknowledgeResolution = asyncHandler(async (req, res) => {
   }
 
   await issue.save();
+  sendRankingUpdate(issue);
   res.status(200).json(issue);
 });
 
@@ -919,6 +1051,7 @@ const upvoteIssue = asyncHandler(async (req, res) => {
   }
 
   await issue.save();
+  sendRankingUpdate(issue);
   res.json(issue);
 });
 
@@ -959,6 +1092,7 @@ const downvoteIssue = asyncHandler(async (req, res) => {
   issue.priorityScore = netVotes + statusWeight;
 
   await issue.save();
+  sendRankingUpdate(issue);
   res.json(issue);
 });
 
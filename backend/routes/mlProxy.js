@@ -42,6 +42,33 @@ const proxyJson = async (req, res) => {
     }
 };
 
+// Proxy Handler for streamed (server-sent events) responses
+const proxyStream = async (req, res) => {
+    try {
+        const cleanPath = req.originalUrl.replace('/api/ml', '/api').replace('//', '/');
+        const url = `${ML_SERVICE_URL}${cleanPath}`;
+        console.log(`[ML Proxy] Streaming from: ${url}`);
+
+        const response = await axios({
+            method: 'post',
+            url: url,
+            data: req.body,
+            headers: { 'Content-Type': 'application/json' },
+            responseType: 'stream'
+        });
+
+        res.status(response.status);
+        res.setHeader('Content-Type', 'text/event-stream');
+        // no-transform keeps the compression middleware from buffering the stream
+        res.setHeader('Cache-Control', 'no-cache, no-transform');
+        res.setHeader('X-Accel-Buffering', 'no');
+        response.data.pipe(res);
+    } catch (error) {
+        console.error("ML Stream Proxy Error:", error.message);
+        res.status(error.response?.status || 500).json({ error: "ML Streaming failed" });
+    }
+};
+
 // Proxy Handler for Multipart/File requests (Transcribe)
 const proxyMultipart = async (req, res) => {
     try {
@@ -73,7 +100,9 @@ const proxyMultipart = async (req, res) => {
 router.post('/analyze-toxicity', verifyToken, proxyJson);
 router.post('/check-semantic-duplicate', verifyToken, proxyJson);
 router.post('/generate-reply', verifyToken, proxyJson);
+router.post('/generate-reply/stream', verifyToken, proxyStream);
 router.post('/predict-resolution-time', verifyToken, proxyJson);
+router.post('/drafts/analyze', verifyToken, proxyJson); // speculative triage while the report is typed
 
 // Special handling for file upload
 // Assuming the Python endpoint is /transcribe-audio/
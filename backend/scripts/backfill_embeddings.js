@@ -0,0 +1,83 @@
+const mongoose = require('mongoose');
+const path = require('path');
+const readline = require('readline');
+const axios = require('axios');
+const Issue = require('../models/issues');
+require('dotenv').config({ path: path.join(__dirname, '../.env') });
+
+// Fills in issues whose `embedding` is empty (get-embedding returns [] on any failure)
+// using the ML service's bulk endpoint, which de-duplicates texts and streams results.
+//   node scripts/backfill_embeddings.js
+
+const ML_URL = process.env.ML_SERVICE_URL || 'http://localhost:8000';
+const PAGE_SIZE = 5000;
+const WRITE_BATCH = 500;
+
+const backfillPage = async (issues) => {
+    const response = await axios.post(`${ML_URL}/api/get-embeddings/batch/`, {
+        items: issues.map(issue => ({ id: issue._id.toString(), text: `${issue.title || ''} ${issue.description || ''}` }))
+    }, { responseType: 'stream', timeout: 0 });
+
+    const lines = readline.createInterface({ input: response.data, crlfDelay: Infinity });
+    let ops = [];
+    let written = 0;
+    let failed = 0;
+
+    for await (const line of lines) {
+        if (!line.trim()) continue;
+        const msg = JSON.parse(line);
+        if (msg.progress) {
+            const p = msg.progress;
+            console.log(`  batch ${p.batches_done}/${p.batches_total} - ${p.items_done}/${p.items_total} items (${p.elapsed_s}s)`);
+        } else if (msg.embedding) {
+            ops.push({ updateOne: { filter: { _id: msg.id }, update: { $set: { embedding: msg.embedding } } } });
+        } else if (msg.error) {
+            failed++;
+        }
+        if (ops.length >= WRITE_BATCH) {
+            await Issue.bulkWrite(ops, { ordered: false });
+            written += ops.length;
+            ops = [];
+        }
+    }
+    if (ops.length) {
+        await Issue.bulkWrite(ops, { ordered: false });
+        written += ops.length;
+    }
+    return { written, failed };
+};
+
+const backfillEmbeddings = async () => {
+    try {
+        console.log("Connecting to DB...");
+        await mongoose.connect(process.env.MONGODB_URI);
+        console.log("Connected.");
+
+        const missing = { $or: [{ embedding: { $exists: false } }, { embedding: { $size: 0 } }] };
+        const total = await Issue.countDocuments(missing);
+        console.log(`Found ${total} issues without embeddings.`);
+
+        let lastId = null;
+        let written = 0;
+        let failed = 0;
+        while (true) {
+            const filter = lastId ? { ...missing, _id: { $gt: lastId } } : missing;
+            const issues = await Issue.find(filter).sort({ _id: 1 }).limit(PAGE_SIZE).select('title description').lean();
+            if (!issues.length) break;
+            lastId = issues[issues.length - 1]._id;
+
+            console.log(`Embedding ${issues.length} issues...`);
+            const result = await backfillPage(issues);
+            written += result.written;
+            failed += result.failed;
+        }
+
+        console.log(`Backfill Complete. Updated ${written}, failed ${failed}.`);
+        process.exit(0);
+    } catch (error) {
+        console.error("Backfill Failed:", error);
+        process.exit(1);
+    }
+};
+
+backfillEmbeddings();
@@ -0,0 +1,53 @@
+const mongoose = require('mongoose');
+const path = require('path');
+const axios = require('axios');
+const Issue = require('../models/issues');
+require('dotenv').config({ path: path.join(__dirname, '../.env') });
+
+// Seeds the ML service's incremental hotspot grid with existing issues.
+// Safe to re-run: the service skips issue ids it has already counted.
+//   node scripts/backfill_hotspots.js
+
+const ML_URL = process.env.ML_SERVICE_URL || 'http://localhost:8000';
+const PAGE_SIZE = 2000;
+
+const backfillHotspots = async () => {
+    try {
+        console.log("Connecting to DB...");
+        await mongoose.connect(process.env.MONGODB_URI);
+        console.log("Connected.");
+
+        const located = { 'coordinates.lat': { $ne: null }, 'coordinates.lng': { $ne: null }, isFake: { $ne: true } };
+        let lastId = null;
+        let recorded = 0;
+        let skipped = 0;
+        while (true) {
+            const filter = lastId ? { ...located, _id: { $gt: lastId } } : located;
+            const issues = await Issue.find(filter).sort({ _id: 1 }).limit(PAGE_SIZE)
+                .select('coordinates category createdAt').lean();
+            if (!issues.length) break;
+            lastId = issues[issues.length - 1]._id;
+
+            const response = await axios.post(`${ML_URL}/api/hotspots/ingest/`, {
+                events: issues.map(issue => ({
+                    id: issue._id.toString(),
+                    lat: issue.coordinates.lat,
+                    lng: issue.coordinates.lng,
+                    category: issue.category,
+                    created_at: issue.createdAt
+                }))
+            }, { timeout: 0 });
+            recorded += response.data.recorded;
+            skipped += response.data.skipped;
+            console.log(`  ${recorded} recorded, ${skipped} already counted`);
+        }
+
+        console.log(`Backfill Complete. Recorded ${recorded}, skipped ${skipped}.`);
+        process.exit(0);
+    } catch (error) {
+        console.error("Backfill Failed:", error);
+        process.exit(1);
+    }
+};
+
+backfillHotspots();
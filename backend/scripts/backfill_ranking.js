@@ -0,0 +1,57 @@
+const mongoose = require('mongoose');
+const path = require('path');
+const axios = require('axios');
+const Issue = require('../models/issues');
+require('dotenv').config({ path: path.join(__dirname, '../.env') });
+
+// Seeds the ML service's officer work queues with every open issue.
+// Safe to re-run: issues are upserted by id.
+//   node scripts/backfill_ranking.js
+
+const ML_URL = process.env.ML_SERVICE_URL || 'http://localhost:8000';
+const PAGE_SIZE = 2000;
+const CLOSED_STATUSES = ['Resolved', 'Rejected', 'Closed', 'Spam'];
+
+const backfillRanking = async () => {
+    try {
+        console.log("Connecting to DB...");
+        await mongoose.connect(process.env.MONGODB_URI);
+        console.log("Connected.");
+
+        const open = { status: { $nin: CLOSED_STATUSES } };
+        let lastId = null;
+        let updated = 0;
+        while (true) {
+            const filter = lastId ? { ...open, _id: { $gt: lastId } } : open;
+            const issues = await Issue.find(filter).sort({ _id: 1 }).limit(PAGE_SIZE)
+                .select('status assignedOfficer category priority upvotes createdAt coordinates').lean();
+            if (!issues.length) break;
+            lastId = issues[issues.length - 1]._id;
+
+            const response = await axios.post(`${ML_URL}/api/ranking/`, {
+                issues: issues.map(issue => ({
+                    id: issue._id.toString(),
+                    status: issue.status,
+                    officer: issue.assignedOfficer ? issue.assignedOfficer.toString() : null,
+                    category: issue.category,
+                    priority: issue.priority,
+                    upvotes: issue.upvotes?.length || 0,
+                    created_at: issue.createdAt,
+                    lat: issue.coordinates?.lat,
+                    lng: issue.coordinates?.lng
+                }))
+            }, { timeout: 0 });
+            updated += response.data.updated;
+            if (response.data.errors.length) console.warn(`  ${response.data.errors.length} rejected`, response.data.errors.slice(0, 3));
+            console.log(`  ${updated} ranked`);
+        }
+
+        console.log(`Backfill Complete. Ranked ${updated} open issues.`);
+        process.exit(0);
+    } catch (error) {
+        console.error("Backfill Failed:", error);
+        process.exit(1);
+    }
+};
+
+backfillRanking();
@@ -0,0 +1,80 @@
+const mongoose = require('mongoose');
+const path = require('path');
+const axios = require('axios');
+const Issue = require('../models/issues');
+require('dotenv').config({ path: path.join(__dirname, '../.env') });
+
+// Groups every open issue into incidents in one batch on the ML service
+// (blocked similarity + union-find), instead of per-issue windowed checks.
+//   node scripts/cluster_incidents.js [threshold] [radiusKm]
+// Embeddings go up as a float32 .npy file, so 100k issues is ~300 MB, not GBs of JSON.
+
+const ML_URL = process.env.ML_SERVICE_URL || 'http://localhost:8000';
+const POLL_MS = 5000;
+
+// Minimal .npy (v1.0) writer for an (n, d) little-endian float32 matrix
+const toNpy = (rows, dim) => {
+    let header = `{'descr': '<f4', 'fortran_order': False, 'shape': (${rows.length}, ${dim}), }`;
+    header += ' '.repeat(64 - ((10 + header.length + 1) % 64)) + '\n';
+    const prefix = Buffer.alloc(10);
+    prefix.write('\x93NUMPY', 0, 'latin1');
+    prefix.writeUInt8(1, 6);
+    prefix.writeUInt8(0, 7);
+    prefix.writeUInt16LE(header.length, 8);
+    const data = new Float32Array(rows.length * dim);
+    rows.forEach((row, i) => data.set(row, i * dim));
+    return Buffer.concat([prefix, Buffer.from(header, 'latin1'), Buffer.from(data.buffer)]);
+};
+
+const clusterIncidents = async () => {
+    const threshold = process.argv[2] || '0.92';
+    const radiusKm = process.argv[3] || '';
+    try {
+        console.log("Connecting to DB...");
+        await mongoose.connect(process.env.MONGODB_URI);
+        console.log("Connected.");
+
+        const issues = await Issue.find({
+            status: { $in: ['Pending', 'In Progress'] },
+            'embedding.0': { $exists: true }
+        }).sort({ createdAt: 1 }).select('embedding coordinates').lean();
+        if (issues.length < 2) {
+            console.log("Fewer than two open issues with embeddings, nothing to cluster.");
+            process.exit(0);
+        }
+        const dim = issues[0].embedding.length;
+        const usable = issues.filter(issue => issue.embedding.length === dim);
+        console.log(`Clustering ${usable.length} open issues (${dim}-d embeddings)...`);
+
+        const form = new FormData();
+        form.append('vectors', new Blob([toNpy(usable.map(issue => issue.embedding), dim)]), 'vectors.npy');
+        form.append('issues', new Blob([JSON.stringify(usable.map(issue => ({
+            id: issue._id.toString(),
+            lat: issue.coordinates?.lat ?? null,
+            lng: issue.coordinates?.lng ?? null
+        })))]), 'issues.json');
+        form.append('threshold', threshold);
+        if (radiusKm) form.append('radius_km', radiusKm);
+
+        const submitted = await axios.post(`${ML_URL}/api/incidents/cluster/`, form, { timeout: 0, maxBodyLength: Infinity });
+        const jobId = submitted.data.job_id;
+        console.log(`Job ${jobId} queued.`);
+
+        let result;
+        while (!result) {
+            await new Promise(resolve => setTimeout(resolve, POLL_MS));
+            const response = await axios.get(`${ML_URL}/api/jobs/${jobId}/result/`, { validateStatus: s => s < 600 });
+            if (response.status === 200) result = response.data.result;
+            else if (response.status !== 202) throw new Error(response.data.error || `job failed (${response.status})`);
+        }
+
+        console.log(`Done in ${result.seconds}s: ${result.issues} issues -> ${result.incidents} incidents (${result.pairs} similar pairs).`);
+        result.groups.slice(0, 10).forEach(group => console.log(`  ${group.incident_id}: ${group.size} issues`));
+        process.exit(0);
+    } catch (error) {
+        console.error("Clustering Failed:", error.message);
+        process.exit(1);
+    }
+};
+
+clusterIncidents();
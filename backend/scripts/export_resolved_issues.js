@@ -0,0 +1,81 @@
+const mongoose = require('mongoose');
+const fs = require('fs');
+const path = require('path');
+const Issue = require('../models/issues');
+require('dotenv').config({ path: path.join(__dirname, '../.env') });
+
+// Exports resolved issues as JSON lines for the ML resolution-time model:
+//   node scripts/export_resolved_issues.js resolved.jsonl
+//   python ml_service/civix_ml/train_resolution_model.py resolved.jsonl
+
+const resolvedAtOf = (issue) => {
+    const entry = [...(issue.timeline || [])].reverse().find(t => t.status === 'Resolved');
+    return entry?.timestamp
+        || issue.resolution?.moderatorApproval?.reviewedAt
+        || issue.resolution?.submittedAt
+        || null;
+};
+
+const exportResolvedIssues = async () => {
+    const outPath = process.argv[2] || 'resolved_issues.jsonl';
+    try {
+        console.log("Connecting to DB...");
+        await mongoose.connect(process.env.MONGODB_URI);
+        console.log("Connected.");
+
+        const issues = await Issue.find({ status: 'Resolved' })
+            .select('category priority coordinates createdAt timeline resolution assignedOfficer')
+            .lean();
+        console.log(`Found ${issues.length} resolved issues.`);
+
+        const rows = issues
+            .map(issue => ({ issue, resolvedAt: resolvedAtOf(issue) }))
+            .filter(({ issue, resolvedAt }) => issue.createdAt && resolvedAt);
+
+        // Officer workload = issues the same officer had open when this one was created.
+        // One sort + sweep per officer instead of a query per issue.
+        const byOfficer = new Map();
+        for (const row of rows) {
+            const key = row.issue.assignedOfficer ? row.issue.assignedOfficer.toString() : null;
+            if (!key) continue;
+            if (!byOfficer.has(key)) byOfficer.set(key, []);
+            byOfficer.get(key).push(row);
+        }
+        const workload = new Map();
+        for (const officerRows of byOfficer.values()) {
+            officerRows.sort((a, b) => a.issue.createdAt - b.issue.createdAt);
+            for (let i = 0; i < officerRows.length; i++) {
+                const created = officerRows[i].issue.createdAt;
+                let open = 0;
+                for (let j = i - 1; j >= 0; j--) {
+                    if (new Date(officerRows[j].resolvedAt) > created) open++;
+                }
+                workload.set(officerRows[i].issue._id.toString(), open);
+            }
+        }
+
+        const out = fs.createWriteStream(outPath);
+        for (const { issue, resolvedAt } of rows) {
+            out.write(JSON.stringify({
+                id: issue._id.toString(),
+                category: issue.category,
+                priority: issue.priority,
+                lat: issue.coordinates?.lat ?? null,
+                lng: issue.coordinates?.lng ?? null,
+                created_at: issue.createdAt,
+                resolved_at: resolvedAt,
+                officer_workload: workload.get(issue._id.toString()) || 0
+            }) + '\n');
+        }
+        out.end();
+        await new Promise(resolve => out.on('finish', resolve));
+
+        console.log(`Exported ${rows.length} issues to ${outPath}`);
+        process.exit(0);
+    } catch (error) {
+        console.error("Export Failed:", error);
+        process.exit(1);
+    }
+};
+
+exportResolvedIssues();
@@ -0,0 +1,240 @@
+"""
+Admission control for upstream capacity.
+
+Each upstream (Gemini generation, Gemini embeddings) has a bounded number of
+concurrent calls per worker. When every slot is busy, callers wait in
+weighted fair queues keyed by endpoint class, so a burst of captions or a
+long transcription backlog can't starve triage:
+
+    class         weight  max queued  max wait  when over the limit
+    triage           8        32         5s     local fallback answer
+    interactive      4        16        10s     local fallback answer
+    media            1         8        30s     429 + Retry-After
+    bulk             1         4        60s     429 + Retry-After
+    background       1        64       600s     error (jobs retry with backoff)
+
+Requests flagged urgent (priority "High", `urgent: true`, or an emergency
+phrase from the lexicon's `urgent` list) skip the class queues entirely.
+
+Views declare their class with `@admission.endpoint('triage')`; the call
+sites that talk to an upstream wrap it in `with admission.admit('gemini'):`.
+"""
+import contextvars
+import functools
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import defaultdict, deque, namedtuple
+from contextlib import contextmanager
+
+from rest_framework.response import Response
+
+from api import metrics, prefilter
+
+EndpointClass = namedtuple('EndpointClass', 'weight max_queued max_wait on_overload')
+
+CLASSES = {
+    'triage': EndpointClass(8, 32, 5.0, 'fallback'),
+    'interactive': EndpointClass(4, 16, 10.0, 'fallback'),
+    'media': EndpointClass(1, 8, 30.0, 'reject'),
+    'bulk': EndpointClass(1, 4, 60.0, 'reject'),
+    'background': EndpointClass(1, 64, 600.0, 'reject'),
+}
+URGENT_MAX_QUEUED = 64
+URGENT_MAX_WAIT = 30.0
+RETRY_AFTER_SECONDS = 5
+
+# Concurrent calls per gunicorn worker.
+UPSTREAM_CAPACITY = {
+    'gemini': int(os.getenv('GEMINI_CONCURRENCY', '8')),
+    'embeddings': int(os.getenv('EMBEDDING_CONCURRENCY', '8')),
+}
+
+
+class Overloaded(Exception):
+    def __init__(self, upstream, endpoint_class, reason):
+        super().__init__(f"{upstream} is at capacity for {endpoint_class} requests ({reason})")
+        self.retry_after = RETRY_AFTER_SECONDS
+
+
+class _Waiter:
+    __slots__ = ('endpoint_class', 'event', 'granted', 'cancelled')
+
+    def __init__(self, endpoint_class):
+        self.endpoint_class = endpoint_class
+        self.event = threading.Event()
+        self.granted = False
+        self.cancelled = False
+
+
+class Upstream:
+    """Counting semaphore whose waiters are served urgent-first, then by weighted fair queueing."""
+
+    def __init__(self, name, capacity):
+        self.name = name
+        self.capacity = capacity
+        self.active = 0
+        self._lock = threading.Lock()
+        self._urgent = deque()
+        self._queue = []  # heap of (finish tag, seq, waiter)
+        self._queued = defaultdict(int)
+        self._last_finish = defaultdict(float)
+        self._virtual_time = 0.0
+        self._seq = itertools.count()
+
+    def acquire(self, endpoint_class, urgent=False):
+        spec = CLASSES[endpoint_class]
+        with self._lock:
+            if self.active < self.capacity and not self._urgent and not self._queue:
+                self.active += 1
+                return
+            waiter = _Waiter(endpoint_class)
+            if urgent:
+                if len(self._urgent) >= URGENT_MAX_QUEUED:
+                    raise Overloaded(self.name, 'urgent', 'queue full')
+                self._urgent.append(waiter)
+            else:
+                if self._queued[endpoint_class] >= spec.max_queued:
+                    raise Overloaded(self.name, endpoint_class, 'queue full')
+                # A class that has been idle restarts at the current virtual time,
+                # so it can't bank credit while nobody was waiting.
+                tag = max(self._virtual_time, self._last_finish[endpoint_class]) + 1.0 / spec.weight
+                self._last_finish[endpoint_class] = tag
+                heapq.heappush(self._queue, (tag, next(self._seq), waiter))
+                self._queued[endpoint_class] += 1
+
+        if waiter.event.wait(URGENT_MAX_WAIT if urgent else spec.max_wait):
+            return
+        with self._lock:
+            if waiter.granted:  # released just as we timed out: the slot is ours
+                return
+            waiter.cancelled = True
+            if urgent:
+                self._urgent.remove(waiter)
+            else:
+                self._queued[endpoint_class] -= 1  # heap entry is skipped lazily
+        raise Overloaded(self.name, endpoint_class, 'timed out waiting')
+
+    def release(self):
+        with self._lock:
+            waiter = self._next_waiter()
+            if waiter is None:
+                self.active -= 1
+                return
+            waiter.granted = True  # the slot passes straight to the waiter
+            waiter.event.set()
+
+    def _next_waiter(self):
+        if self._urgent:
+            return self._urgent.popleft()
+        while self._queue:
+            tag, _, waiter = heapq.heappop(self._queue)
+            if waiter.cancelled:
+                continue
+            self._queued[waiter.endpoint_class] -= 1
+            self._virtual_time = tag
+            return waiter
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'capacity': self.capacity,
+                'active': self.active,
+                'urgent_queued': len(self._urgent),
+                'queued': {cls: n for cls, n in self._queued.items() if n},
+            }
+
+
+_upstreams = {name: Upstream(name, capacity) for name, capacity in UPSTREAM_CAPACITY.items()}
+
+
+class _RequestState:
+    __slots__ = ('endpoint_class', 'urgent', 'overloaded')
+
+    def __init__(self, endpoint_class, urgent):
+        self.endpoint_class = endpoint_class
+        self.urgent = urgent
+        self.overloaded = False
+
+
+_current = contextvars.ContextVar('admission_request', default=None)
+
+
+@contextmanager
+def admit(upstream, endpoint_class=None, urgent=None):
+    """
+    Hold one `upstream` slot for the duration of the block. Class and urgency
+    default to those of the current request (background outside a request).
+    Raises Overloaded when the request can't be admitted in time.
+    """
+    state = _current.get()
+    endpoint_class = endpoint_class or (state.endpoint_class if state else 'background')
+    if urgent is None:
+        urgent = state.urgent if state else False
+    label = 'urgent' if urgent else endpoint_class
+
+    start = time.perf_counter()
+    try:
+        _upstreams[upstream].acquire(endpoint_class, urgent)
+    except Overloaded:
+        metrics.incr(f'admission.{upstream}.{label}.rejected')
+        if state:
+            state.overloaded = True
+        raise
+    metrics.incr(f'admission.{upstream}.{label}.admitted')
+    metrics.observe(f'admission.{upstream}.{label}.wait_ms', (time.perf_counter() - start) * 1000)
+    try:
+        yield
+    finally:
+        _upstreams[upstream].release()
+
+
+def is_urgent(request):
+    """Fast pre-check: explicit flags first, then the emergency phrases in the lexicon."""
+    try:
+        data = request.data
+        if str(data.get('priority', '')).lower() == 'high' or str(data.get('urgent', '')).lower() in ('true', '1'):
+            return True
+        text = ' '.join(str(data.get(key, '')) for key in ('title', 'description', 'text'))
+    except Exception:
+        return False
+    return bool(prefilter.urgent_terms(text))
+
+
+def endpoint(endpoint_class):
+    """
+    View decorator (inside @api_view) that tags upstream calls with the
+    endpoint's class and urgency. If an upstream call was turned away, the
+    view's own fallback answer is returned marked `X-Degraded: overloaded`,
+    or - for classes that have no meaningful fallback - a 429.
+    """
+    spec = CLASSES[endpoint_class]
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            state = _RequestState(endpoint_class, is_urgent(request))
+            token = _current.set(state)
+            try:
+                response = view(request, *args, **kwargs)
+            finally:
+                _current.reset(token)
+            if not state.overloaded:
+                return response
+            if spec.on_overload == 'reject':
+                return Response(
+                    {"error": "ML service is at capacity, please retry shortly", "retry_after": RETRY_AFTER_SECONDS},
+                    status=429,
+                    headers={'Retry-After': str(RETRY_AFTER_SECONDS)},
+                )
+            response['X-Degraded'] = 'overloaded'
+            return response
+        return wrapper
+    return decorator
+
+
+def stats():
+    return {name: upstream.stats() for name, upstream in _upstreams.items()}
@@ -1,9 +1,13 @@
 import os
-import google.generativeai as genai
-from rest_framework.decorators import api_view
+import json
+import time
+from django.http import StreamingHttpResponse
+from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 import logging
 from dotenv import load_dotenv
+from civix_ml.startup import lazy_module
+from api import admission, metrics, minhash, permissions, prefilter, prompts, reply_templates, resolution_model, result_cache, upstream, uploads
 
 # Configure Logging
 logger = logging.getLogger(__name__)
@@ -11,65 +15,161 @@ logger = logging.getLogger(__name__)
 # Load Env from Backend
 load_dotenv(os.path.join(os.path.dirname(__file__), '../../backend/.env'))
 
-# Configure Gemini
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+# Configure Gemini (the SDK is heavy, so it is imported on first use)
+GEMINI_API_KEY = upstream.api_key(os.getenv("GEMINI_API_KEY"))
+
+def _configure_genai(module):
+    if GEMINI_API_KEY:
+        module.configure(api_key=GEMINI_API_KEY)
+
+get_genai = upstream.genai(lazy_module('google.generativeai', on_load=_configure_genai))
 
 def get_gemini_model():
     if GEMINI_API_KEY:
-        return genai.GenerativeModel('gemini-1.5-flash')
+        return get_genai().GenerativeModel('gemini-1.5-flash')
     logger.error("Gemini Model Init Failed: GEMINI_API_KEY is not set or empty.")
     return None
 
 # --- Helper: Generic Gemini Prompt ---
 def ask_gemini(prompt, retries=1):
+    """Reply text for a prompt built with api/prompts.py, or None if Gemini is unavailable."""
     model = get_gemini_model()
     if not model:
         return None
     try:
-        response = model.generate_content(prompt)
+        with admission.admit('gemini'):
+            response = prompts.generate(model, prompt)
         if response and response.text:
             return response.text.strip()
+    except admission.Overloaded as e:
+        logger.warning(f"Gemini call shed: {e}")
     except Exception as e:
         logger.error(f"Gemini API Error: {e}")
     return None
 
-# --- 1. Semantic Duplicate Detection (Using Embeddings or Prompt) ---
+def stream_gemini(prompt):
+    """Yield the reply text chunk by chunk as Gemini produces it."""
+    model = get_gemini_model()
+    if not model:
+        return
+    # Streams outlive the view call, so the class is given explicitly
+    with admission.admit('gemini', endpoint_class='interactive'):
+        for chunk in prompts.stream(model, prompt):
+            if chunk.text:
+                yield chunk.text
+
+# --- 1. Semantic Duplicate Detection (MinHash first, then Prompt) ---
+DUPLICATE_PROMPT_CANDIDATES = int(os.getenv('DUPLICATE_PROMPT_CANDIDATES', '8'))
+
+def _issue_text(issue):
+    if isinstance(issue, str):
+        return issue
+    return f"{issue.get('title', '')} {issue.get('description', '')}".strip()
+
+def _issue_id(issue):
+    if isinstance(issue, dict):
+        return str(issue.get('_id') or issue.get('id') or issue.get('complaintId') or '') or None
+    return None
+
 @api_view(['POST'])
+def index_issues(req):
+    """
+    Keep the MinHash index of open issues in sync.
+    Body: {"issues": [{"id", "text"} or {"_id", "title", "description"}], "remove": [ids]}
+    """
+    added = 0
+    for issue in req.data.get('issues', []):
+        issue_id = _issue_id(issue)
+        text = issue.get('text') or _issue_text(issue)
+        if issue_id and text and minhash.open_issues.add(issue_id, text):
+            added += 1
+    for issue_id in req.data.get('remove', []):
+        minhash.open_issues.remove(str(issue_id))
+    return Response({"indexed": added, "size": len(minhash.open_issues)})
+
+@api_view(['POST'])
+@admission.endpoint('triage')
 def check_semantic_duplicate(req):
     try:
-        new_text = req.data.get('description', '')
-        existing_texts = req.data.get('existing_reports', []) # List of strings
-        
-        if not new_text or not existing_texts:
+        # Accepts both {description, existing_reports: [str]} and the backend's
+        # {candidate: {title, description}, existing_issues: [{_id, title, description}]}
+        candidate = req.data.get('candidate')
+        new_text = _issue_text(candidate) if candidate else req.data.get('description', '')
+        existing = req.data.get('existing_issues') or req.data.get('existing_reports', [])
+
+        if not new_text:
+            return Response({"is_duplicate": False, "score": 0.0})
+
+        # Stage 1: exact / near-verbatim matches via MinHash-LSH (no network).
+        # When the caller sends its list of open issues, only those count: they
+        # are indexed for this request alone (sketches are cached by text), so
+        # a query never adds to the shared index kept by /index-issues/.
+        start = time.perf_counter()
+        exclude = _issue_id(candidate) if candidate else None
+        index = minhash.MinHashIndex() if existing else minhash.open_issues
+        complaint_ids = {}
+        plain_reports = []
+        for i, issue in enumerate(existing):
+            issue_id = _issue_id(issue)
+            text = _issue_text(issue)
+            if not text:
+                continue
+            if issue_id:
+                index.add(issue_id, text)
+                complaint_ids[issue_id] = issue.get('complaintId')
+            else:
+                plain_reports.append((f"report-{i}", text))
+
+        matches = index.query(new_text, exclude=exclude)
+        if plain_reports:
+            new_shingles = minhash.shingles(new_text)
+            for report_id, text in plain_reports:
+                score = minhash.jaccard(new_shingles, minhash.shingles(text))
+                if score >= minhash.NEAR_DUPLICATE_THRESHOLD:
+                    matches.append((report_id, round(score, 4)))
+        metrics.observe('duplicates.minhash.latency_us', (time.perf_counter() - start) * 1e6)
+
+        if matches:
+            matches.sort(key=lambda m: m[1], reverse=True)
+            metrics.incr('duplicates.minhash.hit')
+            return Response({
+                "is_duplicate": True,
+                "score": matches[0][1],
+                "method": "MINHASH",
+                "duplicates": [
+                    {"issue_id": issue_id, "complaintId": complaint_ids.get(issue_id), "score": score}
+                    for issue_id, score in matches
+                ],
+            })
+        metrics.incr('duplicates.minhash.escalated')
+
+        existing = [issue for issue in existing if _issue_text(issue)]
+        if not existing:
             return Response({"is_duplicate": False, "score": 0.0})
 
         if not GEMINI_API_KEY:
              return Response({"is_duplicate": False, "score": 0.0, "reason": "No API Key"})
 
-        # Efficient Prompt Approach (Cheaper/Faster than embedding 1000 items each time)
-        # For large lists, you ideally want vector DB, but for this scale prompt is okay if list is small (<20)
-        # If list is huge, we just take last 20.
-        
-        recent_reports = existing_texts[:20] 
-        prompt = f"""
-        Compare the new report with existing reports.
-        New Report: "{new_text}"
-        
-        Existing Reports:
-        {recent_reports}
-        
-        Is the New Report a duplicate of any existing one? 
-        Return ONLY a JSON: {{"is_duplicate": boolean, "score": 0.0 to 1.0}}
-        """
-        
+        # Stage 2: Prompt approach (Cheaper/Faster than embedding 1000 items each time)
+        # Only the reports most similar to the new one are sent, numbered, within the prompt budget.
+        ranked = prompts.most_relevant(new_text, [_issue_text(issue) for issue in existing], DUPLICATE_PROMPT_CANDIDATES)
+        prompt = prompts.CHECK_SEMANTIC_DUPLICATE.build(
+            report=new_text, existing=[_issue_text(existing[i]) for i in ranked])
+
         response_text = ask_gemini(prompt)
         # Clean markdown json if any
         if response_text:
-             import json
              clean_text = response_text.replace('```json', '').replace('```', '')
              data = json.loads(clean_text)
+             match = data.pop('match', None)
+             if data.get('is_duplicate') and isinstance(match, int) and 1 <= match <= prompt.items['existing']:
+                 issue = existing[ranked[match - 1]]
+                 data['duplicates'] = [{
+                     "issue_id": _issue_id(issue),
+                     "complaintId": issue.get('complaintId') if isinstance(issue, dict) else None,
+                     "score": data.get('score', 0.0),
+                 }]
+             data['method'] = 'LLM'
              return Response(data)
              
         return Response({"is_duplicate": False, "score": 0.0})
@@ -80,23 +180,26 @@ def check_semantic_duplicate(req):
 
 # --- 2. Toxicity Analysis ---
 @api_view(['POST'])
+@admission.endpoint('triage')
 def analyze_toxicity(req):
     try:
         text = req.data.get('text', '')
         if not text: return Response({"error": "No text provided"}, status=400)
+
+        # Slurs, links and lottery spam are decided locally; only ambiguous text goes to Gemini
+        verdict, _ = prefilter.classify(text, 'analyze_toxicity')
+        if verdict:
+            return Response(verdict)
+
+        cached, kind = result_cache.lookup('analyze_toxicity', text)
+        if cached:
+            return Response(cached, headers={'X-Cache': kind})
         
-        prompt = f"""
-        Analyze this text for toxicity, spam, or inappropriate content.
-        Text: "{text}"
-        
-        Return ONLY a JSON: {{"is_toxic": boolean, "toxicity_score": 0.0 to 1.0, "label": "toxic" or "neutral" or "spam"}}
-        """
-        
-        response_text = ask_gemini(prompt)
+        response_text = ask_gemini(prompts.ANALYZE_TOXICITY.build(text=text))
         if response_text:
-             import json
              clean_text = response_text.replace('```json', '').replace('```', '')
              data = json.loads(clean_text)
+             result_cache.store('analyze_toxicity', text, data)
              return Response(data)
              
         return Response({"is_toxic": False, "toxicity_score": 0.0, "label": "neutral"})
@@ -105,13 +208,33 @@ def analyze_toxicity(req):
         return Response({"error": str(e)}, status=500)
 
 # --- 3. Audio Transcription (Gemini 2.5 Flash Native Audio) ---
+def transcribe_file(path, mime_type=None):
+    """Upload a local audio file to Gemini and return the transcript."""
+    genai = get_genai()
+
+    # Use Gemini 2.5 Flash with native audio
+    model = genai.GenerativeModel('gemini-2.5-flash')
+
+    if mime_type and not mime_type.startswith('audio/'):
+        mime_type = None  # let the client guess from the extension instead of trusting octet-stream
+
+    with admission.admit('gemini'):
+        audio_upload = genai.upload_file(path, mime_type=mime_type)
+        response = prompts.generate(model, prompts.TRANSCRIBE_AUDIO.build(), audio_upload)
+    return response.text.strip()
+
 @api_view(['POST'])
+@admission.endpoint('media')
 def transcribe_audio(req):
     """
     Transcribe audio using Gemini 2.5 Flash native audio capability.
     Free and unlimited - no Whisper dependency needed.
     """
     try:
+        rejected = uploads.rejection(req)
+        if rejected:
+            return Response({"error": rejected}, status=413)
+
         audio_file = req.FILES.get('audio')
         if not audio_file:
             return Response({"error": "No audio file provided"}, status=400)
@@ -119,46 +242,28 @@ def transcribe_audio(req):
         if not GEMINI_API_KEY:
             return Response({"error": "Gemini API not configured"}, status=500)
         
-        # Save temporary file
-        temp_path = f"temp_{audio_file.name}"
-        with open(temp_path, 'wb+') as destination:
-            for chunk in audio_file.chunks():
-                destination.write(chunk)
-        
-        try:
-            # Upload audio file to Gemini
-            audio_upload = genai.upload_file(temp_path)
-            
-            # Use Gemini 2.5 Flash with native audio
-            model = genai.GenerativeModel('gemini-2.5-flash')
-            
-            prompt = """
-            Transcribe this audio accurately. Return ONLY the transcribed text, nothing else.
-            If the audio contains a civic complaint or issue report, transcribe it verbatim.
-            """
-            
-            response = model.generate_content([prompt, audio_upload])
-            
-            # Cleanup
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            
-            transcribed_text = response.text.strip()
-            
-            return Response({"text": transcribed_text})
-            
-        except Exception as e:
-            # Cleanup on error
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            raise e
+        # The upload handler already streamed the audio into a private temp file.
+        with uploads.local_path(audio_file) as path:
+            return Response({"text": transcribe_file(path, audio_file.content_type)})
             
     except Exception as e:
         logger.error(f"Gemini Audio Transcription Error: {e}")
         return Response({"error": f"Transcription failed: {str(e)}"}, status=500)
 
 # --- 4. Smart Auto-Reply ---
+def _reply_prompt(description, status):
+    return prompts.GENERATE_REPLY.build(description=description, status=status)
+
+def _template_reply(data):
+    """Approved skeleton for (category, status) filled in locally, unless the caller forces the LLM."""
+    if data.get('force_llm'):
+        return None
+    reply = reply_templates.render(data.get('description', ''), data.get('category'), data.get('status', 'Received'))
+    metrics.incr('reply.template_hit' if reply else 'reply.template_miss')
+    return reply
+
 @api_view(['POST'])
+@admission.endpoint('interactive')
 def generate_reply(req):
     try:
         description = req.data.get('description', '')
@@ -166,25 +271,12 @@ def generate_reply(req):
         
         if not description: return Response({"reply": ""})
 
-        # IMPROVED PROMPT for variety and empathy
-        prompt = f"""
-        You are a helpful AI assistant for the Civix city management platform.
-        Your goal is to draft a polite, reassuring, and specific response to a citizen's issue report.
-        
-        Issue Report: "{description}"
-        Current Status: "{status}"
-        
-        Instructions:
-        1. Acknowledge the specific issue (mention keywords from the report).
-        2. Explain what the current status "{status}" means (e.g., 'Received' means we are reviewing it, 'In Progress' means a team is on it).
-        3. Be professional but empathetic.
-        4. Keep it under 50 words.
-        
-        Draft the reply now.
-        """
-        
+        reply = _template_reply(req.data)
+        if reply:
+            return Response({"reply": reply, "method": "TEMPLATE"})
+
         try:
-            reply = ask_gemini(prompt)
+            reply = ask_gemini(_reply_prompt(description, status))
             if reply:
                 return Response({"reply": reply})
             else:
@@ -199,31 +291,91 @@ def generate_reply(req):
         logger.error(f"Generate Reply API Error: {e}")
         return Response({"reply": "Thank you for reporting. We will update you soon."}, status=200)
 
-# --- 5. Resolution Predictor ---
+def _sse(payload, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(payload)}\n\n"
+
+@api_view(['POST'])
+def generate_reply_stream(req):
+    """
+    Server-sent events version of generate_reply: `data: {"delta": "..."}`
+    per chunk, then `event: done` with the full reply.
+    """
+    description = req.data.get('description', '')
+    status = req.data.get('status', 'Received')
+    try:
+        template = _template_reply(req.data) if description else None
+    except Exception as e:
+        logger.error(f"Reply template failed: {e}")
+        template = None
+
+    def events():
+        if not description:
+            yield _sse({"reply": ""}, event="done")
+            return
+        if template:
+            yield _sse({"delta": template})
+            yield _sse({"reply": template, "method": "TEMPLATE"}, event="done")
+            return
+        parts = []
+        try:
+            for text in stream_gemini(_reply_prompt(description, status)):
+                parts.append(text)
+                yield _sse({"delta": text})
+        except Exception as e:
+            logger.error(f"Gemini streaming failed: {e}")
+        reply = "".join(parts).strip()
+        if not reply:
+            reply = f"Thank you for your report. We have marked this as '{status}' and will look into it shortly."
+            yield _sse({"delta": reply})
+        yield _sse({"reply": reply, "method": "GEMINI_STREAM" if parts else "FALLBACK"}, event="done")
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache, no-transform'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@api_view(['GET', 'POST'])
+@permission_classes([permissions.AdminTokenOrReadOnly])
+def reply_templates_view(req):
+    """
+    GET lists approved skeletons; POST {category, status, template} approves
+    one and needs `Authorization: Bearer <ML_ADMIN_TOKEN>`.
+    """
+    if req.method == 'GET':
+        return Response({"templates": reply_templates.all_templates()})
+    status = req.data.get('status')
+    template = req.data.get('template', '')
+    category = req.data.get('category', '*')
+    if not status or not template:
+        return Response({"error": "status and template are required"}, status=400)
+    if not all(isinstance(value, str) for value in (status, template, category)):
+        return Response({"error": "category, status and template must be strings"}, status=400)
+    try:
+        reply_templates.approve(category, status, template)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    return Response({"approved": True})
+
+# --- 5. Resolution Predictor (local quantile model, no network) ---
 @api_view(['POST'])
 def predict_resolution_time(req):
     try:
-        # Simple heuristic fallback or Gemini guess
-        severity = int(req.data.get('severity', 5))
-        category = req.data.get('category', 'General')
-        
-        # We can ask Gemini for a "common sense" estimate based on category/severity
-        prompt = f"""
-        Estimate days to fix a civic issue.
-        Category: {category}
-        Severity (1-10): {severity}
-        
-        Return ONLY a JSON: {{"estimated_days": integer}}
-        """
-        response_text = ask_gemini(prompt)
-        if response_text:
-             import json
-             clean_text = response_text.replace('```json', '').replace('```', '')
-             data = json.loads(clean_text)
-             return Response({"estimated_days": data.get("estimated_days", 3)})
-             
-        return Response({"estimated_days": 3})
-    except:
+        return Response(resolution_model.predict(req.data))
+    except Exception as e:
+        logger.error(f"Resolution Prediction Error: {e}")
         return Response({"estimated_days": 3})
 
-
+@api_view(['POST'])
+def predict_resolution_time_batch(req):
+    """
+    Body: {"issues": [{"id", "category", "priority" or "severity", "lat", "lng", "created_at", "officer_workload"}]}.
+    A malformed issue gets {"id", "error"} in place of its prediction.
+    """
+    issues = req.data.get('issues', [])
+    if not isinstance(issues, list):
+        return Response({"error": "issues must be a list"}, status=400)
+    predictions = resolution_model.predict_many(issues)
+    for issue, prediction in zip(issues, predictions):
+        prediction['id'] = issue.get('id', issue.get('_id')) if isinstance(issue, dict) else None
+    return Response({"predictions": predictions})
@@ -0,0 +1,325 @@
+"""
+Opt-in capture of real ML traffic, and the server side of its replay.
+
+stress_test.py sends nine hand-written cases. Real traffic has a different
+mix of payload sizes, image URLs and audio lengths, and that mix is where
+latency regressions show up.
+
+Capture (ML_CAPTURE_DIR set): CaptureMiddleware samples ML_CAPTURE_RATE of
+the /api/ requests. Each sampled request becomes one JSON line in
+`capture-<pid>.jsonl.gz` in that directory. The line holds:
+- arrival time, method, path and content type;
+- the JSON body, or for multipart uploads only the form fields plus each
+  file's name, type and size;
+- response status, latency and size;
+- every upstream call the request made (api/upstream.py), with its latency
+  and a compact result.
+
+Each record passes through the ML_CAPTURE_REDACTORS hooks before it is
+written. A hook may return None to drop the record. The default hook masks
+e-mail addresses and phone numbers in the bodies, the query string and the
+upstream results. It leaves ids and timestamps alone.
+
+Replay (ML_REPLAY_FILES set): replay_capture.py re-sends the records with an
+X-Capture-Id header. The middleware makes that record's upstream calls
+current, so Gemini, embeddings and image downloads are answered from the
+recording after the recorded latency (none with ML_REPLAY_LATENCY=0). The
+server never touches the network. Work that runs outside the request, such
+as background jobs, finds nothing recorded and degrades as it would when
+Gemini is down.
+"""
+import atexit
+import contextvars
+import glob
+import gzip
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from functools import lru_cache
+from urllib.parse import parse_qsl, urlencode
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from api import metrics, prefilter
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_ID_HEADER = 'X-Capture-Id'
+SKIP_PATHS = ('/api/health/', '/api/metrics/')
+KEPT_HEADERS = ('HTTP_ACCEPT', 'HTTP_ACCEPT_ENCODING')  # they change the response cost; never auth / cookies
+
+_EMAIL = re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+')
+# Ids and timestamps, kept as they are so replayed requests still line up
+UNMASKED_KEYS = {
+    'id', '_id', 'issue_id', 'issueId', 'complaintId', 'job_id', 'draft_token', 'draftToken',
+    'created_at', 'createdAt', 'updated_at', 'updatedAt', 'resolved_at', 'resolvedAt',
+}
+
+# The current request's upstream calls: a list while recording, or
+# {service: deque of recorded calls} while replaying.
+_calls = contextvars.ContextVar('capture_calls', default=None)
+
+
+class ReplayMiss(RuntimeError):
+    """A replayed request made an upstream call that the recording doesn't have."""
+
+
+def capturing():
+    return bool(getattr(settings, 'ML_CAPTURE_DIR', None))
+
+
+def replaying():
+    return bool(getattr(settings, 'ML_REPLAY_FILES', None))
+
+
+# --- 1. Upstream calls (used by api/upstream.py) ---
+
+def record_call(service, ms, result=None, error=None):
+    calls = _calls.get()
+    if isinstance(calls, list):
+        call = {'service': service, 'ms': round(ms, 1)}
+        if error is not None:
+            call['error'] = error
+        elif result is not None:
+            call['result'] = result
+        calls.append(call)
+
+
+def recorded_call(service):
+    """
+    Next recorded `service` call ({ms, result} or {ms, error}) of the request
+    being replayed. Raises ReplayMiss when the recording has no more.
+    """
+    pending = _calls.get()
+    try:
+        call = pending[service].popleft()
+    except (TypeError, KeyError, IndexError):
+        metrics.incr('replay.miss')
+        raise ReplayMiss(f"No recorded {service} call for this request") from None
+    metrics.incr('replay.upstream_calls')
+    return call
+
+
+def pause(ms):
+    """Stand in for upstream latency; skipped with ML_REPLAY_LATENCY=0."""
+    if settings.ML_REPLAY_LATENCY and ms > 0:
+        time.sleep(ms / 1000)
+
+
+# --- 2. Redaction ---
+
+def _mask(value):
+    if isinstance(value, str):
+        return prefilter.mask_phones(_EMAIL.sub('<email>', value))
+    if isinstance(value, list):
+        return [_mask(item) for item in value]
+    if isinstance(value, dict):
+        return {key: item if key in UNMASKED_KEYS and isinstance(item, (str, int, float)) else _mask(item)
+                for key, item in value.items()}
+    return value
+
+
+def _mask_query(path):
+    base, sep, query = path.partition('?')
+    if not sep:
+        return path
+    pairs = parse_qsl(query, keep_blank_values=True)
+    masked = [(key, value if key in UNMASKED_KEYS else _mask(value)) for key, value in pairs]
+    return path if masked == pairs else f"{base}?{urlencode(masked)}"
+
+
+def redact_contact_details(record):
+    """Default redactor: masks e-mail addresses and phone numbers in the query string, bodies and upstream results."""
+    if 'path' in record:
+        record['path'] = _mask_query(record['path'])
+    for key in ('body', 'fields', 'upstream'):
+        if key in record:
+            record[key] = _mask(record[key])
+    return record
+
+
+@lru_cache(maxsize=1)
+def _redactors():
+    return [import_string(path) for path in settings.ML_CAPTURE_REDACTORS]
+
+
+def redact(record):
+    for redactor in _redactors():
+        record = redactor(record)
+        if record is None:
+            return None
+    return record
+
+
+# --- 3. Capture files ---
+
+class _Writer:
+    """Appends records to this process's gzip'd JSON-lines file, flushing after each one."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._file = None
+        self._pid = None
+
+    def write(self, record):
+        line = (json.dumps(record, separators=(',', ':'), default=str) + '\n').encode('utf-8')
+        with self._lock:
+            if self._pid != os.getpid():  # first write, or a forked worker
+                os.makedirs(settings.ML_CAPTURE_DIR, exist_ok=True)
+                path = os.path.join(settings.ML_CAPTURE_DIR, f'capture-{os.getpid()}.jsonl.gz')
+                self._file, self._pid = gzip.open(path, 'ab'), os.getpid()
+                atexit.register(self._file.close)  # writes the gzip trailer on a clean shutdown
+            self._file.write(line)
+            self._file.flush()  # a killed worker loses at most the record in flight
+        metrics.incr('capture.records')
+        metrics.observe('capture.record_bytes', len(line))
+
+
+_writer = _Writer()
+
+
+def read(paths):
+    """Yield the records of the given capture files (globs allowed). A truncated tail is skipped."""
+    for pattern in paths:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                try:
+                    for line in f:
+                        if line.strip():
+                            yield json.loads(line)
+                except (EOFError, json.JSONDecodeError):
+                    logger.warning(f"Capture file {path} is unfinished (still open, or its worker was killed)")
+
+
+@lru_cache(maxsize=1)
+def _replay_index():
+    index = {}
+    for record in read(settings.ML_REPLAY_FILES):
+        index[record['id']] = record.get('upstream', [])
+    logger.info(f"Replay: loaded upstream calls of {len(index)} captured requests")
+    return index
+
+
+def _pending_calls(capture_id):
+    pending = {}
+    for call in _replay_index().get(capture_id, []):
+        pending.setdefault(call['service'], deque()).append(call)
+    return pending
+
+
+# --- 4. Middleware ---
+
+def _request_body(request, record):
+    """Body of a request that will be sampled; read before the view so it can be kept."""
+    length = int(request.META.get('CONTENT_LENGTH') or 0)
+    record['body_bytes'] = length
+    if not length or record['content_type'].startswith('multipart/'):
+        return  # uploads stream to disk; their parts are described after the view has run
+    if length > settings.ML_CAPTURE_MAX_BODY_BYTES:
+        record['body_truncated'] = True
+        return
+    text = request.body.decode('utf-8', errors='replace')
+    try:
+        record['body'] = json.loads(text)
+    except ValueError:
+        record['body'] = text
+
+
+def _describe_upload(request, record):
+    if not record['content_type'].startswith('multipart/') or getattr(request, 'upload_rejected', None):
+        return
+    try:
+        record['fields'] = {key: request.POST.getlist(key) for key in request.POST}
+        record['files'] = [
+            {'field': field, 'name': upload.name, 'content_type': upload.content_type, 'size': upload.size}
+            for field, uploads in request.FILES.lists() for upload in uploads
+        ]
+    except Exception as e:  # the view never parsed the body and it can't be read any more
+        logger.warning(f"Capture could not describe upload: {e}")
+
+
+class CaptureMiddleware:
+    """Samples /api/ requests into capture files, or replays recorded upstream calls. See module docstring."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if replaying():
+            capture_id = request.headers.get(CAPTURE_ID_HEADER)
+            if not capture_id:
+                return self.get_response(request)
+            return self._run(request, _pending_calls(capture_id))
+
+        if (not capturing() or not request.path.startswith('/api/') or request.path in SKIP_PATHS
+                or random.random() >= settings.ML_CAPTURE_RATE):
+            return self.get_response(request)
+
+        record = {
+            'id': uuid.uuid4().hex[:16],
+            't': round(time.time(), 3),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'content_type': request.content_type or '',
+            'headers': {key: request.META[key] for key in KEPT_HEADERS if key in request.META},
+        }
+        _request_body(request, record)
+        start = time.perf_counter()
+        calls = []
+
+        def finish():
+            record['ms'] = round((time.perf_counter() - start) * 1000, 1)
+            record['upstream'] = calls
+            _describe_upload(request, record)
+            self._save(record)
+
+        response = self._run(request, calls, finish)
+        record['status'] = response.status_code
+        if not response.streaming:
+            record['response_bytes'] = len(response.content)
+            finish()
+        return response
+
+    def _run(self, request, calls, finish=None):
+        token = _calls.set(calls)
+        try:
+            response = self.get_response(request)
+        finally:
+            _calls.reset(token)
+        if response.streaming:
+            response.streaming_content = self._streamed(response.streaming_content, calls, finish)
+        return response
+
+    @staticmethod
+    def _streamed(content, calls, finish=None):
+        """Streamed bodies are produced after the view returns, so each chunk runs with the request's calls current."""
+        iterator = iter(content)
+        try:
+            while True:
+                token = _calls.set(calls)
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    _calls.reset(token)
+                yield chunk
+        finally:
+            if finish:
+                finish()
+
+    @staticmethod
+    def _save(record):
+        try:
+            record = redact(record)
+            if record is not None:
+                _writer.write(record)
+        except Exception as e:
+            logger.error(f"Capture write failed: {e}")
@@ -0,0 +1,46 @@
+"""
+The category vocabulary the service answers in.
+
+It is the list the LLM is asked to choose from and the one the report form
+offers. The local sklearn model and the seed centroids were trained on
+datasets/civic_data.csv, which uses older names ('Water Supply', 'General',
+'Noise', 'Safety', ...) and a 'Spam' class. `normalize` maps any of those,
+and the form's extra choices, onto CATEGORIES. 'Spam' is not a category (the
+fake verdict covers it), so it normalises to None.
+"""
+CATEGORIES = [
+    'Roads', 'Electricity', 'Water', 'Sanitation', 'Traffic', 'Public Transport',
+    'Billing', 'Technical Support', 'Profile', 'Other',
+]
+
+ALIASES = {
+    'water supply': 'Water',
+    'garbage': 'Sanitation',
+    'account access': 'Profile',
+    'general': 'Other',
+    'noise': 'Other',
+    'safety': 'Other',
+    'feedback': 'Other',
+    'spam': None,
+}
+
+FALLBACK = 'Other'  # when nothing could categorize the report
+
+# Vocabulary category -> class of the civic_data.csv models, where the names differ
+MODEL_CLASSES = {'Water': 'Water Supply', 'Other': 'General'}
+
+_CANONICAL = {category.lower(): category for category in CATEGORIES}
+
+
+def normalize(label):
+    """The CATEGORIES entry for `label`, or None for 'Spam' and labels we don't know."""
+    key = ' '.join(str(label or '').split()).lower()
+    if key in _CANONICAL:
+        return _CANONICAL[key]
+    return ALIASES.get(key)
+
+
+def model_class(category, classes):
+    """The class in `classes` (a civic_data.csv model's) for vocabulary `category`, or None."""
+    name = MODEL_CLASSES.get(category, category)
+    return name if name in classes else None
@@ -0,0 +1,212 @@
+"""
+Nearest-centroid categorizer over issue embeddings.
+
+Every issue already gets an embedding. Each category is kept as the running
+sum of its labelled, unit-length embeddings, so a category's centroid is one
+vector and categorizing an embedding is one dot product against about ten
+rows. When the best two categories are within CENTROID_MIN_MARGIN cosine of
+each other, the embedding isn't decisive and the caller asks the LLM instead.
+
+Sums live in the `ml_category_centroids` table, keyed by embedding backend so
+vectors from different models are never mixed. Adding labelled examples
+(build_centroids.py, moderator corrections via api/feedback.py, or
+POST /api/category-centroids/) only adds to the sums. Every worker re-reads
+the table at most every CENTROID_REFRESH_SECONDS.
+
+Labels are normalised to the service vocabulary (api/categories.py) on the
+way in. Rows stored under the older civic_data.csv names are merged into
+their category when the table is read. Examples labelled 'Spam' are kept as
+a sink centroid. An embedding nearest to it is never decisive, so the LLM
+picks the category and the fake verdict deals with the spam.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+from api import categories, embeddings, metrics, sqlite
+
+CENTROID_MIN_MARGIN = float(os.getenv('CENTROID_MIN_MARGIN', '0.04'))
+CENTROID_MIN_EXAMPLES = int(os.getenv('CENTROID_MIN_EXAMPLES', '5'))  # per category before it is used
+CENTROID_REFRESH_SECONDS = float(os.getenv('CENTROID_REFRESH_SECONDS', '30'))
+CENTROID_TEMPERATURE = 0.02  # softmax over cosine scores, for the reported confidence
+SPAM = 'Spam'  # sink centroid, never returned as a decisive category
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ml_category_centroids (
+    backend TEXT NOT NULL,
+    category TEXT NOT NULL,
+    dim INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    total BLOB NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (backend, category)
+);
+"""
+
+_cache_lock = threading.Lock()
+_cache = None  # (backend, loaded_at, labels, matrix, counts)
+
+
+def _db():
+    return sqlite.db(_SCHEMA)
+
+
+def _label(category):
+    """The vocabulary category (or SPAM) for an example label, or None if it is unknown."""
+    if str(category).strip().lower() == SPAM.lower():
+        return SPAM
+    return categories.normalize(category)
+
+
+def _unit(vectors):
+    vectors = np.asarray(vectors, dtype=np.float64)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+# --- 1. Labelled examples ---
+
+def add(examples, backend=None):
+    """Fold [(category, embedding)] into the centroids. Returns {category: examples added}."""
+    backend = backend or embeddings.backend_name()
+    if not backend:
+        raise RuntimeError("No embedding backend configured")
+    by_category = {}
+    for category, vector in examples:
+        label = _label(category)
+        if label is None:
+            raise ValueError(f"Unknown category '{category}' (expected one of {', '.join(categories.CATEGORIES)})")
+        by_category.setdefault(label, []).append(vector)
+
+    added, now = {}, time.time()
+    with _db() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for category, vectors in by_category.items():
+                total = _unit(vectors).sum(axis=0)
+                row = conn.execute(
+                    'SELECT dim, count, total FROM ml_category_centroids WHERE backend = ? AND category = ?',
+                    (backend, category),
+                ).fetchone()
+                count = len(vectors)
+                if row:
+                    if row['dim'] != total.shape[0]:
+                        raise ValueError(f"{category}: embedding has {total.shape[0]} dims, centroid has {row['dim']}")
+                    total += np.frombuffer(row['total'], dtype=np.float64)
+                    count += row['count']
+                conn.execute(
+                    'INSERT OR REPLACE INTO ml_category_centroids (backend, category, dim, count, total, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (backend, category, total.shape[0], count, total.tobytes(), now),
+                )
+                added[category] = len(vectors)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    invalidate()
+    metrics.incr('centroids.examples', sum(added.values()))
+    return added
+
+
+def add_texts(items, endpoint_class='background'):
+    """Embed [(category, text)] in provider-sized batches and fold them in."""
+    added = {}
+    step = embeddings.batch_size()
+    for offset in range(0, len(items), step):
+        chunk = items[offset:offset + step]
+        vectors = embeddings.embed_texts([text for _, text in chunk], endpoint_class=endpoint_class)
+        for category, n in add(zip([category for category, _ in chunk], vectors)).items():
+            added[category] = added.get(category, 0) + n
+    return added
+
+
+def reset(backend=None):
+    backend = backend or embeddings.backend_name()
+    with _db() as conn:
+        conn.execute('DELETE FROM ml_category_centroids WHERE backend = ?', (backend,))
+    invalidate()
+
+
+# --- 2. Classification ---
+
+def invalidate():
+    global _cache
+    with _cache_lock:
+        _cache = None
+
+
+def _centroids():
+    """(labels, unit centroid matrix, counts) for the current backend; cached per worker."""
+    global _cache
+    backend = embeddings.backend_name()
+    cached = _cache
+    if cached and cached[0] == backend and time.monotonic() - cached[1] < CENTROID_REFRESH_SECONDS:
+        return cached[2:]
+    with _cache_lock:
+        with _db() as conn:
+            rows = conn.execute(
+                'SELECT category, count, total FROM ml_category_centroids WHERE backend = ? ORDER BY category',
+                (backend,),
+            ).fetchall()
+        merged = {}  # rows under older names fold into their vocabulary category
+        for row in rows:
+            label = _label(row['category'])
+            if label is None:
+                continue
+            total = np.frombuffer(row['total'], dtype=np.float64)
+            if label in merged and merged[label][1].shape == total.shape:
+                merged[label] = (merged[label][0] + row['count'], merged[label][1] + total)
+            elif label not in merged:
+                merged[label] = (row['count'], total)
+        usable = sorted(label for label, (count, _) in merged.items() if count >= CENTROID_MIN_EXAMPLES)
+        counts = [merged[label][0] for label in usable]
+        matrix = _unit([merged[label][1] for label in usable]) if usable else None
+        _cache = (backend, time.monotonic(), usable, matrix, counts)
+    return usable, matrix, counts
+
+
+def ready():
+    """At least two usable categories exist for the current embedding backend."""
+    return bool(embeddings.backend_name()) and len(_centroids()[0]) >= 2
+
+
+def classify(vector):
+    """
+    {category, confidence, margin, decisive} for one embedding, or None when
+    there are fewer than two usable centroids or the dimensions don't match.
+    """
+    labels, matrix, _ = _centroids()
+    if matrix is None or len(labels) < 2 or len(vector) != matrix.shape[1]:
+        return None
+    scores = matrix @ _unit(vector)
+    second, best = np.argpartition(scores, -2)[-2:]
+    if scores[second] > scores[best]:
+        best, second = second, best
+    margin = float(scores[best] - scores[second])
+    weights = np.exp((scores - scores[best]) / CENTROID_TEMPERATURE)
+    decisive = margin >= CENTROID_MIN_MARGIN and labels[best] != SPAM
+    metrics.incr('centroids.decisive' if decisive else 'centroids.ambiguous')
+    return {
+        'category': labels[best],
+        'confidence': round(float(weights[best] / weights.sum()), 4),
+        'margin': round(margin, 4),
+        'decisive': decisive,
+    }
+
+
+def stats():
+    """Usable centroids and how often they were decisive, for the metrics endpoint."""
+    labels, _, counts = _centroids()
+    decisive, ambiguous = metrics.get('centroids.decisive'), metrics.get('centroids.ambiguous')
+    return {
+        'backend': embeddings.backend_name(),
+        'categories': dict(zip(labels, counts)),
+        'min_margin': CENTROID_MIN_MARGIN,
+        'decisive': decisive,
+        'llm_fallback': ambiguous,
+        'decisive_rate': metrics.ratio(decisive, decisive + ambiguous),
+    }
@@ -0,0 +1,214 @@
+"""
+Speculative analysis of issue reports while they are being typed.
+
+The report form posts the title and description here, debounced, under a
+draft token (POST /api/drafts/analyze/). Each time the normalised text
+changes, a background run works through the registered stages: priority,
+fake verdict, then embedding + category. After each stage it stores that
+stage's result against the text key. A run stops at the next stage boundary
+once newer text has arrived for its draft. Unchanged text (whitespace, case
+or punctuation edits) costs one SQLite read.
+
+On submit the backend calls POST /api/drafts/resolve/ with the token and the
+final text. If the stored text key matches, the stored results are returned
+and no model is called. Stages the run hadn't reached yet are computed in
+the request, in parallel. Text that doesn't match, an unknown token or no
+token at all computes everything, like the three separate triage calls did.
+
+Results live in the ml_drafts table (ML_JOBS_DB), so every gunicorn worker
+can resolve a draft that another one analysed. Drafts expire after
+DRAFT_TTL_HOURS. Background runs call Gemini under the `background`
+admission class, so speculative work never takes upstream slots from triage.
+
+Stages are registered in api/views.py:
+
+    @drafts.stage('priority', fallback={'priority': 'Medium', 'confidence': 0.0})
+    def _draft_priority(title, description):
+        ...  # the verdict, or None when there is no answer to keep
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from api import metrics, minhash, sqlite
+
+logger = logging.getLogger(__name__)
+
+DRAFT_TTL_HOURS = float(os.getenv('DRAFT_TTL_HOURS', '24'))
+DRAFT_MIN_WORDS = int(os.getenv('DRAFT_MIN_WORDS', '3'))
+DRAFT_CONCURRENCY = int(os.getenv('DRAFT_CONCURRENCY', '2'))
+MAX_TOKEN_LENGTH = 64
+PRUNE_INTERVAL_SECONDS = 600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ml_drafts (
+    token TEXT PRIMARY KEY,
+    text_key TEXT NOT NULL,
+    results TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ml_drafts_age ON ml_drafts (updated_at);
+"""
+
+_last_prune = 0.0
+
+# name -> (fn(title, description) -> result or None, fallback), in run order
+_stages = {}
+
+_executor = ThreadPoolExecutor(max_workers=DRAFT_CONCURRENCY, thread_name_prefix='draft')
+_running = set()  # (token, text key) of runs queued or in progress in this worker
+_running_lock = threading.Lock()
+
+
+def stage(name, fallback):
+    """Register a draft stage. `fallback` is what resolve returns when the stage has no answer."""
+    def decorator(fn):
+        _stages[name] = (fn, fallback)
+        return fn
+    return decorator
+
+
+def _db():
+    return sqlite.db(_SCHEMA)
+
+
+def text_key(title, description):
+    return minhash.text_key(f"{title} {description}")
+
+
+def valid_token(token):
+    return isinstance(token, str) and 0 < len(token) <= MAX_TOKEN_LENGTH
+
+
+def _stored(conn, token, key):
+    """Results stored for `token` if they belong to text `key`, otherwise None."""
+    row = conn.execute('SELECT text_key, results FROM ml_drafts WHERE token = ?', (token,)).fetchone()
+    if row is None or row['text_key'] != key:
+        return None
+    return json.loads(row['results'])
+
+
+# --- 1. While typing ---
+
+def analyze(token, title, description):
+    """
+    Note the draft's current text and start a background run if it changed.
+    Returns {draft_token, ready: [stages done], pending: [stages still to run]}.
+    """
+    token = token if valid_token(token) else uuid.uuid4().hex
+    key = text_key(title, description)
+    now = time.time()
+    with _db() as conn:
+        results = _stored(conn, token, key)
+        if results is None:
+            results = {}
+            conn.execute(
+                'INSERT INTO ml_drafts (token, text_key, results, updated_at) VALUES (?, ?, ?, ?) '
+                "ON CONFLICT (token) DO UPDATE SET text_key = excluded.text_key, results = '{}', "
+                'updated_at = excluded.updated_at',
+                (token, key, '{}', now),
+            )
+            metrics.incr('drafts.changed')
+        else:
+            conn.execute('UPDATE ml_drafts SET updated_at = ? WHERE token = ?', (now, token))
+            metrics.incr('drafts.unchanged')
+        if now - _last_prune > PRUNE_INTERVAL_SECONDS:
+            _prune(conn, now)
+
+    pending = [name for name in _stages if name not in results]
+    if pending and len(f"{title} {description}".split()) >= DRAFT_MIN_WORDS:
+        with _running_lock:
+            start = (token, key) not in _running
+            _running.add((token, key))
+        if start:
+            _executor.submit(_run, token, key, title, description)
+    return {'draft_token': token, 'ready': [name for name in _stages if name in results], 'pending': pending}
+
+
+def _run(token, key, title, description):
+    try:
+        for name, (fn, _) in _stages.items():
+            with _db() as conn:
+                results = _stored(conn, token, key)
+            if results is None:
+                metrics.incr('drafts.superseded')
+                return
+            if name in results:
+                continue
+            start = time.perf_counter()
+            try:
+                result = fn(title, description)
+            except Exception as e:
+                logger.error(f"Draft {name} Error: {e}")
+                continue
+            metrics.observe(f'drafts.stage.{name}_ms', (time.perf_counter() - start) * 1000)
+            if result is not None:
+                _save(token, key, name, result)
+    finally:
+        with _running_lock:
+            _running.discard((token, key))
+
+
+def _save(token, key, name, result):
+    """Store one stage's result, unless the draft has moved on to other text meanwhile."""
+    with _db() as conn:
+        conn.execute(
+            'UPDATE ml_drafts SET results = json_set(results, ?, json(?)) WHERE token = ? AND text_key = ?',
+            (f'$.{name}', json.dumps(result), token, key),
+        )
+
+
+def _prune(conn, now):
+    global _last_prune
+    _last_prune = now
+    conn.execute('DELETE FROM ml_drafts WHERE updated_at < ?', (now - DRAFT_TTL_HOURS * 3600,))
+
+
+# --- 2. On submit ---
+
+def resolve(token, title, description):
+    """
+    Every stage's result for the final text: ({stage: result}, hit) where hit
+    is 'full' (no model work), 'partial' or 'miss'.
+    """
+    results = None
+    if valid_token(token):
+        with _db() as conn:
+            results = _stored(conn, token, text_key(title, description))
+    results = dict(results or {})
+    missing = [name for name in _stages if name not in results]
+    hit = 'miss' if len(missing) == len(_stages) else 'partial' if missing else 'full'
+    metrics.incr(f'drafts.resolve.{hit}')
+
+    if missing:
+        # Same fan-out as the separate triage calls; each thread keeps the request's admission class.
+        with ThreadPoolExecutor(max_workers=len(missing)) as pool:
+            futures = {name: pool.submit(contextvars.copy_context().run, _stages[name][0], title, description)
+                       for name in missing}
+            for name, future in futures.items():
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    logger.error(f"Draft {name} Error: {e}")
+    for name, (_, fallback) in _stages.items():
+        if results.get(name) is None:
+            results[name] = dict(fallback)
+    return results, hit
+
+
+def stats():
+    """Stored drafts and how often submits found their results ready, for the metrics endpoint."""
+    with _db() as conn:
+        stored = conn.execute('SELECT COUNT(*) FROM ml_drafts').fetchone()[0]
+    resolved = {hit: metrics.get(f'drafts.resolve.{hit}') for hit in ('full', 'partial', 'miss')}
+    return {
+        'stored': stored,
+        'resolved': resolved,
+        'full_hit_rate': metrics.ratio(resolved['full'], sum(resolved.values())),
+        'superseded_runs': metrics.get('drafts.superseded'),
+    }
@@ -0,0 +1,71 @@
+"""
+Text embeddings: Gemini `embedding-001`, or a local sentence-transformers
+model when LOCAL_EMBEDDING_MODEL is set (e.g. "all-MiniLM-L6-v2").
+
+`embed_texts` takes a list and sends it upstream in provider-sized batches,
+which is what the bulk backfill endpoint builds on.
+"""
+import logging
+import os
+import re
+
+from api import admission
+from api.advanced_ai import GEMINI_API_KEY, get_genai
+from civix_ml.startup import lazy_module
+
+logger = logging.getLogger(__name__)
+
+GEMINI_EMBEDDING_MODEL = "models/embedding-001"
+PROVIDER_BATCH_SIZE = 100  # Gemini batchEmbedContents limit
+LOCAL_EMBEDDING_MODEL = os.getenv('LOCAL_EMBEDDING_MODEL')
+LOCAL_BATCH_SIZE = 256
+
+_sentence_transformers = lazy_module('sentence_transformers')
+_local_model = None
+
+_SPACES = re.compile(r'\s+')
+
+
+def normalize(text):
+    """Whitespace-insensitive key used to de-duplicate identical texts."""
+    return _SPACES.sub(' ', (text or '')).strip()
+
+
+def backend_name():
+    if LOCAL_EMBEDDING_MODEL:
+        return f"local:{LOCAL_EMBEDDING_MODEL}"
+    return f"gemini:{GEMINI_EMBEDDING_MODEL}" if GEMINI_API_KEY else None
+
+
+def batch_size():
+    return LOCAL_BATCH_SIZE if LOCAL_EMBEDDING_MODEL else PROVIDER_BATCH_SIZE
+
+
+def _get_local_model():
+    global _local_model
+    if _local_model is None:
+        _local_model = _sentence_transformers().SentenceTransformer(LOCAL_EMBEDDING_MODEL)
+    return _local_model
+
+
+def embed_texts(texts, endpoint_class=None):
+    """Embed one provider batch of texts. Raises on upstream failure or admission.Overloaded."""
+    if not texts:
+        return []
+    if LOCAL_EMBEDDING_MODEL:
+        vectors = _get_local_model().encode(list(texts), batch_size=LOCAL_BATCH_SIZE, normalize_embeddings=True)
+        return [v.tolist() for v in vectors]
+    if not GEMINI_API_KEY:
+        raise RuntimeError("No embedding backend configured")
+    with admission.admit('embeddings', endpoint_class=endpoint_class):
+        result = get_genai().embed_content(
+            model=GEMINI_EMBEDDING_MODEL,
+            content=list(texts),
+            task_type="retrieval_document",
+            title="Civic Issue"
+        )
+    return result['embedding']
+
+
+def embed_text(text):
+    return embed_texts([text])[0]
@@ -0,0 +1,283 @@
+"""
+Online learning from moderator corrections.
+
+Corrections posted to `/api/feedback/` are appended to the `ml_feedback`
+table and applied in micro-batches: once FEEDBACK_BATCH_SIZE corrections are
+pending, or FEEDBACK_FLUSH_SECONDS after the first one arrived, a single
+background thread
+
+1. copies the current model from the registry (requests keep using the live
+   one meanwhile),
+2. runs `SGDClassifier.partial_fit` on the corrections plus a replay sample
+   of the original training data, so a burst of one label can't drag the
+   model away from everything else,
+3. scores the copy on the validation split of civic_data.csv (rows that are
+   never trained or replayed, see model_registry.in_validation_split) and
+   publishes it as a new checkpoint unless it got worse by more than
+   MAX_REGRESSION.
+
+Category labels are normalised to the service vocabulary (api/categories.py),
+so the backend's names are accepted. They are trained into the model under
+its civic_data.csv class. Vocabulary categories the model has no class for
+(Billing, Technical Support, Profile) are not trained into it. All category
+corrections are also added to the embedding centroids (api/centroids.py),
+whether or not a checkpoint was published.
+
+The TF-IDF vocabulary is fixed at training time: partial_fit only moves the
+classifier weights, so words never seen in civic_data.csv carry no signal
+until the next offline retrain.
+"""
+import copy
+import csv
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from api import categories, centroids, embeddings, metrics, model_registry, sqlite
+
+logger = logging.getLogger(__name__)
+
+PENDING, TRAINING, APPLIED, REJECTED = 'pending', 'training', 'applied', 'rejected'
+
+FEEDBACK_BATCH_SIZE = int(os.getenv('FEEDBACK_BATCH_SIZE', '32'))
+FEEDBACK_FLUSH_SECONDS = float(os.getenv('FEEDBACK_FLUSH_SECONDS', '60'))
+REPLAY_FACTOR = 4  # original training rows replayed per correction
+CORRECTION_WEIGHT = 2.0
+MAX_REGRESSION = 0.04  # validation accuracy a checkpoint may lose before it is rejected
+
+DATASETS_DIR = os.path.join(model_registry.BASE_DIR, 'datasets')
+TRAINING_SET = os.path.join(DATASETS_DIR, 'civic_data.csv')
+LABEL_COLUMNS = {'priority': 'priority', 'category': 'category', 'fake': 'is_fake'}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ml_feedback (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task TEXT NOT NULL,
+    text TEXT NOT NULL,
+    label TEXT NOT NULL,
+    issue_id TEXT,
+    status TEXT NOT NULL,
+    batch TEXT,
+    version INTEGER,
+    created_at REAL NOT NULL,
+    applied_at REAL
+);
+CREATE INDEX IF NOT EXISTS ml_feedback_status ON ml_feedback (status, created_at);
+"""
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='feedback')
+_timer = None
+_timer_lock = threading.Lock()
+_datasets = {}
+
+
+def _db():
+    return sqlite.db(_SCHEMA)
+
+
+def _load_rows(task, validation):
+    """civic_data.csv (text, label) rows for `task`: the validation split, or everything else."""
+    key = (task, validation)
+    if key not in _datasets:
+        column = LABEL_COLUMNS[task]
+        with open(TRAINING_SET, newline='', encoding='utf-8') as f:
+            rows = [(row['text'], row[column]) for row in csv.DictReader(f)
+                    if model_registry.in_validation_split(row['text']) == validation]
+        _datasets[key] = rows
+    return _datasets[key]
+
+
+def _coerce_label(task, label, classes):
+    if task == 'fake':
+        if isinstance(label, str):
+            label = label.strip().lower() in ('1', 'true', 'yes', 'spam', 'fake')
+        return int(bool(label))
+    if task == 'category':
+        category = categories.normalize(label)
+        if category is None and str(label).strip().lower() == 'spam':
+            raise ValueError("Spam is not a category, send a 'fake' correction instead")
+        if category is None:
+            raise ValueError(f"Unknown category '{label}' (expected one of {', '.join(categories.CATEGORIES)})")
+        return category
+    label = str(label).strip()
+    if label not in classes:
+        raise ValueError(f"Unknown {task} label '{label}' (expected one of {', '.join(classes)})")
+    return label
+
+
+def _typed(task, labels):
+    return np.array([int(l) for l in labels] if task == 'fake' else [str(l) for l in labels])
+
+
+# --- 1. Intake ---
+
+def record(corrections):
+    """
+    Validate and store corrections: [{task, text | title + description, label, issue_id?}].
+    Returns (accepted, errors) where errors are [{index, error}].
+    """
+    accepted, errors, rows = 0, [], []
+    now = time.time()
+    for index, item in enumerate(corrections):
+        try:
+            task = item.get('task')
+            if task not in LABEL_COLUMNS:
+                raise ValueError(f"task must be one of {', '.join(LABEL_COLUMNS)}")
+            text = (item.get('text') or f"{item.get('title', '')} {item.get('description', '')}").strip()
+            if not text:
+                raise ValueError("text (or title / description) is required")
+            _, model = model_registry.current(task)
+            classes = [str(c) for c in model.named_steps['clf'].classes_]
+            label = _coerce_label(task, item.get('label'), classes)
+        except (ValueError, AttributeError) as e:
+            errors.append({'index': index, 'error': str(e)})
+            continue
+        rows.append((task, text, json.dumps(label), item.get('issue_id'), PENDING, now))
+        accepted += 1
+
+    if rows:
+        with _db() as conn:
+            conn.executemany(
+                'INSERT INTO ml_feedback (task, text, label, issue_id, status, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                rows,
+            )
+        metrics.incr('feedback.received', accepted)
+        _schedule_flush()
+    return accepted, errors
+
+
+def _pending_count():
+    with _db() as conn:
+        return conn.execute('SELECT COUNT(*) FROM ml_feedback WHERE status = ?', (PENDING,)).fetchone()[0]
+
+
+def _schedule_flush():
+    global _timer
+    if _pending_count() >= FEEDBACK_BATCH_SIZE:
+        _executor.submit(_flush_safely)
+        return
+    with _timer_lock:
+        if _timer is None:
+            _timer = threading.Timer(FEEDBACK_FLUSH_SECONDS, _on_timer)
+            _timer.daemon = True
+            _timer.start()
+
+
+def _on_timer():
+    global _timer
+    with _timer_lock:
+        _timer = None
+    _executor.submit(_flush_safely)
+
+
+# --- 2. Micro-batch updates ---
+
+def _flush_safely():
+    try:
+        flush()
+    except Exception as e:
+        logger.error(f"Feedback flush failed: {e}")
+
+
+def flush():
+    """Apply every pending correction. Returns {task: outcome}."""
+    outcomes = {}
+    with model_registry.exclusive():
+        batch = uuid.uuid4().hex
+        with _db() as conn:
+            # Rows left `training` by a crashed worker are safe to take: we hold the registry lock.
+            conn.execute(
+                'UPDATE ml_feedback SET status = ?, batch = ? WHERE status IN (?, ?)',
+                (TRAINING, batch, PENDING, TRAINING),
+            )
+            rows = conn.execute('SELECT * FROM ml_feedback WHERE batch = ? ORDER BY id', (batch,)).fetchall()
+
+        by_task = {}
+        for row in rows:
+            by_task.setdefault(row['task'], []).append(row)
+
+        for task, task_rows in by_task.items():
+            start = time.perf_counter()
+            outcome = _apply(task, [r['text'] for r in task_rows], [json.loads(r['label']) for r in task_rows])
+            status = APPLIED if outcome['accepted'] else REJECTED
+            with _db() as conn:
+                conn.executemany(
+                    'UPDATE ml_feedback SET status = ?, version = ?, applied_at = ? WHERE id = ?',
+                    [(status, outcome['version'], time.time(), r['id']) for r in task_rows],
+                )
+            metrics.incr(f'feedback.{status}', len(task_rows))
+            metrics.observe('feedback.train_seconds', time.perf_counter() - start)
+            outcomes[task] = outcome
+            logger.info(f"Feedback {task}: {len(task_rows)} corrections {status} ({outcome})")
+            if task == 'category':
+                _teach_centroids(task_rows)
+    return outcomes
+
+
+def _teach_centroids(rows):
+    """Moderator category labels are also examples for the embedding categorizer."""
+    if not embeddings.backend_name():
+        return
+    try:
+        centroids.add_texts([(json.loads(r['label']), r['text']) for r in rows])
+    except Exception as e:
+        logger.error(f"Centroid update from feedback failed: {e}")
+
+
+def validation_accuracy(task, model):
+    rows = _load_rows(task, validation=True)
+    predictions = model.predict([text for text, _ in rows])
+    return float(np.mean(predictions == _typed(task, [label for _, label in rows])))
+
+
+def _apply(task, texts, labels):
+    live_version, live = model_registry.current(task)
+    model = copy.deepcopy(live)
+    vectorizer, clf = model.named_steps['tfidf'], model.named_steps['clf']
+
+    corrections = len(texts)
+    if task == 'category':
+        classes = [str(c) for c in clf.classes_]
+        trainable = [(text, categories.model_class(label, classes)) for text, label in zip(texts, labels)]
+        trainable = [(text, label) for text, label in trainable if label is not None]
+        texts, labels = [text for text, _ in trainable], [label for _, label in trainable]
+        if not texts:
+            # Only categories the model has no class for: they still reach the centroids
+            return {'corrections': corrections, 'trained': 0, 'accepted': True, 'version': live_version}
+
+    training = _load_rows(task, validation=False)
+    replay = random.sample(training, min(len(training), REPLAY_FACTOR * len(texts)))
+    X = vectorizer.transform(texts + [text for text, _ in replay])
+    y = _typed(task, list(labels) + [label for _, label in replay])
+    weights = np.array([CORRECTION_WEIGHT] * len(texts) + [1.0] * len(replay))
+    clf.partial_fit(X, y, sample_weight=weights)
+
+    before = validation_accuracy(task, live)
+    after = validation_accuracy(task, model)
+    outcome = {'corrections': corrections, 'trained': len(texts),
+               'validation_before': round(before, 4), 'validation_after': round(after, 4)}
+    if after < before - MAX_REGRESSION:
+        return {**outcome, 'accepted': False, 'version': live_version}
+    version = model_registry.checkpoint(task, model, {
+        'corrections': corrections,
+        'validation_accuracy': round(after, 4),
+    })
+    return {**outcome, 'accepted': True, 'version': version}
+
+
+def stats():
+    with _db() as conn:
+        counts = conn.execute(
+            'SELECT task, status, COUNT(*) AS n FROM ml_feedback GROUP BY task, status'
+        ).fetchall()
+    by_task = {}
+    for row in counts:
+        by_task.setdefault(row['task'], {})[row['status']] = row['n']
+    return {'corrections': by_task, 'models': model_registry.describe()}
@@ -0,0 +1,274 @@
+"""
+Incremental geo-temporal hotspots.
+
+Issues are folded in as they are created (POST /api/hotspots/ingest/). Each
+one lands in a grid cell of HOTSPOT_CELL_DEGREES for its category, about
+1.1 km at the default 0.01. Per (cell, category) we keep:
+
+- two exponentially decayed counts: `short` with a half-life of
+  HOTSPOT_SHORT_HALF_LIFE_HOURS for what is happening now, and `long` with a
+  half-life of HOTSPOT_LONG_HALF_LIFE_HOURS for the cell's normal level;
+- hourly bucket counts for the last HOTSPOT_RETENTION_DAYS, for timelines.
+
+A cell is bursting when its short-term count exceeds what its long-term rate
+predicts for the same window by HOTSPOT_BURST_Z Poisson standard deviations
+and has at least HOTSPOT_MIN_EVENTS reports behind it. GET /api/hotspots/
+decays every cell to "now" in one numpy pass, merges neighbouring active
+cells of the same category into clusters and returns the top emerging ones.
+That costs O(cells) and never rescans the issue collection.
+"""
+import heapq
+import math
+import os
+import time
+
+import numpy as np
+
+from api import metrics, sqlite
+
+HOTSPOT_CELL_DEGREES = float(os.getenv('HOTSPOT_CELL_DEGREES', '0.01'))
+HOTSPOT_SHORT_HALF_LIFE_HOURS = float(os.getenv('HOTSPOT_SHORT_HALF_LIFE_HOURS', '6'))
+HOTSPOT_LONG_HALF_LIFE_HOURS = float(os.getenv('HOTSPOT_LONG_HALF_LIFE_HOURS', str(7 * 24)))
+HOTSPOT_BURST_Z = float(os.getenv('HOTSPOT_BURST_Z', '3'))
+HOTSPOT_MIN_EVENTS = float(os.getenv('HOTSPOT_MIN_EVENTS', '3'))
+HOTSPOT_RETENTION_DAYS = int(os.getenv('HOTSPOT_RETENTION_DAYS', '7'))
+BUCKET_SECONDS = 3600
+TIMELINE_BUCKETS = 24
+ACTIVE_SHORT_COUNT = 0.5  # decayed reports a neighbour needs to be merged into a cluster
+PRUNE_INTERVAL_SECONDS = 3600
+
+SHORT_TAU = HOTSPOT_SHORT_HALF_LIFE_HOURS * 3600 / math.log(2)
+LONG_TAU = HOTSPOT_LONG_HALF_LIFE_HOURS * 3600 / math.log(2)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ml_hotspot_cells (
+    row INTEGER NOT NULL,
+    col INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    short REAL NOT NULL,
+    long REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    total INTEGER NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (row, col, category)
+);
+CREATE TABLE IF NOT EXISTS ml_hotspot_buckets (
+    row INTEGER NOT NULL,
+    col INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (row, col, category, bucket)
+);
+CREATE INDEX IF NOT EXISTS ml_hotspot_buckets_age ON ml_hotspot_buckets (bucket);
+CREATE TABLE IF NOT EXISTS ml_hotspot_seen (
+    issue_id TEXT PRIMARY KEY,
+    seen_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ml_hotspot_seen_age ON ml_hotspot_seen (seen_at);
+"""
+
+_last_prune = 0.0
+
+
+def _db():
+    return sqlite.db(_SCHEMA)
+
+
+def cell_of(lat, lng):
+    return math.floor(lat / HOTSPOT_CELL_DEGREES), math.floor(lng / HOTSPOT_CELL_DEGREES)
+
+
+def _decayed(value, since, until, tau):
+    """`value` as of `since`, decayed to the later time `until`."""
+    return value * math.exp(-(until - since) / tau)
+
+
+# --- 1. Ingestion ---
+
+def record(events):
+    """
+    Fold issues into the grid: [{id?, lat, lng, category?, created_at?}].
+    Events whose id was already seen are skipped, so a backfill can be re-run.
+    Events older than the cell horizon are skipped too. They would add under
+    0.4% to a baseline, and their ids are no longer kept to catch a re-run.
+    Returns (recorded, skipped, errors) where errors are [{index, error}].
+    """
+    recorded, skipped, errors = 0, 0, []
+    now = time.time()
+    horizon = _horizon(now)
+    with _db() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for index, event in enumerate(events):
+                try:
+                    lat, lng = float(event['lat']), float(event['lng'])
+                    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+                        raise ValueError("lat / lng out of range")
+                    at = min(sqlite.timestamp(event.get('created_at')), now)
+                except (KeyError, TypeError, ValueError) as e:
+                    errors.append({'index': index, 'error': str(e)})
+                    continue
+                issue_id = event.get('id')
+                if at < horizon or (issue_id is not None and conn.execute(
+                    'INSERT OR IGNORE INTO ml_hotspot_seen (issue_id, seen_at) VALUES (?, ?)', (str(issue_id), at)
+                ).rowcount == 0):
+                    skipped += 1
+                    continue
+                _add(conn, *cell_of(lat, lng), str(event.get('category') or 'General'), at)
+                recorded += 1
+            if now - _last_prune > PRUNE_INTERVAL_SECONDS:
+                _prune(conn, now)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+    metrics.incr('hotspots.ingested', recorded)
+    return recorded, skipped, errors
+
+
+def _add(conn, row, col, category, at):
+    cell = conn.execute(
+        'SELECT short, long, updated_at, total, first_seen, last_seen FROM ml_hotspot_cells '
+        'WHERE row = ? AND col = ? AND category = ?',
+        (row, col, category),
+    ).fetchone()
+    if cell is None:
+        short, long, updated_at, total, first_seen, last_seen = 1.0, 1.0, at, 1, at, at
+    else:
+        # Counts are stored as of `updated_at`; a late (backfilled) event is
+        # added already decayed to that time instead of moving it backwards.
+        updated_at = max(cell['updated_at'], at)
+        short = _decayed(cell['short'], cell['updated_at'], updated_at, SHORT_TAU) + _decayed(1.0, at, updated_at, SHORT_TAU)
+        long = _decayed(cell['long'], cell['updated_at'], updated_at, LONG_TAU) + _decayed(1.0, at, updated_at, LONG_TAU)
+        total = cell['total'] + 1
+        first_seen, last_seen = min(cell['first_seen'], at), max(cell['last_seen'], at)
+    conn.execute(
+        'INSERT OR REPLACE INTO ml_hotspot_cells '
+        '(row, col, category, short, long, updated_at, total, first_seen, last_seen) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        (row, col, category, short, long, updated_at, total, first_seen, last_seen),
+    )
+    conn.execute(
+        'INSERT INTO ml_hotspot_buckets (row, col, category, bucket, count) VALUES (?, ?, ?, ?, 1) '
+        'ON CONFLICT (row, col, category, bucket) DO UPDATE SET count = count + 1',
+        (row, col, category, int(at // BUCKET_SECONDS)),
+    )
+
+
+def _horizon(now):
+    """After 8 long half-lives a cell's baseline is below 0.4% of what it was."""
+    return now - 8 * HOTSPOT_LONG_HALF_LIFE_HOURS * 3600
+
+
+def _prune(conn, now):
+    global _last_prune
+    _last_prune = now
+    retention = now - HOTSPOT_RETENTION_DAYS * 86400
+    conn.execute('DELETE FROM ml_hotspot_buckets WHERE bucket < ?', (int(retention // BUCKET_SECONDS),))
+    conn.execute('DELETE FROM ml_hotspot_cells WHERE last_seen < ?', (_horizon(now),))
+    # Older events are refused on ingest, so their ids are no longer needed to catch a re-run
+    conn.execute('DELETE FROM ml_hotspot_seen WHERE seen_at < ?', (_horizon(now),))
+
+
+# --- 2. Scoring ---
+
+def _burst_z(short, long):
+    """Poisson z-score of the short-window count against the long-term rate over the same window."""
+    expected = long * SHORT_TAU / LONG_TAU
+    return (short - expected) / np.sqrt(expected + 1.0)
+
+
+def _cells(category=None, now=None):
+    now = now or time.time()
+    with _db() as conn:
+        query = 'SELECT * FROM ml_hotspot_cells'
+        rows = conn.execute(query + ' WHERE category = ?', (category,)).fetchall() if category \
+            else conn.execute(query).fetchall()
+    if not rows:
+        return [], None, None
+    age = now - np.array([r['updated_at'] for r in rows])
+    short = np.array([r['short'] for r in rows]) * np.exp(-age / SHORT_TAU)
+    long = np.array([r['long'] for r in rows]) * np.exp(-age / LONG_TAU)
+    return rows, short, long
+
+
+def hotspots(category=None, limit=10, bursting_only=False, now=None):
+    """Top emerging clusters, highest burst score first."""
+    now = now or time.time()
+    rows, short, long = _cells(category, now)
+    if not rows:
+        return []
+    z = _burst_z(short, long)
+    index = {(r['category'], r['row'], r['col']): i for i, r in enumerate(rows)}
+
+    clusters, taken = [], set()
+    for seed in np.argsort(-z):
+        if seed in taken or short[seed] < ACTIVE_SHORT_COUNT:
+            continue
+        members, frontier = [seed], [seed]
+        taken.add(seed)
+        while frontier:
+            r = rows[frontier.pop()]
+            for d_row in (-1, 0, 1):
+                for d_col in (-1, 0, 1):
+                    j = index.get((r['category'], r['row'] + d_row, r['col'] + d_col))
+                    if j is not None and j not in taken and short[j] >= ACTIVE_SHORT_COUNT:
+                        taken.add(j)
+                        members.append(j)
+                        frontier.append(j)
+        clusters.append(_summarize(rows, members, short, long))
+
+    if bursting_only:
+        clusters = [c for c in clusters if c['bursting']]
+    top = heapq.nlargest(limit, clusters, key=lambda c: c['burst_z'])
+    _attach_timelines(top, now)
+    metrics.incr('hotspots.queries')
+    return top
+
+
+def _summarize(rows, members, short, long):
+    s, l = float(short[members].sum()), float(long[members].sum())
+    z = float(_burst_z(s, l))
+    weights = short[members]
+    lat = float(np.average([(rows[i]['row'] + 0.5) * HOTSPOT_CELL_DEGREES for i in members], weights=weights))
+    lng = float(np.average([(rows[i]['col'] + 0.5) * HOTSPOT_CELL_DEGREES for i in members], weights=weights))
+    return {
+        'category': rows[members[0]]['category'],
+        'center': {'lat': round(lat, 5), 'lng': round(lng, 5)},
+        'cells': [[rows[i]['row'], rows[i]['col']] for i in members],
+        'recent': round(s, 2),
+        'rate_per_hour': round(s / (SHORT_TAU / 3600), 4),
+        'baseline_per_hour': round(l / (LONG_TAU / 3600), 4),
+        'burst_z': round(z, 2),
+        'bursting': z >= HOTSPOT_BURST_Z and s >= HOTSPOT_MIN_EVENTS,
+        'total': sum(rows[i]['total'] for i in members),
+        'first_seen': min(rows[i]['first_seen'] for i in members),
+        'last_seen': max(rows[i]['last_seen'] for i in members),
+    }
+
+
+def _attach_timelines(clusters, now):
+    """Hourly counts for the last TIMELINE_BUCKETS hours, oldest first."""
+    last = int(now // BUCKET_SECONDS)
+    first = last - TIMELINE_BUCKETS + 1
+    with _db() as conn:
+        for cluster in clusters:
+            timeline = [0] * TIMELINE_BUCKETS
+            for row, col in cluster['cells']:
+                for bucket in conn.execute(
+                    'SELECT bucket, count FROM ml_hotspot_buckets '
+                    'WHERE row = ? AND col = ? AND category = ? AND bucket >= ?',
+                    (row, col, cluster['category'], first),
+                ):
+                    if bucket['bucket'] <= last:
+                        timeline[bucket['bucket'] - first] += bucket['count']
+            cluster['timeline'] = timeline
+
+
+def stats():
+    """Grid size for the metrics endpoint."""
+    with _db() as conn:
+        cells = conn.execute('SELECT COUNT(*) FROM ml_hotspot_cells').fetchone()[0]
+        seen = conn.execute('SELECT COUNT(*) FROM ml_hotspot_seen').fetchone()[0]
+    return {'cells': cells, 'seen_ids': seen, 'ingested': metrics.get('hotspots.ingested')}
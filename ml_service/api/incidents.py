@@ -0,0 +1,273 @@
+"""
+Batch incident clustering over every open issue.
+
+Per-issue duplicate checks compare one report against a recent window, so
+chains (A~B, B~C) and anything older than the window are missed. Here all
+embeddings are compared at once:
+
+1. vectors are unit-normalised float32, optionally projected to `dim`
+   (api/quantize.reduce) to cut memory and BLAS time;
+2. similarities are computed block by block, BLOCK_SIZE rows against
+   BLOCK_SIZE rows over the upper triangle only, so peak memory is one
+   float32 copy of the vectors plus a BLOCK_SIZE x BLOCK_SIZE tile;
+3. pairs above `threshold` (and within `radius_km` when both issues have
+   coordinates) are merged with union-find into incident groups.
+
+100k x 768 issues is about 5e12 flops, a few minutes of single-core BLAS
+(see bench_incidents.py). Runs as the `cluster_incidents` background job.
+The latest assignment of every issue is kept in the `ml_incidents` table.
+"""
+import json
+import os
+import tempfile
+import time
+import uuid
+
+import numpy as np
+from django.conf import settings
+
+from api import metrics, quantize, sqlite
+
+BLOCK_SIZE = int(os.getenv('INCIDENT_BLOCK_SIZE', '2048'))
+DEFAULT_THRESHOLD = 0.92
+EARTH_RADIUS_KM = 6371.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ml_incidents (
+    issue_id TEXT PRIMARY KEY,
+    incident_id TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ml_incidents_incident ON ml_incidents (incident_id);
+"""
+
+
+def _db():
+    return sqlite.db(_SCHEMA)
+
+
+# --- 1. Clustering ---
+
+class DisjointSet:
+    """Union-find with path halving and union by size."""
+
+    def __init__(self, n):
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, x):
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return False
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+        return True
+
+
+def _within(coords, rows, cols, radius_km):
+    """Haversine filter for candidate pairs; pairs missing a coordinate are kept."""
+    a, b = np.radians(coords[rows]), np.radians(coords[cols])
+    dlat, dlng = b[:, 0] - a[:, 0], b[:, 1] - a[:, 1]
+    h = np.sin(dlat / 2) ** 2 + np.cos(a[:, 0]) * np.cos(b[:, 0]) * np.sin(dlng / 2) ** 2
+    distance = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+    return np.isnan(distance) | (distance <= radius_km)
+
+
+def _prepare(vectors, dim, block_size):
+    """
+    Unit-normalised float32 copy, built block by block so `vectors` can be a
+    memory-mapped .npy of any dtype (int8 scales cancel out in the norm).
+    """
+    n, d = vectors.shape
+    matrix = np.empty((n, dim if dim and dim < d else d), dtype=np.float32)
+    for i in range(0, n, block_size):
+        matrix[i:i + block_size] = quantize.reduce(vectors[i:i + block_size], dim)
+    return matrix
+
+
+def cluster(vectors, threshold=DEFAULT_THRESHOLD, coords=None, radius_km=None, dim=None, block_size=BLOCK_SIZE):
+    """
+    Group (n, d) embeddings into incidents. `coords` is an optional (n, 2)
+    lat / lng array (NaN when unknown). Returns (labels, stats): labels[i] is
+    the index of the first member of i's incident.
+    """
+    vectors = vectors if hasattr(vectors, 'shape') else np.asarray(vectors, dtype=np.float32)
+    start = time.perf_counter()
+    matrix = _prepare(vectors, dim, block_size)
+    n = matrix.shape[0]
+    if coords is not None:
+        coords = np.asarray(coords, dtype=np.float64)
+    groups = DisjointSet(n)
+    pairs = merges = 0
+
+    for i in range(0, n, block_size):
+        left = matrix[i:i + block_size]
+        for j in range(i, n, block_size):
+            tile = left @ matrix[j:j + block_size].T
+            if i == j:
+                tile = np.triu(tile, k=1)  # each pair once, no self-pairs
+            rows, cols = np.nonzero(tile >= threshold)
+            if not len(rows):
+                continue
+            rows, cols = rows + i, cols + j
+            if coords is not None and radius_km:
+                keep = _within(coords, rows, cols, radius_km)
+                rows, cols = rows[keep], cols[keep]
+            pairs += len(rows)
+            for a, b in zip(rows.tolist(), cols.tolist()):
+                merges += groups.union(a, b)
+
+    roots = np.fromiter((groups.find(x) for x in range(n)), dtype=np.int64, count=n)
+    # Label each incident by its first member so labels don't depend on union order.
+    first = np.full(n, n, dtype=np.int64)
+    np.minimum.at(first, roots, np.arange(n))
+    labels = first[roots]
+
+    elapsed = time.perf_counter() - start
+    metrics.observe('incidents.cluster_seconds', elapsed)
+    return labels, {
+        'issues': n,
+        'dim': int(matrix.shape[1]),
+        'pairs': pairs,
+        'incidents': n - merges,
+        'seconds': round(elapsed, 2),
+    }
+
+
+def groups_from(ids, labels):
+    """[{incident_id, members, size}] for incidents with at least two issues, largest first."""
+    members = {}
+    for issue_id, label in zip(ids, labels.tolist()):
+        members.setdefault(label, []).append(issue_id)
+    incidents = [
+        {'incident_id': ids[label], 'members': issues, 'size': len(issues)}
+        for label, issues in members.items() if len(issues) > 1
+    ]
+    incidents.sort(key=lambda incident: incident['size'], reverse=True)
+    return incidents
+
+
+# --- 2. Persistence ---
+
+def _coordinate(value, limit):
+    if value in (None, ''):
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"{value!r} is not a coordinate")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{value!r} is not a coordinate") from None
+    if not -limit <= number <= limit:  # also rejects NaN
+        raise ValueError(f"{value!r} is out of range")
+    return number
+
+
+def issue_rows(issues):
+    """
+    The run's [{id, lat, lng}] from the request's issues, checked up front so
+    a bad item is a 400 rather than a failed job after the O(n^2) pass: ids
+    must be unique, coordinates numeric and in range (or missing).
+    """
+    rows, seen = [], set()
+    for index, issue in enumerate(issues):
+        issue_id = issue.get('id')
+        if issue_id in (None, ''):
+            raise ValueError(f"issues[{index}] has no id")
+        issue_id = str(issue_id)
+        if issue_id in seen:
+            raise ValueError(f"issues[{index}]: duplicate id {issue_id}")
+        seen.add(issue_id)
+        try:
+            lat, lng = _coordinate(issue.get('lat'), 90), _coordinate(issue.get('lng'), 180)
+        except ValueError as e:
+            raise ValueError(f"issues[{index}]: {e}") from None
+        rows.append({'id': issue_id, 'lat': lat, 'lng': lng})
+    return rows
+
+
+def spool_issues(issues):
+    """Write the run's [{id, lat, lng}] next to its vectors; the job removes both."""
+    os.makedirs(settings.ML_UPLOAD_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix='incidents-', suffix='.json', dir=settings.ML_UPLOAD_DIR)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(issues, f)
+    return path
+
+
+def spool_vectors(vectors):
+    os.makedirs(settings.ML_UPLOAD_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix='incidents-', suffix='.npy', dir=settings.ML_UPLOAD_DIR)
+    with os.fdopen(fd, 'wb') as f:
+        np.save(f, vectors)
+    return path
+
+
+def load_run(vectors_path, issues_path, with_coords=False):
+    """(ids, memory-mapped vectors, coords or None) for a spooled run."""
+    with open(issues_path) as f:
+        issues = json.load(f)
+    vectors = np.load(vectors_path, mmap_mode='r')
+    if vectors.ndim != 2 or vectors.shape[0] != len(issues):
+        raise ValueError(f"vectors have shape {vectors.shape}, expected ({len(issues)}, d)")
+    coords = None
+    if with_coords:
+        coords = np.array([
+            [issue.get('lat') if issue.get('lat') is not None else np.nan,
+             issue.get('lng') if issue.get('lng') is not None else np.nan] for issue in issues
+        ], dtype=np.float64)
+    return [str(issue['id']) for issue in issues], vectors, coords
+
+
+def save(ids, labels):
+    """Replace the stored assignments with this run's. Returns the run id."""
+    run_id, now = uuid.uuid4().hex, time.time()
+    with _db() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM ml_incidents')
+            conn.executemany(
+                'INSERT INTO ml_incidents (issue_id, incident_id, run_id, updated_at) VALUES (?, ?, ?, ?)',
+                ((issue_id, ids[label], run_id, now) for issue_id, label in zip(ids, labels.tolist())),
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+    return run_id
+
+
+def incident_of(issue_id):
+    """{incident_id, members, updated_at} from the latest run, or None if the issue wasn't in it."""
+    with _db() as conn:
+        row = conn.execute('SELECT incident_id, updated_at FROM ml_incidents WHERE issue_id = ?', (issue_id,)).fetchone()
+        if not row:
+            return None
+        members = [r['issue_id'] for r in conn.execute(
+            'SELECT issue_id FROM ml_incidents WHERE incident_id = ? ORDER BY issue_id', (row['incident_id'],)
+        )]
+    return {'incident_id': row['incident_id'], 'members': members, 'updated_at': row['updated_at']}
+
+
+def incident_sizes(issue_ids):
+    """{issue_id: size of its incident} from the latest run, for the ids that were in it."""
+    sizes = {}
+    issue_ids = list(issue_ids)
+    with _db() as conn:
+        for i in range(0, len(issue_ids), 500):
+            chunk = issue_ids[i:i + 500]
+            sizes.update(conn.execute(
+                'SELECT issue_id, (SELECT COUNT(*) FROM ml_incidents m WHERE m.incident_id = i.incident_id) '
+                f'FROM ml_incidents i WHERE issue_id IN ({",".join("?" * len(chunk))})', chunk,
+            ).fetchall())
+    return sizes
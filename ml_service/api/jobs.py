@@ -0,0 +1,263 @@
+"""
+Background jobs for slow ML work (audio transcription, image validation,
+captions).
+
+Submit endpoints insert a row into the `ml_jobs` table of the service's
+SQLite file and return a job id straight away; a bounded thread pool per job
+type runs the work, retrying failures with exponential backoff. Callers poll
+`/api/jobs/<id>/` or pass a `webhook` URL that receives the result when the
+job finishes. Webhooks may only point at ML_WEBHOOK_ORIGINS (the backend by
+default), so a caller can't make the service POST to arbitrary hosts.
+
+Jobs are claimed atomically (`queued` -> `running`), so with several gunicorn
+workers sharing the database a job only ever runs once. A running job renews
+its lease every LEASE_SECONDS / 4; when a worker dies its jobs stop renewing,
+and every worker's lease monitor re-queues jobs whose lease has expired.
+`recover_interrupted()` does the same at boot and starts that monitor.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+
+from api import metrics, sqlite
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+
+RETRY_BASE_DELAY = 2.0  # seconds; doubled on every attempt
+LEASE_SECONDS = 120
+LEASE_CHECK_SECONDS = 60
+WEBHOOK_TIMEOUT = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ml_jobs (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    webhook TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ml_jobs_status ON ml_jobs (status, updated_at);
+"""
+
+
+class JobType:
+    def __init__(self, name, handler, concurrency, max_retries, cleanup=None):
+        self.name = name
+        self.handler = handler
+        self.max_retries = max_retries
+        self.cleanup = cleanup
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"job-{name}")
+
+
+_types = {}
+_monitor_started = False
+
+
+class InvalidWebhook(ValueError):
+    """The webhook URL is not on ML_WEBHOOK_ORIGINS."""
+
+
+def _origin(url):
+    parts = urlsplit(str(url).strip())
+    return f"{parts.scheme.lower()}://{(parts.netloc or '').lower()}" if parts.scheme and parts.netloc else None
+
+
+def webhook_allowed(url):
+    allowed = {_origin(origin) for origin in getattr(settings, 'ML_WEBHOOK_ORIGINS', [])}
+    origin = _origin(url)
+    return origin is not None and origin in allowed
+
+
+def register(name, concurrency=2, max_retries=2, cleanup=None):
+    """
+    Decorator registering `handler(payload) -> result dict` as job type `name`.
+    `cleanup(payload)` runs once the job has finally succeeded or failed.
+    """
+    def decorator(handler):
+        _types[name] = JobType(name, handler, concurrency, max_retries, cleanup)
+        return handler
+    return decorator
+
+
+def _db():
+    return sqlite.db(_SCHEMA)
+
+
+def _row_to_dict(row):
+    job = dict(row)
+    job['payload'] = json.loads(job['payload'])
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+
+def submit(job_type, payload, webhook=None):
+    if job_type not in _types:
+        raise ValueError(f"Unknown job type: {job_type}")
+    if webhook and not webhook_allowed(webhook):
+        raise InvalidWebhook("webhook must be on one of ML_WEBHOOK_ORIGINS")
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    with _db() as conn:
+        conn.execute(
+            'INSERT INTO ml_jobs (id, type, status, payload, webhook, created_at, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (job_id, job_type, QUEUED, json.dumps(payload), webhook, now, now),
+        )
+    metrics.incr(f'jobs.{job_type}.submitted')
+    _schedule(job_type, job_id)
+    return job_id
+
+
+def get(job_id):
+    with _db() as conn:
+        row = conn.execute('SELECT * FROM ml_jobs WHERE id = ?', (job_id,)).fetchone()
+    return _row_to_dict(row) if row else None
+
+
+def _schedule(job_type, job_id, delay=0):
+    executor = _types[job_type].executor
+    if delay:
+        timer = threading.Timer(delay, executor.submit, args=(_run, job_id))
+        timer.daemon = True
+        timer.start()
+    else:
+        executor.submit(_run, job_id)
+
+
+def _claim(conn, job_id):
+    cursor = conn.execute(
+        'UPDATE ml_jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ? AND status = ?',
+        (RUNNING, time.time(), job_id, QUEUED),
+    )
+    return cursor.rowcount == 1
+
+
+def _run(job_id):
+    with _db() as conn:
+        if not _claim(conn, job_id):
+            return
+        job = _row_to_dict(conn.execute('SELECT * FROM ml_jobs WHERE id = ?', (job_id,)).fetchone())
+    job_type = _types[job['type']]
+    start = time.perf_counter()
+    done = threading.Event()
+    threading.Thread(target=_renew_lease, args=(job_id, done), daemon=True, name=f"lease-{job_id[:8]}").start()
+
+    try:
+        result = job_type.handler(job['payload'])
+    except Exception as e:
+        retry = job['attempts'] <= job_type.max_retries
+        logger.error(f"Job {job_id} ({job['type']}) attempt {job['attempts']} failed: {e}")
+        with _db() as conn:
+            conn.execute(
+                'UPDATE ml_jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?',
+                (QUEUED if retry else FAILED, str(e), time.time(), job_id),
+            )
+        if retry:
+            metrics.incr(f'jobs.{job["type"]}.retried')
+            _schedule(job['type'], job_id, delay=RETRY_BASE_DELAY * 2 ** (job['attempts'] - 1))
+        else:
+            metrics.incr(f'jobs.{job["type"]}.failed')
+            _finish(job_type, job, FAILED, None, str(e))
+        return
+    finally:
+        done.set()
+
+    with _db() as conn:
+        conn.execute(
+            'UPDATE ml_jobs SET status = ?, result = ?, error = NULL, updated_at = ? WHERE id = ?',
+            (SUCCEEDED, json.dumps(result), time.time(), job_id),
+        )
+    metrics.incr(f'jobs.{job["type"]}.succeeded')
+    metrics.observe(f'jobs.{job["type"]}.seconds', time.perf_counter() - start)
+    _finish(job_type, job, SUCCEEDED, result, None)
+
+
+def _finish(job_type, job, status, result, error):
+    if job_type.cleanup:
+        try:
+            job_type.cleanup(job['payload'])
+        except Exception as e:
+            logger.error(f"Job {job['id']} cleanup failed: {e}")
+    if job['webhook'] and webhook_allowed(job['webhook']):
+        try:
+            requests.post(job['webhook'], json={
+                'job_id': job['id'],
+                'type': job['type'],
+                'status': status,
+                'result': result,
+                'error': error,
+            }, timeout=WEBHOOK_TIMEOUT, allow_redirects=False)
+        except Exception as e:
+            logger.error(f"Job {job['id']} webhook to {job['webhook']} failed: {e}")
+
+
+def _renew_lease(job_id, done):
+    """Keep a running job's lease fresh until it finishes, so only dead workers' jobs expire."""
+    while not done.wait(LEASE_SECONDS / 4):
+        try:
+            with _db() as conn:
+                conn.execute('UPDATE ml_jobs SET updated_at = ? WHERE id = ? AND status = ?',
+                             (time.time(), job_id, RUNNING))
+        except sqlite3.Error as e:
+            logger.error(f"Job {job_id} lease renewal failed: {e}")
+
+
+def requeue_expired():
+    """Re-queue and schedule running jobs whose lease has expired. Returns how many."""
+    with _db() as conn:
+        rows = conn.execute(
+            'UPDATE ml_jobs SET status = ?, updated_at = ? WHERE status = ? AND updated_at < ? RETURNING id, type',
+            (QUEUED, time.time(), RUNNING, time.time() - LEASE_SECONDS),
+        ).fetchall()
+    for row in rows:
+        if row['type'] in _types:
+            metrics.incr(f'jobs.{row["type"]}.lease_expired')
+            _schedule(row['type'], row['id'])
+    if rows:
+        logger.warning(f"Re-queued {len(rows)} ML jobs whose worker stopped renewing their lease")
+    return len(rows)
+
+
+def _monitor_leases():
+    while True:
+        time.sleep(LEASE_CHECK_SECONDS)
+        try:
+            requeue_expired()
+        except Exception as e:
+            logger.error(f"Job lease check failed: {e}")
+
+
+def recover_interrupted():
+    """Re-queue jobs whose worker died, resume queued jobs after a restart, and start the lease monitor."""
+    global _monitor_started
+    if not _types:
+        return 0
+    if not _monitor_started:
+        _monitor_started = True
+        threading.Thread(target=_monitor_leases, daemon=True, name='job-leases').start()
+    requeue_expired()
+    with _db() as conn:
+        rows = conn.execute(
+            'SELECT id, type FROM ml_jobs WHERE status = ? ORDER BY created_at', (QUEUED,)
+        ).fetchall()
+    for row in rows:
+        if row['type'] in _types:
+            _schedule(row['type'], row['id'])
+    if rows:
+        logger.info(f"Resumed {len(rows)} queued ML jobs")
+    return len(rows)
@@ -0,0 +1,48 @@
+"""
+In-process metrics for the ML service.
+
+Counters and simple summaries (count / sum / max) keyed by dotted names,
+e.g. `prefilter.detect_fake.escalated`. Exposed through `/api/metrics/`.
+Each gunicorn worker keeps its own numbers.
+"""
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_summaries = {}
+
+
+def incr(name, value=1):
+    with _lock:
+        _counters[name] += value
+
+
+def observe(name, value):
+    with _lock:
+        summary = _summaries.get(name)
+        if summary is None:
+            summary = _summaries[name] = {'count': 0, 'sum': 0.0, 'max': value}
+        summary['count'] += 1
+        summary['sum'] += value
+        summary['max'] = max(summary['max'], value)
+
+
+def get(name):
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def ratio(numerator, denominator):
+    """Safe division used for hit / escalation rates."""
+    return round(numerator / denominator, 4) if denominator else 0.0
+
+
+def snapshot(prefix=''):
+    with _lock:
+        counters = {k: v for k, v in _counters.items() if k.startswith(prefix)}
+        summaries = {
+            k: {**v, 'avg': round(v['sum'] / v['count'], 3) if v['count'] else 0.0}
+            for k, v in _summaries.items() if k.startswith(prefix)
+        }
+    return {'counters': counters, 'summaries': summaries}
@@ -0,0 +1,87 @@
+"""
+Response compression negotiated through `Accept-Encoding`.
+
+zstd is preferred when the client accepts it and the `zstandard` package is
+installed, gzip otherwise. Streaming responses (SSE replies, NDJSON embedding
+batches) and responses marked `Cache-Control: no-transform` are left alone -
+compressing them would buffer events that must reach the client immediately.
+"""
+import gzip
+import importlib.util
+import re
+
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from api import metrics
+from civix_ml.startup import lazy_module
+
+MIN_LENGTH = 512  # bytes; below this the headers cost more than they save
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+_zstandard = lazy_module('zstandard')
+ZSTD_AVAILABLE = importlib.util.find_spec('zstandard') is not None
+
+_CODING = re.compile(r'^\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?\s*$')
+
+
+def accepted_encodings(header):
+    """`gzip, zstd;q=0.9, br;q=0` -> {'gzip': 1.0, 'zstd': 0.9, 'br': 0.0}"""
+    accepted = {}
+    for part in (header or '').lower().split(','):
+        match = _CODING.match(part)
+        if match:
+            try:
+                accepted[match.group(1)] = float(match.group(2) or 1)
+            except ValueError:
+                continue
+    return accepted
+
+
+def choose_encoding(header):
+    accepted = accepted_encodings(header)
+    options = (['zstd'] if ZSTD_AVAILABLE else []) + ['gzip']
+    wildcard = accepted.get('*', 0)
+    scored = [(accepted.get(name, wildcard), name) for name in options]
+    # Highest q wins; ties keep the server preference order above.
+    best = max(scored, key=lambda item: item[0])
+    return best[1] if best[0] > 0 else None
+
+
+def compress(content, encoding):
+    if encoding == 'zstd':
+        return _zstandard().ZstdCompressor(level=ZSTD_LEVEL).compress(content)
+    return gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if 'no-transform' in response.get('Cache-Control', ''):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < MIN_LENGTH:
+            return response
+
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        original = len(response.content)
+        compressed = compress(response.content, encoding)
+        if len(compressed) >= original:
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        metrics.incr(f'compression.{encoding}')
+        metrics.observe('compression.ratio', round(len(compressed) / original, 4))
+        return response
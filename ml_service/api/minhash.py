@@ -0,0 +1,183 @@
+"""
+MinHash signatures with an LSH banding index over open issue texts.
+
+Copy-paste and near-verbatim resubmissions are caught here in well under a
+millisecond, before any embedding or Gemini comparison runs. Texts are
+normalised, cut into character 5-gram shingles and hashed with NUM_PERM
+universal hash functions; the signature is split into BANDS bands of ROWS
+rows, and two texts become candidates when any band matches exactly.
+Candidates are then verified with the exact Jaccard of their shingle sets.
+"""
+import hashlib
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+
+# Jaccard similarity at or above which two reports count as near-verbatim
+NEAR_DUPLICATE_THRESHOLD = 0.8
+
+# Bounds for the shared open-issue index and the per-text sketch cache
+MINHASH_INDEX_MAX = int(os.getenv('MINHASH_INDEX_MAX', '50000'))
+MINHASH_SKETCH_CACHE = int(os.getenv('MINHASH_SKETCH_CACHE', '20000'))
+
+_PRIME = np.uint64(4294967311)  # smallest prime above 2**32
+_rng = np.random.default_rng(20240601)  # fixed seed: signatures must be stable across workers
+_A = _rng.integers(1, 2 ** 32 - 1, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 2 ** 32 - 1, size=NUM_PERM, dtype=np.uint64)
+
+_NON_WORD = re.compile(r'[^a-z0-9]+')
+
+
+def normalize(text):
+    return _NON_WORD.sub(' ', (text or '').lower()).strip()
+
+
+def text_key(text):
+    """Stable key for exact (normalised) text matches."""
+    return hashlib.sha1(normalize(text).encode('utf-8')).hexdigest()
+
+
+def shingles(text):
+    text = normalize(text)
+    if len(text) <= SHINGLE_SIZE:
+        return frozenset([text]) if text else frozenset()
+    return frozenset(text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1))
+
+
+def signature(shingle_set):
+    if not shingle_set:
+        return np.full(NUM_PERM, np.iinfo(np.uint64).max, dtype=np.uint64)
+    hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingle_set), dtype=np.uint64, count=len(shingle_set))
+    # (a*h + b) mod p for every (permutation, shingle) pair, then min per permutation
+    permuted = (np.outer(_A, hashes) % _PRIME + _B[:, None]) % _PRIME
+    return permuted.min(axis=1)
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+_sketches = OrderedDict()  # text key -> (shingle set, bands), least recently used first
+_sketch_lock = threading.Lock()
+
+
+def _sketch(text, key):
+    """Shingles and LSH bands of `text`, cached by normalised text so repeat texts aren't re-hashed."""
+    with _sketch_lock:
+        sketch = _sketches.get(key)
+        if sketch is not None:
+            _sketches.move_to_end(key)
+            return sketch
+    shingle_set = shingles(text)
+    sketch = (shingle_set, MinHashIndex._bands(signature(shingle_set)))
+    with _sketch_lock:
+        _sketches[key] = sketch
+        while len(_sketches) > MINHASH_SKETCH_CACHE:
+            _sketches.popitem(last=False)
+    return sketch
+
+
+class MinHashIndex:
+    """
+    Thread-safe in-memory LSH index keyed by issue id. With `max_size`, the
+    least recently added ids are evicted once it is full.
+    """
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._shingles = {}
+        self._keys = {}
+        self._by_key = {}
+        self._band_keys = {}
+        self._buckets = [dict() for _ in range(BANDS)]
+
+    def __len__(self):
+        return len(self._shingles)
+
+    def __contains__(self, issue_id):
+        return issue_id in self._shingles
+
+    @staticmethod
+    def _bands(sig):
+        return [sig[i * ROWS:(i + 1) * ROWS].tobytes() for i in range(BANDS)]
+
+    def add(self, issue_id, text):
+        key = text_key(text)
+        with self._lock:
+            if self._keys.get(issue_id) == key:
+                return False
+        shingle_set, bands = _sketch(text, key)
+        with self._lock:
+            self._remove_locked(issue_id)
+            self._shingles[issue_id] = shingle_set
+            self._keys[issue_id] = key
+            self._by_key.setdefault(key, set()).add(issue_id)
+            self._band_keys[issue_id] = bands
+            for bucket, band in zip(self._buckets, bands):
+                bucket.setdefault(band, set()).add(issue_id)
+            while self.max_size and len(self._shingles) > self.max_size:
+                self._remove_locked(next(iter(self._shingles)))  # dicts keep insertion order
+        return True
+
+    def remove(self, issue_id):
+        with self._lock:
+            self._remove_locked(issue_id)
+
+    def _remove_locked(self, issue_id):
+        if issue_id not in self._shingles:
+            return
+        del self._shingles[issue_id]
+        key = self._keys.pop(issue_id)
+        ids = self._by_key.get(key)
+        if ids:
+            ids.discard(issue_id)
+            if not ids:
+                del self._by_key[key]
+        for bucket, band in zip(self._buckets, self._band_keys.pop(issue_id)):
+            ids = bucket.get(band)
+            if ids:
+                ids.discard(issue_id)
+                if not ids:
+                    del bucket[band]
+
+    def query(self, text, threshold=NEAR_DUPLICATE_THRESHOLD, limit=5, exclude=None, only=None):
+        """
+        Return [(issue_id, jaccard)] for indexed texts at or above `threshold`,
+        best first. Exact (normalised) matches score 1.0 without hashing.
+        `exclude` drops one id (the query issue itself); `only` restricts the
+        results to a set of ids.
+        """
+        def allowed(issue_id):
+            return issue_id != exclude and (only is None or issue_id in only)
+
+        key = text_key(text)
+        with self._lock:
+            exact = [i for i in self._by_key.get(key, ()) if allowed(i)]
+        if exact:
+            return [(i, 1.0) for i in exact[:limit]]
+
+        shingle_set, bands = _sketch(text, key)
+        with self._lock:
+            candidates = set()
+            for bucket, band in zip(self._buckets, bands):
+                candidates |= bucket.get(band, set())
+            scored = [(i, jaccard(shingle_set, self._shingles[i])) for i in candidates if allowed(i)]
+        scored = [(i, round(s, 4)) for i, s in scored if s >= threshold]
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:limit]
+
+
+# Shared index of open issues for this worker, kept by /index-issues/
+open_issues = MinHashIndex(max_size=MINHASH_INDEX_MAX)
@@ -0,0 +1,187 @@
+"""
+Versioned checkpoints for the local sklearn models.
+
+The pickles produced by `civix_ml/train_models.py` are version 0. Online
+updates (api/feedback.py) write `registry/<task>/v0001.pkl`, `v0002.pkl`, ...
+and point `registry/manifest.json` at the newest one. Every worker reloads a
+task when the manifest moves on, so all gunicorn workers converge on the same
+checkpoint.
+
+`classify(task, text)` is the serving side. It returns the current
+checkpoint's label when the label's probability is at least
+LOCAL_MIN_CONFIDENCE for that task. Otherwise it returns None and the caller
+asks the LLM. The cut-offs default high because these models are small. Tune
+them with the threshold sweep in evaluate_engines.py. A cut-off above 1 turns
+the local stage off. Priority ships that way: on the hand-labelled hold-out,
+even its most confident answers were right only about half the time.
+
+A fixed tenth of datasets/civic_data.csv, chosen by text hash (see
+`in_validation_split`), is kept out of training and replay. api/feedback.py
+scores new checkpoints on it, and the hand-labelled hold-out stays reserved
+for the published evaluation numbers.
+"""
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from api import metrics
+from civix_ml.startup import lazy_module
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: single process, no cross-worker lock needed
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_joblib = lazy_module('joblib')
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODELS_DIR = os.path.join(BASE_DIR, 'civix_ml', 'models')
+REGISTRY_DIR = os.getenv('CIVIX_MODEL_REGISTRY', os.path.join(MODELS_DIR, 'registry'))
+MANIFEST_PATH = os.path.join(REGISTRY_DIR, 'manifest.json')
+LOCK_PATH = os.path.join(REGISTRY_DIR, '.lock')
+
+BASE_MODELS = {
+    'priority': 'priority_model.pkl',
+    'category': 'category_model.pkl',
+    'fake': 'fake_model.pkl',
+}
+KEEP_CHECKPOINTS = 5
+VALIDATION_PERCENT = 10
+
+# Probability the current checkpoint needs before its answer is served without the LLM (> 1: never)
+LOCAL_MIN_CONFIDENCE = {
+    'priority': float(os.getenv('LOCAL_PRIORITY_MIN_CONFIDENCE', '1.01')),
+    'category': float(os.getenv('LOCAL_CATEGORY_MIN_CONFIDENCE', '0.95')),
+    'fake': float(os.getenv('LOCAL_FAKE_MIN_CONFIDENCE', '0.95')),
+}
+
+_lock = threading.Lock()
+_loaded = {}  # task -> (version, model)
+
+
+def available():
+    """False on an install without scikit-learn (both requirement files list it)."""
+    return importlib.util.find_spec('sklearn') is not None
+
+
+def in_validation_split(text):
+    """True for the civic_data.csv rows reserved for scoring checkpoints (never trained on)."""
+    digest = hashlib.blake2b(' '.join(str(text).split()).lower().encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % 100 < VALIDATION_PERCENT
+
+
+def read_manifest():
+    try:
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _path_for(task, version):
+    if version == 0:
+        return os.path.join(MODELS_DIR, BASE_MODELS[task])
+    return os.path.join(REGISTRY_DIR, task, f"v{version:04d}.pkl")
+
+
+def current_version(task):
+    return read_manifest().get(task, {}).get('version', 0)
+
+
+def current(task):
+    """(version, model) for the newest checkpoint of `task`; cached per worker."""
+    if task not in BASE_MODELS:
+        raise ValueError(f"Unknown model: {task}")
+    version = current_version(task)
+    cached = _loaded.get(task)
+    if cached and cached[0] == version:
+        return cached
+    with _lock:
+        cached = _loaded.get(task)
+        if not cached or cached[0] != version:
+            model = _joblib().load(_path_for(task, version))
+            _loaded[task] = cached = (version, model)
+            logger.info(f"Loaded {task} model v{version}")
+    return cached
+
+
+def classify(task, text):
+    """
+    (label, confidence, version) from the current checkpoint of `task` when it
+    is at least LOCAL_MIN_CONFIDENCE sure, otherwise None.
+    """
+    if LOCAL_MIN_CONFIDENCE[task] > 1 or not available():
+        return None
+    version, model = current(task)
+    probabilities = model.predict_proba([text])[0]
+    best = max(range(len(probabilities)), key=probabilities.__getitem__)
+    confidence = float(probabilities[best])
+    if confidence < LOCAL_MIN_CONFIDENCE[task]:
+        metrics.incr(f'local_model.{task}.escalated')
+        return None
+    metrics.incr(f'local_model.{task}.local')
+    return model.named_steps['clf'].classes_[best], confidence, version
+
+
+@contextmanager
+def exclusive():
+    """Cross-process lock held while a worker builds and publishes a checkpoint."""
+    os.makedirs(REGISTRY_DIR, exist_ok=True)
+    with open(LOCK_PATH, 'w') as handle:
+        if fcntl:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def checkpoint(task, model, meta=None):
+    """Write `model` as the next version of `task` and make it current. Call under `exclusive()`."""
+    version = current_version(task) + 1
+    path = _path_for(task, version)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    _joblib().dump(model, tmp)
+    os.replace(tmp, path)
+
+    manifest = read_manifest()
+    manifest[task] = {'version': version, 'created_at': time.time(), **(meta or {})}
+    tmp = f"{MANIFEST_PATH}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, MANIFEST_PATH)
+
+    with _lock:
+        _loaded[task] = (version, model)
+    _prune(task, version)
+    return version
+
+
+def _prune(task, version):
+    for old in range(version - KEEP_CHECKPOINTS, 0, -1):
+        path = _path_for(task, old)
+        if not os.path.exists(path):
+            break
+        os.remove(path)
+
+
+def describe():
+    manifest = read_manifest()
+    return {
+        task: {
+            **manifest.get(task, {'version': 0}),
+            'min_confidence': LOCAL_MIN_CONFIDENCE[task],
+            'served': metrics.get(f'local_model.{task}.local'),
+            'escalated': metrics.get(f'local_model.{task}.escalated'),
+        }
+        for task in BASE_MODELS
+    }
@@ -0,0 +1,23 @@
+"""
+Access checks for the service's few write endpoints.
+
+Reads stay open like the rest of the API. Writes that change what every
+worker serves (approving reply templates) need the shared secret from
+ML_ADMIN_TOKEN in an `Authorization: Bearer <token>` header, and are refused
+outright when no token is configured.
+"""
+import hmac
+
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS, BasePermission
+
+
+class AdminTokenOrReadOnly(BasePermission):
+    message = "A valid admin token is required"
+
+    def has_permission(self, request, view):
+        if request.method in SAFE_METHODS:
+            return True
+        token = getattr(settings, 'ML_ADMIN_TOKEN', None)
+        scheme, _, supplied = request.headers.get('Authorization', '').partition(' ')
+        return bool(token) and scheme.lower() == 'bearer' and hmac.compare_digest(supplied.encode(), token.encode())
@@ -0,0 +1,353 @@
+"""
+Fast local pre-filter for spam / abuse.
+
+Blatant cases (links, phone numbers, lottery phrases, slurs) are decided here
+in microseconds; only ambiguous texts are escalated to Gemini. Three signals:
+
+1. Aho-Corasick multi-pattern matcher over the lexicon in datasets/lexicon.json
+   (override with CIVIX_LEXICON_PATH).
+2. URL and phone number detectors.
+3. A small character n-gram naive Bayes model trained on datasets/civic_data.csv.
+"""
+import csv
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import defaultdict, deque
+
+from api import metrics
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LEXICON_PATH = os.getenv('CIVIX_LEXICON_PATH', os.path.join(BASE_DIR, 'datasets', 'lexicon.json'))
+DATASET_PATH = os.path.join(BASE_DIR, 'datasets', 'civic_data.csv')
+CHAR_MODEL_PATH = os.path.join(BASE_DIR, 'civix_ml', 'models', 'charngram_fake.json')
+
+# Char-model probability above / below which a text is decided locally
+SPAM_THRESHOLD = float(os.getenv('PREFILTER_SPAM_THRESHOLD', '0.98'))
+CLEAN_THRESHOLD = float(os.getenv('PREFILTER_CLEAN_THRESHOLD', '0.02'))
+# A text is only cleared locally if it reads like the genuine reports we trained on.
+# Calibrated on datasets/holdout_labelled.csv: genuine reports there cover 0.26-0.65
+# and the one fake with a low spam probability covers 0.43.
+MIN_COVERAGE = float(os.getenv('PREFILTER_MIN_COVERAGE', '0.45'))
+MIN_WORDS = 4
+
+# Scheme / www links in any case; bare domains only as lowercase hostnames ("market.In the" is prose)
+URL_RE = re.compile(r'(?i:https?://|www\.)\S+|\b[a-z0-9-]+(?:\.[a-z0-9-]+)*\.(?:com|net|org|xyz|info|biz|io|in)\b(?![\w-])')
+# Not glued to letters, digits, hyphens, colons or slashes, so timestamps, 'CIV-1729312345678-123'
+# and 'Plot 45-B/112' never match
+PHONE_RE = re.compile(r'(?<![\w:/-])(?:\+|\()?\d[\d\s().-]{7,}\d(?![\w:/-])')
+# Dates (2024-03-12, 12-03-2024, 12.03.24) and ranges (9.30-11.30, 10 - 12) that PHONE_RE can catch
+_NOT_PHONE = re.compile(
+    r'\d{4}([-/.])\d{1,2}\1\d{1,2}|\d{1,2}([-/.])\d{1,2}\2\d{2,4}'
+    r'|\d{1,4}(?:[.:]\d{1,2})?\s*-\s*\d{1,4}(?:[.:]\d{1,2})?'
+)
+PHONE_DIGITS = (8, 15)
+
+
+# --- 1. Aho-Corasick Matcher ---
+class AhoCorasick:
+    """Multi-pattern matcher: one pass over the text finds every lexicon entry."""
+
+    def __init__(self, patterns):
+        # patterns: {phrase: label}
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for phrase, label in patterns.items():
+            self._add(phrase.lower(), label)
+        self._build()
+
+    def _add(self, phrase, label):
+        node = 0
+        for ch in phrase:
+            nxt = self.goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            node = nxt
+        self.output[node].append((phrase, label))
+
+    def _build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and ch not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(ch, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def find(self, text):
+        """Return [(phrase, label)] for whole-word matches in `text`."""
+        text = text.lower()
+        hits = []
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            for phrase, label in self.output[node]:
+                start = i - len(phrase) + 1
+                before_ok = start == 0 or not text[start - 1].isalnum()
+                after_ok = i + 1 == len(text) or not text[i + 1].isalnum()
+                if before_ok and after_ok:
+                    hits.append((phrase, label))
+        return hits
+
+
+# --- 2. Character N-gram Model ---
+class CharNgramModel:
+    """Multinomial naive Bayes over character 3-5 grams (fake vs. genuine)."""
+
+    def __init__(self, ngram_range=(3, 5)):
+        self.ngram_range = ngram_range
+        self.counts = {0: defaultdict(int), 1: defaultdict(int)}
+        self.totals = {0: 0, 1: 0}
+        self.docs = {0: 0, 1: 0}
+        self.vocab_size = 1
+
+    def _grams(self, text):
+        text = f" {' '.join(text.lower().split())} "
+        lo, hi = self.ngram_range
+        for n in range(lo, hi + 1):
+            for i in range(len(text) - n + 1):
+                yield text[i:i + n]
+
+    def fit(self, texts, labels):
+        vocab = set()
+        for text, label in zip(texts, labels):
+            label = int(label)
+            self.docs[label] += 1
+            for gram in self._grams(text):
+                self.counts[label][gram] += 1
+                self.totals[label] += 1
+                vocab.add(gram)
+        self.vocab_size = max(len(vocab), 1)
+        return self
+
+    def predict_proba(self, text):
+        """Probability that `text` is fake/spam."""
+        n_docs = self.docs[0] + self.docs[1]
+        if not n_docs:
+            return 0.5
+        # Grams never seen in training carry no evidence (as with a fitted vocabulary)
+        grams = [g for g in self._grams(text) if g in self.counts[0] or g in self.counts[1]]
+        log_p = {}
+        for label in (0, 1):
+            denom = self.totals[label] + self.vocab_size
+            score = math.log((self.docs[label] + 1) / (n_docs + 2))
+            counts = self.counts[label]
+            for gram in grams:
+                score += math.log((counts.get(gram, 0) + 1) / denom)
+            log_p[label] = score
+        diff = log_p[0] - log_p[1]
+        if diff > 700:
+            return 0.0
+        return 1.0 / (1.0 + math.exp(diff))
+
+    def coverage(self, text):
+        """Share of the text's grams seen in genuine reports (low = gibberish / off-topic)."""
+        grams = list(self._grams(text))
+        if not grams:
+            return 0.0
+        return sum(1 for g in grams if g in self.counts[0]) / len(grams)
+
+    def to_dict(self):
+        return {
+            'ngram_range': list(self.ngram_range),
+            'counts': {str(k): dict(v) for k, v in self.counts.items()},
+            'totals': {str(k): v for k, v in self.totals.items()},
+            'docs': {str(k): v for k, v in self.docs.items()},
+            'vocab_size': self.vocab_size,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        model = cls(tuple(data['ngram_range']))
+        model.counts = {int(k): defaultdict(int, v) for k, v in data['counts'].items()}
+        model.totals = {int(k): v for k, v in data['totals'].items()}
+        model.docs = {int(k): v for k, v in data['docs'].items()}
+        model.vocab_size = data['vocab_size']
+        return model
+
+
+def train_char_model(dataset_path=DATASET_PATH, output_path=CHAR_MODEL_PATH):
+    with open(dataset_path, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    model = CharNgramModel().fit((r['text'] for r in rows), (r['is_fake'] for r in rows))
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(model.to_dict(), f, separators=(',', ':'))
+    return model
+
+
+# --- 3. Lazy Singletons ---
+_lock = threading.Lock()
+_matcher = None
+_char_model = None
+
+
+def load_lexicon(path=LEXICON_PATH):
+    with open(path, encoding='utf-8') as f:
+        lexicon = json.load(f)
+    return {phrase.lower(): label for label, phrases in lexicon.items() for phrase in phrases}
+
+
+def get_matcher():
+    global _matcher
+    if _matcher is None:
+        with _lock:
+            if _matcher is None:
+                _matcher = AhoCorasick(load_lexicon())
+    return _matcher
+
+
+def get_char_model():
+    global _char_model
+    if _char_model is None:
+        with _lock:
+            if _char_model is None:
+                if os.path.exists(CHAR_MODEL_PATH):
+                    with open(CHAR_MODEL_PATH, encoding='utf-8') as f:
+                        _char_model = CharNgramModel.from_dict(json.load(f))
+                else:
+                    logger.warning("Char n-gram model not found, training from dataset")
+                    _char_model = train_char_model(output_path=None)
+    return _char_model
+
+
+# --- 4. Decision ---
+def is_phone(candidate):
+    """Whether a PHONE_RE match is a phone number rather than a date or a range."""
+    digits = sum(c.isdigit() for c in candidate)
+    return PHONE_DIGITS[0] <= digits <= PHONE_DIGITS[1] and not _NOT_PHONE.fullmatch(candidate.strip(' ().'))
+
+
+def has_phone(text):
+    return any(is_phone(match.group()) for match in PHONE_RE.finditer(text))
+
+
+def mask_phones(text, replacement='<phone>'):
+    return PHONE_RE.sub(lambda match: replacement if is_phone(match.group()) else match.group(), text)
+
+
+def scan(text):
+    """Collect every local signal for `text`."""
+    hits = get_matcher().find(text)
+    model = get_char_model()
+    return {
+        'spam_phrases': sorted({p for p, label in hits if label == 'spam'}),
+        'abuse_terms': sorted({p for p, label in hits if label == 'abuse'}),
+        'has_url': bool(URL_RE.search(text)),
+        'has_phone': has_phone(text),
+        'spam_probability': round(model.predict_proba(text), 4),
+        'coverage': round(model.coverage(text), 4),
+        'words': len(text.split()),
+    }
+
+
+def urgent_terms(text):
+    """Emergency phrases from the lexicon; used to let urgent reports jump the admission queue."""
+    return sorted({p for p, label in get_matcher().find(text or '') if label == 'urgent'})
+
+
+def classify(text, task):
+    """
+    Decide `text` locally for `task` ('detect_fake' or 'analyze_toxicity').
+
+    Returns (verdict, signals). `verdict` is a response dict when the case is
+    clear-cut, or None when the text must be escalated to the LLM.
+    """
+    start = time.perf_counter()
+    signals = scan(text)
+    verdict = _detect_fake(signals) if task == 'detect_fake' else _analyze_toxicity(signals)
+
+    metrics.observe(f'prefilter.{task}.latency_us', (time.perf_counter() - start) * 1e6)
+    metrics.incr(f'prefilter.{task}.escalated' if verdict is None else f'prefilter.{task}.local')
+    return verdict, signals
+
+
+def _spam_reason(signals):
+    reasons = []
+    if signals['spam_phrases']:
+        reasons.append(f"spam phrases: {', '.join(signals['spam_phrases'])}")
+    if signals['has_url']:
+        reasons.append('contains a link')
+    if signals['has_phone']:
+        reasons.append('contains a phone number')
+    return '; '.join(reasons)
+
+
+def _is_clear_spam(signals):
+    promo = signals['has_url'] or signals['has_phone']
+    if signals['spam_phrases'] and (promo or signals['spam_probability'] >= SPAM_THRESHOLD):
+        return True
+    return promo and signals['spam_probability'] >= SPAM_THRESHOLD
+
+
+def _is_clear_clean(signals):
+    return (
+        not signals['spam_phrases'] and not signals['abuse_terms']
+        and not signals['has_url'] and not signals['has_phone']
+        and signals['spam_probability'] <= CLEAN_THRESHOLD
+        and signals['coverage'] >= MIN_COVERAGE
+        and signals['words'] >= MIN_WORDS
+    )
+
+
+def _detect_fake(signals):
+    if _is_clear_spam(signals):
+        return {
+            'is_fake': True,
+            'fake_confidence': max(0.9, signals['spam_probability']),
+            'reason': f"Local pre-filter: {_spam_reason(signals)}",
+            'method': 'LOCAL_PREFILTER',
+        }
+    if _is_clear_clean(signals):
+        return {
+            'is_fake': False,
+            'fake_confidence': signals['spam_probability'],
+            'reason': 'Local pre-filter: no spam signals',
+            'method': 'LOCAL_PREFILTER',
+        }
+    return None
+
+
+def _analyze_toxicity(signals):
+    if signals['abuse_terms']:
+        return {
+            'is_toxic': True,
+            'toxicity_score': round(min(1.0, 0.8 + 0.05 * len(signals['abuse_terms'])), 2),
+            'label': 'toxic',
+            'method': 'LOCAL_PREFILTER',
+        }
+    if _is_clear_spam(signals):
+        return {'is_toxic': False, 'toxicity_score': 0.0, 'label': 'spam', 'method': 'LOCAL_PREFILTER'}
+    if _is_clear_clean(signals):
+        return {'is_toxic': False, 'toxicity_score': 0.0, 'label': 'neutral', 'method': 'LOCAL_PREFILTER'}
+    return None
+
+
+def stats():
+    """Escalation rate per task, for the metrics endpoint."""
+    result = {}
+    for task in ('detect_fake', 'analyze_toxicity'):
+        local = metrics.get(f'prefilter.{task}.local')
+        escalated = metrics.get(f'prefilter.{task}.escalated')
+        result[task] = {
+            'local': local,
+            'escalated': escalated,
+            'escalation_rate': metrics.ratio(escalated, local + escalated),
+        }
+    return result
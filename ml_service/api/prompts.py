@@ -0,0 +1,255 @@
+"""
+Prompt templates and token budgets for every Gemini call.
+
+Each endpoint that talks to Gemini has one Template here with:
+- a compact text with {field} placeholders;
+- `budget`: the most prompt tokens it may send, overridable per endpoint
+  with PROMPT_BUDGET_<NAME> (e.g. PROMPT_BUDGET_CHECK_SEMANTIC_DUPLICATE);
+- `max_output_tokens`: passed to Gemini so a chatty reply can't run long.
+  It is left unset for the gemini-2.5 vision and audio calls, whose
+  thinking tokens count against the same limit.
+
+`Template.build(**fields)` collapses whitespace in user text and fits each
+field into the budget. Fields listed in `caps` get at most that many tokens.
+The remaining fields share whatever is left. A field that is too long keeps
+its opening and, if there is room, its last sentence, which is where
+reports tend to put the location or the ask. List fields become numbered
+lines of at most `item_cap` tokens each, and once the field's share is used
+up the remaining lines are dropped. Callers pass lists most relevant first
+(see `most_relevant`).
+
+`generate(model, prompt, *media)` and `stream(model, prompt)` make the call
+and record, per template: prompt and response tokens (Gemini's usage counts
+when the response has them, otherwise the estimate below), latency, and how
+often fields were cut. /api/metrics/ reports them under `prompts`.
+
+Token counts are estimated as CHARS_PER_TOKEN characters per token. The
+exact count would need an extra request to the count_tokens API.
+"""
+import os
+import re
+import time
+
+from api import categories, metrics, minhash
+
+CHARS_PER_TOKEN = 4
+MIN_FIELD_TOKENS = 16
+ELLIPSIS = ' … '
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+def count_tokens(text):
+    return -(-len(text) // CHARS_PER_TOKEN) if text else 0
+
+
+def clip(text, max_tokens):
+    """
+    `text` with whitespace collapsed, cut to about `max_tokens`: the opening is
+    kept, plus the last sentence when it fits in a third of the budget.
+    """
+    text = ' '.join(str(text).split())
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    sentences = _SENTENCE_END.split(text)
+    tail = sentences[-1] if len(sentences) > 1 and len(sentences[-1]) <= max_chars // 3 else ''
+    head = text[:max_chars - len(tail) - len(ELLIPSIS)]
+    head = head.rsplit(' ', 1)[0] if ' ' in head else head  # whole words only
+    return head + ELLIPSIS + tail if tail else head + ELLIPSIS.rstrip()
+
+
+def most_relevant(query, texts, limit):
+    """Indices of up to `limit` texts, most similar to `query` first (shingle Jaccard; ties keep input order)."""
+    query_shingles = minhash.shingles(query)
+    scores = [minhash.jaccard(query_shingles, minhash.shingles(text)) for text in texts]
+    return sorted(range(len(texts)), key=lambda i: -scores[i])[:limit]
+
+
+class Prompt(str):
+    """A built prompt: the text itself, plus the template it came from and what was kept."""
+
+    def __new__(cls, text, template, items=None):
+        prompt = super().__new__(cls, text)
+        prompt.template = template
+        prompt.tokens = count_tokens(text)
+        prompt.items = items or {}  # list field -> number of items included
+        return prompt
+
+
+class Template:
+    def __init__(self, name, text, budget, max_output_tokens=None, caps=None, item_cap=None):
+        self.name = name
+        self.text = text.strip()
+        self.budget = int(os.getenv(f'PROMPT_BUDGET_{name.upper()}', str(budget)))
+        self.max_output_tokens = max_output_tokens
+        self.caps = caps or {}
+        self.item_cap = item_cap
+        self._overhead = count_tokens(re.sub(r'\{\w+\}', '', self.text))
+
+    def build(self, **fields):
+        rendered, items, cut = {}, {}, False
+        for field, cap in self.caps.items():
+            rendered[field] = clip(fields[field], cap)
+            cut |= count_tokens(' '.join(str(fields[field]).split())) > cap
+        shared = [field for field in fields if field not in self.caps]
+        left = self.budget - self._overhead - sum(count_tokens(value) for value in rendered.values())
+        share = max(left // max(len(shared), 1), MIN_FIELD_TOKENS)
+        for field in shared:
+            value = fields[field]
+            if isinstance(value, (list, tuple)):
+                rendered[field], items[field] = self._numbered(value, share)
+                cut |= items[field] < len(value)
+            else:
+                rendered[field] = clip(value, share)
+                cut |= count_tokens(' '.join(str(value).split())) > share
+        if cut:
+            metrics.incr(f'prompts.{self.name}.cut')
+        return Prompt(self.text.format(**rendered), self, items)
+
+    def _numbered(self, values, max_tokens):
+        lines, used = [], 0
+        for value in values:
+            line = f"{len(lines) + 1}. {clip(value, self.item_cap or max_tokens)}"
+            if lines and used + count_tokens(line) > max_tokens:
+                break
+            lines.append(line)
+            used += count_tokens(line) + 1
+        return '\n'.join(lines), len(lines)
+
+
+# --- 1. Templates ---
+
+PREDICT_PRIORITY = Template('predict_priority', """
+Classify the priority of this civic issue.
+High: emergency, danger to life, fire, deep potholes, fraud, security.
+Medium: service disruption, billing, broken infrastructure, water leaks, traffic.
+Low: general inquiry, feedback, routine maintenance, suggestions.
+Issue: "{issue}"
+Return only JSON: {{"priority": "High"|"Medium"|"Low", "confidence": 0.0-1.0}}
+""", budget=400, max_output_tokens=64)
+
+DETECT_FAKE = Template('detect_fake', """
+Is this civic issue report fake, spam, gibberish or a prank?
+Report: "{report}"
+Return only JSON: {{"is_fake": true|false, "fake_confidence": 0.0-1.0, "reason": "short string"}}
+""", budget=400, max_output_tokens=128)
+
+CATEGORIZE = Template('categorize', """
+Categorize this civic issue as one of: """ + ', '.join(categories.CATEGORIES) + """.
+Issue: "{issue}"
+Return only JSON: {{"category": "string", "confidence": 0.0-1.0}}
+""", budget=400, max_output_tokens=64)
+
+CHECK_SEMANTIC_DUPLICATE = Template('check_semantic_duplicate', """
+Is the new civic issue report a duplicate of one of the numbered existing reports?
+New report: "{report}"
+Existing reports:
+{existing}
+Return only JSON: {{"is_duplicate": true|false, "match": number of the duplicated report or null, "score": 0.0-1.0}}
+""", budget=1000, max_output_tokens=64, caps={'report': 200}, item_cap=60)
+
+ANALYZE_TOXICITY = Template('analyze_toxicity', """
+Analyze this text for toxicity, spam or inappropriate content.
+Text: "{text}"
+Return only JSON: {{"is_toxic": true|false, "toxicity_score": 0.0-1.0, "label": "toxic"|"neutral"|"spam"}}
+""", budget=400, max_output_tokens=64)
+
+GENERATE_REPLY = Template('generate_reply', """
+You are the assistant of the Civix city management platform. Draft a polite, reassuring reply to a citizen's issue report.
+Report: "{description}"
+Current status: "{status}"
+1. Acknowledge the specific issue, using keywords from the report.
+2. Explain what the status means ("Received": we are reviewing it, "In Progress": a team is on it).
+3. Be professional and empathetic, under 50 words.
+""", budget=500, max_output_tokens=160, caps={'status': 8})
+
+TRANSCRIBE_AUDIO = Template('transcribe_audio', """
+Transcribe this audio accurately. Return only the transcribed text.
+If it contains a civic complaint or issue report, transcribe it verbatim.
+""", budget=100)
+
+VALIDATE_ISSUE_IMAGE = Template('validate_issue_image', """
+Is this image valid evidence for a civic issue report (category: {category})?
+VALID: real public infrastructure problems - potholes, road damage, broken streetlights, benches or signs, water or sewage leaks, garbage, damaged sidewalks.
+SPAM: selfies, portraits, food, memes, screenshots, text-only images, indoor scenes (unless a public building issue), pets (unless a stray or safety hazard), unrelated objects.
+Return only JSON, no markdown:
+{{"is_valid": true|false, "confidence": 0.0-1.0, "reason": "brief explanation", "detected_content": "what you see"}}
+""", budget=300, caps={'category': 8})
+
+ANALYZE_IMAGE = Template('analyze_image', """
+Identify the main objects and context in this image. Return a JSON list of tags (max 5) and a safety check.
+""", budget=100)
+
+GENERATE_CAPTION = Template('generate_caption', """
+Provide a short, descriptive caption for this image.
+""", budget=100)
+
+TEMPLATES = [
+    PREDICT_PRIORITY, DETECT_FAKE, CATEGORIZE, CHECK_SEMANTIC_DUPLICATE, ANALYZE_TOXICITY,
+    GENERATE_REPLY, TRANSCRIBE_AUDIO, VALIDATE_ISSUE_IMAGE, ANALYZE_IMAGE, GENERATE_CAPTION,
+]
+
+
+# --- 2. Calls ---
+
+def _options(prompt):
+    cap = getattr(getattr(prompt, 'template', None), 'max_output_tokens', None)
+    return {'generation_config': {'max_output_tokens': cap}} if cap else {}
+
+
+def _text(response):
+    try:
+        return response.text or ''
+    except (AttributeError, ValueError):  # blocked / empty candidates
+        return ''
+
+
+def _record(prompt, started, usage, response_text):
+    name = prompt.template.name if isinstance(prompt, Prompt) else 'adhoc'
+    prompt_tokens = getattr(usage, 'prompt_token_count', None) or count_tokens(prompt)
+    response_tokens = getattr(usage, 'candidates_token_count', None) or count_tokens(response_text)
+    metrics.incr(f'prompts.{name}.calls')
+    metrics.observe(f'prompts.{name}.prompt_tokens', prompt_tokens)
+    metrics.observe(f'prompts.{name}.response_tokens', response_tokens)
+    metrics.observe(f'prompts.{name}.ms', (time.perf_counter() - started) * 1000)
+
+
+def generate(model, prompt, *media):
+    """model.generate_content for a built prompt (plus images / uploads), with its output cap, recorded."""
+    started = time.perf_counter()
+    response = model.generate_content([prompt, *media] if media else prompt, **_options(prompt))
+    _record(prompt, started, getattr(response, 'usage_metadata', None), _text(response))
+    return response
+
+
+def stream(model, prompt):
+    """Streaming generate_content; the call is recorded once the last chunk has arrived."""
+    started = time.perf_counter()
+    parts, usage = [], None
+    for chunk in model.generate_content(prompt, stream=True, **_options(prompt)):
+        usage = getattr(chunk, 'usage_metadata', None) or usage
+        parts.append(_text(chunk))
+        yield chunk
+    _record(prompt, started, usage, ''.join(parts))
+
+
+def stats():
+    """Per-template budget, calls, average tokens each way, average latency and fields cut."""
+    summaries = metrics.snapshot('prompts.')['summaries']
+
+    def avg(key):
+        return summaries.get(key, {}).get('avg')
+
+    return {
+        t.name: {
+            'budget': t.budget,
+            'max_output_tokens': t.max_output_tokens,
+            'calls': metrics.get(f'prompts.{t.name}.calls'),
+            'avg_prompt_tokens': avg(f'prompts.{t.name}.prompt_tokens'),
+            'avg_response_tokens': avg(f'prompts.{t.name}.response_tokens'),
+            'avg_ms': avg(f'prompts.{t.name}.ms'),
+            'cut': metrics.get(f'prompts.{t.name}.cut'),
+        }
+        for t in TEMPLATES
+    }
@@ -0,0 +1,108 @@
+"""
+Compact embedding representations.
+
+Vectors can be shrunk three ways, independently:
+
+* dimension reduction with a fixed, seeded random orthonormal projection
+  (identical in every worker, so reduced vectors stay comparable);
+* float16 storage (2 bytes / dim);
+* int8 storage with one float32 scale per vector (1 byte / dim + 4 bytes).
+
+Vectors are L2-normalised before quantisation, so cosine similarity on int8
+codes is just an integer dot product divided by the code norms - the scales
+cancel and search never has to dequantise.
+"""
+import base64
+import threading
+
+import numpy as np
+
+DTYPES = ('float32', 'float16', 'int8')
+_PROJECTION_SEED = 7331
+
+_projections = {}
+_lock = threading.Lock()
+
+
+def _projection(in_dim, out_dim):
+    key = (in_dim, out_dim)
+    matrix = _projections.get(key)
+    if matrix is None:
+        with _lock:
+            matrix = _projections.get(key)
+            if matrix is None:
+                rng = np.random.default_rng(_PROJECTION_SEED + in_dim * 7919 + out_dim)
+                gaussian = rng.standard_normal((in_dim, out_dim)).astype(np.float32)
+                matrix, _ = np.linalg.qr(gaussian)  # orthonormal columns
+                _projections[key] = matrix = matrix.astype(np.float32)
+    return matrix
+
+
+def normalize(vectors):
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def reduce(vectors, dim):
+    """Project (n, d) vectors to (n, dim); no-op when dim is None or >= d."""
+    vectors = normalize(vectors)
+    if not dim or dim >= vectors.shape[1]:
+        return vectors
+    return normalize(vectors @ _projection(vectors.shape[1], int(dim)))
+
+
+def quantize(vectors, dtype='int8', dim=None):
+    """Return (codes, scales). `scales` is None except for int8."""
+    if dtype not in DTYPES:
+        raise ValueError(f"dtype must be one of {', '.join(DTYPES)}")
+    vectors = reduce(vectors, dim)
+    if dtype == 'float32':
+        return vectors, None
+    if dtype == 'float16':
+        return vectors.astype(np.float16), None
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales = np.maximum(scales, 1e-12).astype(np.float32)
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales
+
+
+def dequantize(codes, scales=None):
+    codes = np.asarray(codes)
+    if scales is None:
+        return codes.astype(np.float32)
+    return codes.astype(np.float32) * np.asarray(scales, dtype=np.float32)[:, None]
+
+
+def to_base64(codes):
+    return base64.b64encode(np.ascontiguousarray(codes).tobytes()).decode('ascii')
+
+
+def from_base64(data, dtype, dim):
+    return np.frombuffer(base64.b64decode(data), dtype=np.dtype(dtype)).reshape(-1, dim)
+
+
+def cosine_scores(query_codes, codes):
+    """
+    Cosine similarity of one query against (n, d) codes of the same dtype.
+    int8 codes are multiplied as raw integers - products summed over d <= 1024
+    stay below 2**24, so float32 accumulation is exact and goes through BLAS.
+    """
+    query = np.asarray(query_codes, dtype=np.float32).reshape(-1)
+    matrix = np.atleast_2d(codes).astype(np.float32, copy=False)
+    dots = matrix @ query
+    norms = np.sqrt(np.einsum('ij,ij->i', matrix, matrix)) * np.linalg.norm(query)
+    return dots / np.maximum(norms, 1e-12)
+
+
+def top_k(query_codes, codes, k=10):
+    scores = cosine_scores(query_codes, codes)
+    k = min(k, len(scores))
+    idx = np.argpartition(-scores, k - 1)[:k]
+    idx = idx[np.argsort(-scores[idx])]
+    return idx, scores[idx]
+
+
+def nbytes(dtype, dim):
+    """Storage per vector, including the int8 scale."""
+    return dim * np.dtype(dtype).itemsize + (4 if dtype == 'int8' else 0)
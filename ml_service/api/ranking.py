@@ -0,0 +1,310 @@
+"""
+Officer work queues ranked by urgency.
+
+Every open issue gets a score built from its ML priority, its age, the size
+of its duplicate incident (api/incidents.py), its upvotes and its predicted
+resolution time (api/resolution_model.py; quick fixes get a small boost so
+they don't wait behind long jobs):
+
+    score(now) = base + RANK_AGE_POINTS_PER_DAY * age_days
+
+Every issue ages at the same rate, so ordering by
+`key = base - RANK_AGE_POINTS_PER_DAY * created_days` is the same as ordering
+by score at any moment. Only an update to the issue itself changes its
+position, never the clock.
+
+Each queue (`officer:<id>` and `category:<name>`) is a max-heap with lazy
+deletion. An update costs O(log n). Reading the top N walks the heap best
+first without popping, in O(N log N) whatever the queue length.
+
+Issues are stored in the `ml_ranking` table with a version number that grows
+on every change. Each worker keeps its heaps in memory and, before serving a
+request, applies only the rows changed since its last version, so gunicorn
+workers agree without re-sorting anything.
+"""
+import heapq
+import math
+import os
+import threading
+import time
+
+from api import incidents, metrics, resolution_model, sqlite
+
+RANK_AGE_POINTS_PER_DAY = float(os.getenv('RANK_AGE_POINTS_PER_DAY', '2'))
+RANK_CLUSTER_POINTS = float(os.getenv('RANK_CLUSTER_POINTS', '6'))  # per doubling of the incident size
+RANK_UPVOTE_POINTS = float(os.getenv('RANK_UPVOTE_POINTS', '4'))  # per doubling of upvotes + 1
+RANK_QUICK_FIX_POINTS = float(os.getenv('RANK_QUICK_FIX_POINTS', '6'))  # scaled by 1 / (1 + predicted days)
+PRIORITY_POINTS = {'High': 30.0, 'Medium': 15.0, 'Low': 5.0, 'Pending': 10.0}
+CLOSED_STATUSES = {'Resolved', 'Rejected', 'Spam', 'Closed'}
+DAY = 86400.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ml_ranking (
+    issue_id TEXT PRIMARY KEY,
+    officer TEXT,
+    category TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    upvotes INTEGER NOT NULL,
+    cluster_size INTEGER NOT NULL,
+    predicted_days REAL NOT NULL,
+    created_at REAL NOT NULL,
+    key REAL NOT NULL,
+    open INTEGER NOT NULL,
+    version INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ml_ranking_version ON ml_ranking (version);
+"""
+
+
+def _db():
+    return sqlite.db(_SCHEMA)
+
+
+# --- 1. Scores ---
+
+def base_score(priority, upvotes, cluster_size, predicted_days):
+    return (
+        PRIORITY_POINTS.get(priority, PRIORITY_POINTS['Pending'])
+        + RANK_CLUSTER_POINTS * math.log2(max(1, cluster_size))
+        + RANK_UPVOTE_POINTS * math.log2(1 + max(0, upvotes))
+        + RANK_QUICK_FIX_POINTS / (1 + max(0.0, predicted_days))
+    )
+
+
+def time_invariant_key(base, created_at):
+    return base - RANK_AGE_POINTS_PER_DAY * created_at / DAY
+
+
+def score_at(key, now=None):
+    """The key turned back into the score at `now` (base + age points)."""
+    return key + RANK_AGE_POINTS_PER_DAY * (now or time.time()) / DAY
+
+
+# --- 2. Heaps ---
+
+class RankedQueue:
+    """
+    Max-heap of issue ids by key with lazy deletion. A changed or removed
+    issue leaves its old entry behind; reads skip entries that don't match
+    the live key, and the heap is rebuilt once stale entries outnumber live
+    ones, so updates stay O(log n) amortised.
+    """
+
+    def __init__(self):
+        self._heap = []  # (-key, issue_id)
+        self._live = {}  # issue_id -> key
+
+    def __len__(self):
+        return len(self._live)
+
+    def put(self, issue_id, key):
+        if self._live.get(issue_id) == key:
+            return
+        self._live[issue_id] = key
+        heapq.heappush(self._heap, (-key, issue_id))
+        self._compact()
+
+    def discard(self, issue_id):
+        if self._live.pop(issue_id, None) is not None:
+            self._compact()
+
+    def _compact(self):
+        if len(self._heap) > 2 * len(self._live) + 64:
+            self._heap = [(-key, issue_id) for issue_id, key in self._live.items()]
+            heapq.heapify(self._heap)
+
+    def top(self, n):
+        """
+        The n best (issue_id, key), best first, without touching the heap: a
+        best-first walk over the heap array where a node is visited only after
+        its parent.
+        """
+        heap, live = self._heap, self._live
+        result, seen = [], set()
+        frontier = [(heap[0], 0)] if heap else []
+        while frontier and len(result) < n:
+            (negated, issue_id), i = heapq.heappop(frontier)
+            if live.get(issue_id) == -negated and issue_id not in seen:
+                seen.add(issue_id)
+                result.append((issue_id, -negated))
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+        return result
+
+
+_lock = threading.Lock()
+_queues = {}  # queue name -> RankedQueue
+_placed = {}  # issue_id -> queue names it is in
+_version = None  # highest ml_ranking version applied in this worker
+
+
+def queue_names(officer, category):
+    return ((f'officer:{officer}',) if officer else ()) + (f'category:{category}',)
+
+
+def _apply(row):
+    for name in _placed.pop(row['issue_id'], ()):
+        _queues[name].discard(row['issue_id'])
+    if row['open']:
+        names = queue_names(row['officer'], row['category'])
+        for name in names:
+            _queues.setdefault(name, RankedQueue()).put(row['issue_id'], row['key'])
+        _placed[row['issue_id']] = names
+
+
+def _sync(conn):
+    """Apply rows changed by any worker since this one last looked."""
+    global _version
+    with _lock:  # held across the read so two threads can't apply versions out of order
+        if _version is None:
+            # Version first: a row written in between is loaded now and re-applied (harmlessly) next time.
+            latest = conn.execute('SELECT COALESCE(MAX(version), 0) FROM ml_ranking').fetchone()[0]
+            rows = conn.execute('SELECT * FROM ml_ranking WHERE open = 1').fetchall()
+        else:
+            rows = conn.execute('SELECT * FROM ml_ranking WHERE version > ? ORDER BY version', (_version,)).fetchall()
+            latest = rows[-1]['version'] if rows else _version
+        for row in rows:
+            _apply(row)
+        _version = latest
+    if rows:
+        metrics.incr('ranking.synced_rows', len(rows))
+
+
+# --- 3. Updates and reads ---
+
+def _merged(issue, row, incident_sizes):
+    """Stored fields overlaid with whatever the update carries."""
+    upvotes = issue.get('upvotes')
+    current = dict(row) if row else {
+        'officer': None, 'category': 'General', 'priority': 'Pending', 'upvotes': 0,
+        'cluster_size': None, 'predicted_days': None, 'created_at': time.time(),
+    }
+    if 'officer' in issue or 'assignedOfficer' in issue:
+        current['officer'] = str(issue.get('officer') or issue.get('assignedOfficer') or '') or None
+    for field in ('category', 'priority'):
+        if issue.get(field):
+            current[field] = str(issue[field])
+    if upvotes is not None:
+        current['upvotes'] = len(upvotes) if isinstance(upvotes, list) else int(upvotes)
+    if issue.get('created_at') or issue.get('createdAt'):
+        current['created_at'] = sqlite.timestamp(issue.get('created_at') or issue.get('createdAt'))
+    if issue.get('cluster_size') is not None:
+        current['cluster_size'] = int(issue['cluster_size'])
+    elif current['cluster_size'] is None:
+        current['cluster_size'] = incident_sizes.get(issue['id'], 1)
+    if issue.get('predicted_days') is not None:
+        current['predicted_days'] = float(issue['predicted_days'])
+    elif current['predicted_days'] is None or any(issue.get(f) for f in ('category', 'priority')):
+        current['predicted_days'] = resolution_model.predict({
+            **issue, 'category': current['category'], 'priority': current['priority'],
+        })['p50_days']
+    status = issue.get('status')
+    if status in CLOSED_STATUSES or issue.get('open') is False:
+        current['open'] = 0
+    elif status or issue.get('open'):
+        current['open'] = 1
+    else:
+        current.setdefault('open', 1)
+    base = base_score(current['priority'], current['upvotes'], current['cluster_size'], current['predicted_days'])
+    current['key'] = time_invariant_key(base, current['created_at'])
+    return current
+
+
+def update(issues):
+    """
+    Insert or update issues: [{id, status, officer | assignedOfficer, category,
+    priority, upvotes (count or list), created_at, cluster_size?,
+    predicted_days?, lat?, lng?}]. Only `id` is required on later updates.
+    Returns (updated, errors).
+    """
+    updated, errors = 0, []
+    # Looked up before the write lock is taken: the incidents table has its own connection.
+    incident_sizes = incidents.incident_sizes(
+        str(issue.get('id') or issue.get('_id')) for issue in issues
+        if isinstance(issue, dict) and issue.get('cluster_size') is None and (issue.get('id') or issue.get('_id'))
+    )
+    with _db() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            version = conn.execute('SELECT COALESCE(MAX(version), 0) FROM ml_ranking').fetchone()[0]
+            for issue in issues:
+                try:
+                    issue_id = str(issue.get('id') or issue.get('_id') or '')
+                    if not issue_id:
+                        raise ValueError("missing id")
+                    issue = {**issue, 'id': issue_id}
+                    row = conn.execute('SELECT * FROM ml_ranking WHERE issue_id = ?', (issue_id,)).fetchone()
+                    merged = _merged(issue, row, incident_sizes)
+                except (AttributeError, TypeError, ValueError, KeyError) as e:
+                    errors.append({'id': issue.get('id') if isinstance(issue, dict) else None, 'error': str(e)})
+                    continue
+                version += 1
+                conn.execute(
+                    'INSERT OR REPLACE INTO ml_ranking (issue_id, officer, category, priority, upvotes, cluster_size, '
+                    'predicted_days, created_at, key, open, version) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (issue_id, merged['officer'], merged['category'], merged['priority'], merged['upvotes'],
+                     merged['cluster_size'], merged['predicted_days'], merged['created_at'], merged['key'],
+                     merged['open'], version),
+                )
+                updated += 1
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        _sync(conn)
+    metrics.incr('ranking.updates', updated)
+    return updated, errors
+
+
+def set_cluster_sizes(sizes):
+    """Refresh incident sizes ({issue_id: size}) after a clustering run; only changed rows are touched."""
+    if not sizes:
+        return 0
+    changed = 0
+    with _db() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            version = conn.execute('SELECT COALESCE(MAX(version), 0) FROM ml_ranking').fetchone()[0]
+            rows = conn.execute('SELECT * FROM ml_ranking WHERE open = 1').fetchall()
+            for row in rows:
+                size = sizes.get(row['issue_id'], 1)
+                if size == row['cluster_size']:
+                    continue
+                base = base_score(row['priority'], row['upvotes'], size, row['predicted_days'])
+                version += 1
+                conn.execute(
+                    'UPDATE ml_ranking SET cluster_size = ?, key = ?, version = ? WHERE issue_id = ?',
+                    (size, time_invariant_key(base, row['created_at']), version, row['issue_id']),
+                )
+                changed += 1
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+    return changed
+
+
+def queue(officer=None, category=None, limit=20, offset=0, now=None):
+    """{total, issues: [{id, score}]} for one officer's or one category's open issues, best first."""
+    with _db() as conn:
+        _sync(conn)
+    now = now or time.time()
+    name = f'officer:{officer}' if officer else f'category:{category}'
+    with _lock:
+        ranked = _queues.get(name)
+        total = len(ranked) if ranked else 0
+        top = ranked.top(offset + limit)[offset:] if ranked else []
+    return {
+        'total': total,
+        'issues': [{'id': issue_id, 'score': round(score_at(key, now), 2)} for issue_id, key in top],
+    }
+
+
+def stats():
+    with _lock:
+        return {
+            'queues': len(_queues),
+            'open_issues': len(_placed),
+            'version': _version,
+        }
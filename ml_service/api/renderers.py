@@ -0,0 +1,77 @@
+"""
+Faster wire formats for the DRF API.
+
+`ORJSONRenderer` / `ORJSONParser` replace DRF's stdlib-json pair for
+`application/json` (same media type, so clients see no difference).
+`MessagePackRenderer` / `MessagePackParser` add `application/msgpack` as an
+alternative content type, negotiated through `Accept` / `Content-Type`; they
+are only enabled in settings when the `msgpack` package is installed.
+
+Types the codecs don't know natively (Decimal, lazy strings, numpy scalars,
+...) go through DRF's own encoder, so output matches the default renderer.
+"""
+import orjson
+from rest_framework import renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.utils.encoders import JSONEncoder
+
+from civix_ml.startup import lazy_module
+
+_msgpack = lazy_module('msgpack')
+_encoder = JSONEncoder()
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+class ORJSONRenderer(renderers.BaseRenderer):
+    media_type = 'application/json'
+    format = 'json'
+    charset = None  # orjson always emits UTF-8
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        options = ORJSON_OPTIONS
+        # Honour `Accept: application/json; indent=2` like DRF does.
+        if accepted_media_type and 'indent=' in accepted_media_type:
+            options |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=_encoder.default, option=options)
+
+
+def ndjson_line(obj):
+    """One newline-terminated JSON line for streamed (NDJSON) responses."""
+    return orjson.dumps(obj, default=_encoder.default, option=ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE)
+
+
+class ORJSONParser(BaseParser):
+    media_type = 'application/json'
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as e:
+            raise ParseError(f'JSON parse error - {e}')
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return _msgpack().packb(data, default=_encoder.default, use_bin_type=True)
+
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return _msgpack().unpackb(stream.read(), raw=False, strict_map_key=False)
+        except Exception as e:
+            raise ParseError(f'MessagePack parse error - {e}')
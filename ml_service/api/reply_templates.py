@@ -0,0 +1,163 @@
+"""
+Cache of approved reply skeletons per (category, status).
+
+Most officer replies are the same few sentences with the issue's keywords
+swapped in, so a skeleton like "a {category} team is now working on the
+{issue}" is filled in locally and no LLM call is needed. Officers approve
+new skeletons through /api/reply-templates/; lookups fall back from
+(category, status) to ('*', status).
+
+The skeletons shipped in datasets/reply_templates.json are read-only
+defaults. Approvals go to reply_templates.json in settings.ML_STATE_DIR,
+outside the source tree, and override the defaults. Every worker re-reads
+that file when its modification time changes, so an approval made through
+one worker is served by all of them.
+"""
+import json
+import logging
+import os
+import re
+import string
+import threading
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: single process, no cross-worker lock needed
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATES_PATH = os.getenv('REPLY_TEMPLATES_PATH', os.path.join(BASE_DIR, 'datasets', 'reply_templates.json'))
+MAX_TEMPLATE_CHARS = 600
+
+PLACEHOLDERS = {'issue', 'category', 'status'}
+STOPWORDS = {
+    'a', 'an', 'the', 'is', 'are', 'was', 'were', 'be', 'been', 'it', 'its', 'this', 'that', 'there',
+    'here', 'in', 'on', 'at', 'of', 'to', 'for', 'from', 'near', 'by', 'with', 'and', 'or', 'but',
+    'please', 'kindly', 'i', 'we', 'my', 'our', 'you', 'your', 'they', 'them', 'has', 'have', 'had',
+    'not', 'no', 'very', 'since', 'days', 'day', 'weeks', 'also', 'still', 'so', 'fix', 'help', 'urgent',
+}
+_WORD = re.compile(r"[a-zA-Z][a-zA-Z'-]+")
+
+_lock = threading.Lock()
+_defaults = None
+_approved = (None, {})  # (mtime_ns of the approvals file, its templates)
+
+
+def _key(category, status):
+    return f"{category}|{status}"
+
+
+def _approved_path():
+    return os.path.join(settings.ML_STATE_DIR, 'reply_templates.json')
+
+
+def _read(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _load():
+    """Shipped defaults overlaid with the approvals file, re-read whenever that file changes."""
+    global _defaults, _approved
+    if _defaults is None:
+        with _lock:
+            if _defaults is None:
+                try:
+                    _defaults = _read(TEMPLATES_PATH)
+                except (OSError, ValueError) as e:
+                    logger.error(f"Reply templates unavailable: {e}")
+                    _defaults = {}
+    try:
+        mtime = os.stat(_approved_path()).st_mtime_ns
+    except OSError:
+        mtime = None
+    if mtime != _approved[0]:
+        with _lock:
+            if mtime != _approved[0]:
+                try:
+                    _approved = (mtime, _read(_approved_path()) if mtime is not None else {})
+                except (OSError, ValueError) as e:
+                    logger.error(f"Approved reply templates unreadable: {e}")
+    return {**_defaults, **_approved[1]}
+
+
+def keywords(description, limit=3):
+    """First run of content words in the report, e.g. 'broken street light'."""
+    words = []
+    for word in _WORD.findall(description or ''):
+        lowered = word.lower()
+        if lowered in STOPWORDS:
+            if words:
+                break
+            continue
+        words.append(lowered)
+        if len(words) == limit:
+            break
+    return ' '.join(words) or 'issue'
+
+
+def lookup(category, status):
+    templates = _load()
+    return templates.get(_key(category, status)) or templates.get(_key('*', status))
+
+
+def render(description, category, status):
+    """Filled reply for (category, status), or None when no skeleton is approved."""
+    template = lookup(category or 'General', status)
+    if not template:
+        return None
+    team = category.lower() if category and category != 'General' else 'civic'
+    try:
+        return template.format(issue=keywords(description), category=team, status=status)
+    except (ValueError, IndexError, KeyError, AttributeError) as e:
+        logger.error(f"Reply template for {category}/{status} is broken: {e}")
+        return None
+
+
+def validate(template):
+    """Raise ValueError unless `template` is plain text with only {issue}, {category} and {status} fields."""
+    if not isinstance(template, str) or not template.strip():
+        raise ValueError("template must be a non-empty string")
+    if len(template) > MAX_TEMPLATE_CHARS:
+        raise ValueError(f"template is longer than {MAX_TEMPLATE_CHARS} characters")
+    try:
+        fields = [(field, conversion, spec) for _, field, spec, conversion in string.Formatter().parse(template)
+                  if field is not None]
+    except ValueError as e:
+        raise ValueError(f"Malformed template: {e}") from None
+    unknown = {field for field, _, _ in fields if field not in PLACEHOLDERS}
+    if unknown:
+        raise ValueError(f"Unknown placeholders: {', '.join(sorted(repr(f) for f in unknown))}")
+    if any(conversion or spec for _, conversion, spec in fields):
+        raise ValueError("Placeholders take no conversions or format specs")
+    try:
+        template.format(issue='issue', category='civic', status='Received')
+    except (ValueError, IndexError, KeyError) as e:
+        raise ValueError(f"Malformed template: {e}") from None
+
+
+def approve(category, status, template):
+    """Validate and persist a new skeleton in the approvals file. Raises ValueError if it is invalid."""
+    validate(template)
+    path = _approved_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _lock, open(f"{path}.lock", 'w') as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)  # another worker may be approving at the same time
+        try:
+            approved = _read(path)
+        except FileNotFoundError:
+            approved = {}
+        approved[_key(category or '*', status)] = template
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(approved, f, indent=2)
+        os.replace(tmp_path, path)
+
+
+def all_templates():
+    return _load()
@@ -0,0 +1,242 @@
+"""
+Local resolution-time model.
+
+Trained from an export of historically resolved issues (see
+backend/scripts/export_resolved_issues.js) by civix_ml/train_resolution_model.py.
+
+The model works in log-days. A single slope captures officer workload; the
+remaining spread is summarised by empirical p50/p90 quantiles over a
+hierarchy of groups, from (category, priority, cell, season) down to the
+global distribution. Prediction uses the most specific group with enough
+history, so it is a handful of dict lookups and never touches the network.
+"""
+import json
+import logging
+import math
+import os
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_PATH = os.getenv(
+    'RESOLUTION_MODEL_PATH',
+    os.path.join(BASE_DIR, 'civix_ml', 'models', 'resolution_model.json'),
+)
+
+CELL_SIZE_DEG = 0.05  # ~5 km grid cells
+MIN_SAMPLES = 8
+
+# Most specific first; a group is used only when it has MIN_SAMPLES issues
+LEVELS = [
+    ('category', 'priority', 'cell', 'season'),
+    ('category', 'priority', 'season'),
+    ('category', 'priority'),
+    ('category',),
+    ('priority',),
+    (),
+]
+
+# Used until a model has been trained: (p50, p90) days per priority
+PRIOR_DAYS = {'High': (2.0, 5.0), 'Medium': (5.0, 12.0), 'Low': (10.0, 25.0)}
+
+
+def priority_from(issue):
+    priority = issue.get('priority')
+    if priority in PRIOR_DAYS:
+        return priority
+    try:
+        severity = int(issue.get('severity', 5))
+    except (TypeError, ValueError):
+        severity = 5
+    if severity >= 7:
+        return 'High'
+    return 'Medium' if severity >= 4 else 'Low'
+
+
+def _parse_date(value):
+    if not value:
+        return None
+    if isinstance(value, (int, float)):
+        try:
+            return datetime.fromtimestamp(value / 1000 if value > 1e11 else value, timezone.utc).replace(tzinfo=None)
+        except (OverflowError, OSError, ValueError):
+            return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _coordinate(value, name):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number") from None
+    if not math.isfinite(value):
+        raise ValueError(f"{name} must be finite")
+    return value
+
+
+def features(issue):
+    """Map a raw issue dict onto the model's categorical features. Raises ValueError on malformed input."""
+    if not isinstance(issue, dict):
+        raise ValueError("issue must be an object")
+    lat, lng = issue.get('lat'), issue.get('lng')
+    coords = issue.get('coordinates') or {}
+    if not isinstance(coords, dict):
+        raise ValueError("coordinates must be an object")
+    lat = lat if lat is not None else coords.get('lat')
+    lng = lng if lng is not None else coords.get('lng')
+    cell = (
+        f"{math.floor(_coordinate(lat, 'lat') / CELL_SIZE_DEG)}:{math.floor(_coordinate(lng, 'lng') / CELL_SIZE_DEG)}"
+        if lat is not None and lng is not None else 'none'
+    )
+    created = (_parse_date(issue.get('created_at') or issue.get('createdAt'))
+               or datetime.now(timezone.utc).replace(tzinfo=None))
+    workload = issue.get('officer_workload', issue.get('active_tasks', 0))
+    try:
+        workload = float(workload or 0)
+    except (TypeError, ValueError):
+        workload = 0.0
+    return {
+        'category': str(issue.get('category') or 'General'),
+        'priority': priority_from(issue),
+        'cell': cell,
+        'season': f"Q{(created.month - 1) // 3 + 1}",
+        'workload': workload,
+    }
+
+
+def _group_key(feats, level):
+    return '|'.join(feats[name] for name in level)
+
+
+class ResolutionModel:
+    def __init__(self, beta=0.0, tables=None, trained_on=0):
+        self.beta = beta
+        self.tables = tables or {}
+        self.trained_on = trained_on
+
+    @classmethod
+    def fit(cls, records):
+        """`records`: issue dicts with created/resolved timestamps (see export script)."""
+        rows = []
+        for record in records:
+            created = _parse_date(record.get('created_at') or record.get('createdAt'))
+            resolved = _parse_date(record.get('resolved_at') or record.get('resolvedAt'))
+            if not created or not resolved or resolved < created:
+                continue
+            days = max((resolved - created).total_seconds() / 86400, 0.04)
+            try:
+                rows.append((features(record), math.log(days)))
+            except ValueError:
+                continue
+        if not rows:
+            raise ValueError("No usable resolved issues in export")
+
+        # Workload slope, fitted on residuals within (category, priority) groups
+        log_days = np.array([y for _, y in rows])
+        workload = np.array([f['workload'] for f, _ in rows])
+        groups = [_group_key(f, ('category', 'priority')) for f, _ in rows]
+        _, inverse, counts = np.unique(groups, return_inverse=True, return_counts=True)
+        y_res = log_days - (np.bincount(inverse, weights=log_days) / counts)[inverse]
+        x_res = workload - (np.bincount(inverse, weights=workload) / counts)[inverse]
+        denom = float(x_res @ x_res)
+        beta = float(x_res @ y_res) / denom if denom else 0.0
+
+        base = log_days - beta * workload
+        tables = {}
+        for level in LEVELS:
+            buckets = {}
+            for (feats, _), value in zip(rows, base):
+                buckets.setdefault(_group_key(feats, level), []).append(value)
+            tables['/'.join(level) or 'global'] = {
+                key: [round(float(q), 4) for q in np.quantile(values, [0.5, 0.9])] + [len(values)]
+                for key, values in buckets.items()
+                if len(values) >= MIN_SAMPLES or not level
+            }
+        return cls(beta=round(beta, 6), tables=tables, trained_on=len(rows))
+
+    def predict(self, issue):
+        feats = features(issue)
+        for level in LEVELS:
+            entry = self.tables.get('/'.join(level) or 'global', {}).get(_group_key(feats, level))
+            if entry:
+                p50, p90, support = entry
+                shift = self.beta * feats['workload']
+                return {
+                    'p50_days': round(math.exp(p50 + shift), 1),
+                    'p90_days': round(math.exp(p90 + shift), 1),
+                    'support': support,
+                    'level': '/'.join(level) or 'global',
+                    'method': 'LOCAL_MODEL',
+                }
+        return prior_prediction(feats)
+
+    def to_dict(self):
+        return {'beta': self.beta, 'tables': self.tables, 'trained_on': self.trained_on}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(beta=data['beta'], tables=data['tables'], trained_on=data.get('trained_on', 0))
+
+    def save(self, path=MODEL_PATH):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, separators=(',', ':'))
+
+
+def prior_prediction(feats):
+    p50, p90 = PRIOR_DAYS[feats['priority']]
+    return {'p50_days': p50, 'p90_days': p90, 'support': 0, 'level': 'prior', 'method': 'PRIOR'}
+
+
+_lock = threading.Lock()
+_model = None
+_model_mtime = None
+
+
+def get_model():
+    """Load (or reload after retraining) the model file; None if not trained yet."""
+    global _model, _model_mtime
+    try:
+        mtime = os.path.getmtime(MODEL_PATH)
+    except OSError:
+        return None
+    if _model is None or mtime != _model_mtime:
+        with _lock:
+            if _model is None or mtime != _model_mtime:
+                with open(MODEL_PATH, encoding='utf-8') as f:
+                    _model = ResolutionModel.from_dict(json.load(f))
+                _model_mtime = mtime
+                logger.info(f"Loaded resolution model trained on {_model.trained_on} issues")
+    return _model
+
+
+def _predict_one(model, issue):
+    result = model.predict(issue) if model else prior_prediction(features(issue))
+    result['estimated_days'] = max(1, int(round(result['p50_days'])))
+    return result
+
+
+def predict_many(issues):
+    """One prediction per issue; a malformed issue gets {"error": ...} instead."""
+    model = get_model()
+    results = []
+    for issue in issues:
+        try:
+            results.append(_predict_one(model, issue))
+        except ValueError as e:
+            results.append({'error': str(e)})
+    return results
+
+
+def predict(issue):
+    """Raises ValueError on malformed input."""
+    return _predict_one(get_model(), issue)
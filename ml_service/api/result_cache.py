@@ -0,0 +1,112 @@
+"""
+Semantic cache for LLM classifications.
+
+Thirty citizens describing the same burst pipe produce thirty slightly
+different texts, so an exact-text cache rarely hits. Each task keeps a
+bounded LRU of LLM verdicts. A lookup first tries the normalised text
+(exact hit), then the nearest cached text in a MinHash LSH index over the
+same entries (semantic hit, Jaccard >= SEMANTIC_CACHE_THRESHOLD). MinHash
+needs no network call, unlike an embedding lookup, so a miss costs well under
+a millisecond.
+
+Entries expire after SEMANTIC_CACHE_TTL_SECONDS and the least recently used
+are evicted beyond SEMANTIC_CACHE_SIZE per task. Only verdicts that came
+back from the LLM are stored; local fallbacks never are. The cache is per
+worker, like the MinHash index of open issues.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from api import metrics, minhash
+
+SEMANTIC_CACHE_SIZE = int(os.getenv('SEMANTIC_CACHE_SIZE', '2000'))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv('SEMANTIC_CACHE_TTL_SECONDS', str(6 * 3600)))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.7'))
+TASKS = ('predict_priority', 'categorize', 'detect_fake', 'analyze_toxicity')
+
+
+class ResultCache:
+    """LRU + TTL map from normalised text to verdict, with a MinHash index for near matches."""
+
+    def __init__(self, max_entries=SEMANTIC_CACHE_SIZE, ttl=SEMANTIC_CACHE_TTL_SECONDS,
+                 threshold=SEMANTIC_CACHE_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # text key -> (verdict, expires_at)
+        self._index = minhash.MinHashIndex()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _live(self, key, now):
+        """The entry's verdict, refreshed as most recently used, or None if missing / expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= now:
+            del self._entries[key]
+            self._index.remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def get(self, text):
+        """(verdict, 'exact' | 'semantic') or (None, None)."""
+        key = minhash.text_key(text)
+        now = time.monotonic()
+        with self._lock:
+            verdict = self._live(key, now)
+        if verdict is not None:
+            return verdict, 'exact'
+        for match, _ in self._index.query(text, threshold=self.threshold, limit=3):
+            with self._lock:
+                verdict = self._live(match, now)
+            if verdict is not None:
+                return verdict, 'semantic'
+        return None, None
+
+    def put(self, text, verdict):
+        key = minhash.text_key(text)
+        self._index.add(key, text)
+        with self._lock:
+            self._entries[key] = (verdict, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._index.remove(evicted)
+
+
+_caches = {task: ResultCache() for task in TASKS}
+
+
+def lookup(task, text):
+    """Cached verdict for `text` as (verdict, kind), counting exact and semantic hits separately."""
+    if not text or not text.strip():
+        return None, None
+    verdict, kind = _caches[task].get(text)
+    metrics.incr(f'cache.{task}.{kind or "miss"}')
+    return (dict(verdict), kind) if verdict is not None else (None, None)
+
+
+def store(task, text, verdict):
+    if text and text.strip() and isinstance(verdict, dict):
+        _caches[task].put(text, dict(verdict))
+
+
+def stats():
+    """Size and hit rates per task, for the metrics endpoint."""
+    result = {}
+    for task, cache in _caches.items():
+        exact, semantic, miss = (metrics.get(f'cache.{task}.{kind}') for kind in ('exact', 'semantic', 'miss'))
+        lookups = exact + semantic + miss
+        result[task] = {
+            'size': len(cache),
+            'exact_hit_rate': metrics.ratio(exact, lookups),
+            'semantic_hit_rate': metrics.ratio(semantic, lookups),
+            'lookups': lookups,
+        }
+    return result
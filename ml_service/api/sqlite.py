@@ -0,0 +1,65 @@
+"""
+The SQLite file the service keeps its state in (settings.ML_JOBS_DB).
+
+Jobs, feedback, category centroids, hotspots, incidents, ranking and drafts
+each declare their tables as a schema script and open connections through
+`db(schema)`:
+
+    with sqlite.db(_SCHEMA) as conn:
+        conn.execute(...)
+
+Connections are in autocommit mode (writers use BEGIN IMMEDIATE) and return
+sqlite3.Row rows. The first connection in each worker turns on WAL and runs
+the schema script, once per schema and database path, so pointing
+ML_JOBS_DB somewhere else (as the tests do) starts from a fresh file.
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+_lock = threading.Lock()
+_ready = set()  # (path, schema) already applied in this process
+
+
+def path():
+    return str(getattr(settings, 'ML_JOBS_DB', os.path.join(settings.BASE_DIR, 'db.sqlite3')))
+
+
+def connect(schema):
+    db_path = path()
+    conn = sqlite3.connect(db_path, timeout=10, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    key = (db_path, schema)
+    if key not in _ready:
+        with _lock:
+            if key not in _ready:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.executescript(schema)
+                _ready.add(key)
+    return conn
+
+
+@contextmanager
+def db(schema):
+    conn = connect(schema)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def timestamp(value):
+    """Epoch seconds from an ISO date, epoch seconds / milliseconds, or None (now)."""
+    if value in (None, ''):
+        return time.time()
+    if isinstance(value, (int, float)):
+        return value / 1000 if value > 1e11 else float(value)
+    parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if not parsed.tzinfo:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
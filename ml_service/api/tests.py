@@ -1,3 +1,495 @@
-from django.test import TestCase
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+
+from api import admission, incidents, jobs, minhash, prefilter, ranking, resolution_model, views
+
+
+class AhoCorasickTests(SimpleTestCase):
+    def setUp(self):
+        self.matcher = prefilter.AhoCorasick({'he': 'a', 'she': 'a', 'hers': 'b', 'free money': 'spam'})
+
+    def test_finds_overlapping_patterns_in_one_pass(self):
+        self.assertEqual(sorted(self.matcher.find('ushers she')), [('she', 'a')])
+        self.assertEqual(sorted(self.matcher.find('she hers')), [('hers', 'b'), ('she', 'a')])
+
+    def test_whole_words_only_and_case_insensitive(self):
+        self.assertEqual(self.matcher.find('FREE MONEY now'), [('free money', 'spam')])
+        self.assertEqual(self.matcher.find('carefree moneylender'), [])
+
+
+class PrefilterSignalTests(SimpleTestCase):
+    def test_prose_is_not_a_url(self):
+        self.assertFalse(prefilter.URL_RE.search('Shops near the market.In the evening it floods'))
+        self.assertFalse(prefilter.URL_RE.search('The pipe burst.It is still leaking'))
+
+    def test_links_are_urls(self):
+        for text in ('visit www.win-prize-today.xyz', 'see cheapdeals.in today', 'Click HTTPS://bit.ly/x'):
+            self.assertTrue(prefilter.URL_RE.search(text), text)
+
+    def test_dates_ranges_and_ids_are_not_phones(self):
+        for text in (
+            'On 12-03-2024 the road caved in',
+            'Plot 45-B/112 has garbage piled up',
+            'Water comes only 9.30-11.30 in the morning',
+            'Reported 2026-10-19T01:36:39Z as CIV-1729312345678-123',
+            'Since 2026-10-19 01:36:39 nobody came',
+        ):
+            self.assertFalse(prefilter.has_phone(text), text)
+
+    def test_phone_numbers(self):
+        for text in ('whatsapp 98765 43210 now', 'call +91 98765 43210', 'ring (040) 2345 6789'):
+            self.assertTrue(prefilter.has_phone(text), text)
+        self.assertEqual(prefilter.mask_phones('by 98765-43210 on 2026-10-19'), 'by <phone> on 2026-10-19')
+
+
+class PrefilterDecisionTests(SimpleTestCase):
+    def test_blatant_spam_is_decided_locally(self):
+        verdict, _ = prefilter.classify('Earn 50000 per week from home!! whatsapp 98765 43210 now', 'detect_fake')
+        self.assertTrue(verdict['is_fake'])
+
+    def test_genuine_report_clears_locally(self):
+        verdict, _ = prefilter.classify(
+            'Streetlight near the bus stand on Main Road is not working for a week', 'detect_fake')
+        self.assertEqual(verdict and verdict['is_fake'], False)
+
+    def test_unclear_text_is_escalated(self):
+        verdict, _ = prefilter.classify('Aliens landed in the stadium and are stealing the streetlights send the army',
+                                        'detect_fake')
+        self.assertIsNone(verdict)
+
+
+class MinHashTests(SimpleTestCase):
+    REPORT = 'Huge pothole on MG Road near the metro station, two bikes fell today'
+
+    def setUp(self):
+        self.index = minhash.MinHashIndex()
+        self.index.add('a', self.REPORT)
+        self.index.add('b', 'Garbage has not been collected in sector 9 for a week')
+
+    def test_exact_match_after_normalisation(self):
+        self.assertEqual(self.index.query('HUGE pothole on MG road, near the metro station; two bikes fell today!'),
+                         [('a', 1.0)])
+
+    def test_near_duplicate_found_through_lsh(self):
+        results = self.index.query(self.REPORT + ' again', threshold=0.8)
+        self.assertEqual([issue_id for issue_id, _ in results], ['a'])
+        self.assertGreaterEqual(results[0][1], 0.8)
+
+    def test_unrelated_text_and_excluded_ids_are_not_returned(self):
+        self.assertEqual(self.index.query('Streetlight flickering outside the school gate'), [])
+        self.assertEqual(self.index.query(self.REPORT, exclude='a'), [])
+        self.assertEqual(self.index.query(self.REPORT, only={'b'}), [])
+
+    def test_signature_agreement_estimates_jaccard(self):
+        a, b = minhash.shingles(self.REPORT), minhash.shingles(self.REPORT + ' near gate 2')
+        agreement = (minhash.signature(a) == minhash.signature(b)).mean()
+        self.assertAlmostEqual(agreement, minhash.jaccard(a, b), delta=0.2)
+
+    def test_remove_and_re_add_with_new_text(self):
+        self.index.remove('a')
+        self.assertNotIn('a', self.index)
+        self.assertEqual(self.index.query(self.REPORT), [])
+        self.assertTrue(self.index.add('b', self.REPORT))
+        self.assertFalse(self.index.add('b', self.REPORT))  # unchanged text is a no-op
+        self.assertEqual(self.index.query(self.REPORT), [('b', 1.0)])
+        self.assertEqual(len(self.index), 1)
+
+    def test_max_size_evicts_oldest(self):
+        index = minhash.MinHashIndex(max_size=2)
+        for issue_id in ('x', 'y', 'z'):
+            index.add(issue_id, f'report number {issue_id} about a broken water pipe')
+        self.assertEqual(len(index), 2)
+        self.assertNotIn('x', index)
+        self.assertEqual(index.query('report number x about a broken water pipe', threshold=0.99), [])
+
+
+class ResolutionModelTests(SimpleTestCase):
+    @staticmethod
+    def _issues(category, priority, days, n, workload=0):
+        return [{
+            'category': category, 'priority': priority, 'lat': 12.97, 'lng': 77.59,
+            'created_at': '2026-02-01T00:00:00Z',
+            'resolved_at': f'2026-02-{1 + days:02d}T00:00:00Z',
+            'officer_workload': workload,
+        } for _ in range(n)]
+
+    def test_uses_most_specific_group_with_enough_history(self):
+        model = resolution_model.ResolutionModel.fit(
+            self._issues('Roads', 'High', 2, 10) + self._issues('Water', 'Low', 20, 10))
+        roads = model.predict({'category': 'Roads', 'priority': 'High', 'lat': 12.97, 'lng': 77.59,
+                               'created_at': '2026-02-10T00:00:00Z'})
+        self.assertEqual(roads['level'], 'category/priority/cell/season')
+        self.assertAlmostEqual(roads['p50_days'], 2.0, places=1)
+        other_cell = model.predict({'category': 'Water', 'priority': 'Low', 'lat': -33.0, 'lng': 151.0,
+                                    'created_at': '2026-02-10T00:00:00Z'})
+        self.assertEqual(other_cell['level'], 'category/priority/season')
+        self.assertAlmostEqual(other_cell['p50_days'], 20.0, places=1)
+
+    def test_unknown_group_falls_back_to_global(self):
+        model = resolution_model.ResolutionModel.fit(self._issues('Roads', 'High', 4, 10))
+        self.assertEqual(model.predict({'category': 'Parks', 'priority': 'Low'})['level'], 'global')
+
+    def test_quantiles_and_workload_slope(self):
+        records = (self._issues('Roads', 'High', 2, 10, workload=0)
+                   + self._issues('Roads', 'High', 8, 10, workload=10))
+        model = resolution_model.ResolutionModel.fit(records)
+        self.assertGreater(model.beta, 0)
+        busy = model.predict({'category': 'Roads', 'priority': 'High', 'officer_workload': 10})
+        idle = model.predict({'category': 'Roads', 'priority': 'High', 'officer_workload': 0})
+        self.assertGreater(busy['p50_days'], idle['p50_days'])
+        self.assertGreaterEqual(idle['p90_days'], idle['p50_days'])
+
+    def test_malformed_items_get_per_item_errors(self):
+        results = resolution_model.predict_many(['junk', {'lat': 'north', 'lng': 1}, {'priority': 'High'}])
+        self.assertIn('error', results[0])
+        self.assertIn('error', results[1])
+        self.assertGreaterEqual(results[2]['estimated_days'], 1)
+        with self.assertRaises(ValueError):
+            resolution_model.features({'lat': float('nan'), 'lng': 0})
+
+    def test_fit_skips_unusable_records(self):
+        good = self._issues('Roads', 'High', 3, 9)
+        bad = [{'created_at': '2026-02-05', 'resolved_at': '2026-02-01'}, {'created_at': 'soon'}, {}]
+        self.assertEqual(resolution_model.ResolutionModel.fit(good + bad).trained_on, 9)
+        with self.assertRaises(ValueError):
+            resolution_model.ResolutionModel.fit(bad)
+
+
+class AdmissionTests(SimpleTestCase):
+    def setUp(self):
+        self.upstream = admission.Upstream('test', 1)
+        self.granted = []
+
+    def _waiting(self):
+        stats = self.upstream.stats()
+        return stats['urgent_queued'] + sum(stats['queued'].values())
+
+    def _enqueue(self, endpoint_class, urgent=False):
+        """Start a caller that blocks on the busy upstream; return once it is queued."""
+        def call():
+            self.upstream.acquire(endpoint_class, urgent)
+            self.granted.append('urgent' if urgent else endpoint_class)
+        queued = self._waiting()
+        thread = threading.Thread(target=call, daemon=True)
+        thread.start()
+        self._until(lambda: self._waiting() > queued)
+        return thread
+
+    @staticmethod
+    def _until(condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                raise AssertionError('timed out')
+            time.sleep(0.001)
+
+    def _release_all(self):
+        while self.upstream.stats()['active']:
+            served = len(self.granted)
+            self.upstream.release()
+            self._until(lambda: len(self.granted) > served or not self.upstream.stats()['active'])
+
+    def test_free_slot_is_taken_without_queueing(self):
+        self.upstream.acquire('bulk')
+        self.assertEqual(self.upstream.stats(), {'capacity': 1, 'active': 1, 'urgent_queued': 0, 'queued': {}})
+        self.upstream.release()
+        self.assertEqual(self.upstream.stats()['active'], 0)
+
+    def test_weighted_fair_order_and_urgent_first(self):
+        self.upstream.acquire('bulk')
+        for endpoint_class in ('bulk', 'bulk', 'triage', 'triage', 'interactive'):
+            self._enqueue(endpoint_class)
+        self._enqueue('bulk', urgent=True)
+        self._release_all()
+        # finish tags: triage 1/8, 2/8; interactive 1/4 (ties go to the earlier arrival); bulk 1, 2
+        self.assertEqual(self.granted, ['urgent', 'triage', 'triage', 'interactive', 'bulk', 'bulk'])
+        self.assertEqual(self.upstream.stats()['active'], 0)
+
+    def test_full_queue_and_timeout_raise_overloaded(self):
+        with mock.patch.dict(admission.CLASSES, {'bulk': admission.EndpointClass(1, 1, 0.05, 'reject')}):
+            self.upstream.acquire('triage')
+            self._enqueue('bulk')
+            with self.assertRaisesRegex(admission.Overloaded, 'queue full'):
+                self.upstream.acquire('bulk')
+            self._release_all()
+            self.assertEqual(self.granted, ['bulk'])
+
+            self.upstream.acquire('triage')
+            with self.assertRaisesRegex(admission.Overloaded, 'timed out'):
+                self.upstream.acquire('bulk')
+            self.assertEqual(self.upstream.stats()['queued'], {})
+            self.upstream.release()  # the cancelled waiter is skipped, not handed the slot
+            self.assertEqual(self.upstream.stats()['active'], 0)
+
+    def test_endpoint_falls_back_or_rejects_when_shed(self):
+        busy = admission.Upstream('test', 0)
+        shed = {'triage': admission.EndpointClass(8, 0, 0.01, 'fallback'),
+                'media': admission.EndpointClass(1, 0, 0.01, 'reject')}
+
+        def view(request):
+            try:
+                with admission.admit('test'):
+                    return Response({'source': 'llm'})
+            except admission.Overloaded:
+                return Response({'source': 'local'})
+
+        request = RequestFactory().post('/')
+        with mock.patch.dict(admission._upstreams, {'test': busy}), mock.patch.dict(admission.CLASSES, shed):
+            triage = admission.endpoint('triage')(view)(request)
+            media = admission.endpoint('media')(view)(request)
+        self.assertEqual((triage.data, triage['X-Degraded']), ({'source': 'local'}, 'overloaded'))
+        self.assertEqual((media.status_code, media['Retry-After']), (429, str(admission.RETRY_AFTER_SECONDS)))
+
+
+class TempDatabaseMixin:
+    """Point ML_JOBS_DB at a fresh SQLite file for the duration of each test."""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp(prefix='civix-test-')
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings = override_settings(ML_JOBS_DB=os.path.join(directory, 'test.sqlite3'))
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+
+class JobTests(TempDatabaseMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(jobs, 'RETRY_BASE_DELAY', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.calls = []
+        self.cleaned = []
+
+    def _register(self, name, outcomes, max_retries=2):
+        """A job type that raises or returns `outcomes` in turn, one per attempt."""
+        def handler(payload):
+            outcome = outcomes[min(len(self.calls), len(outcomes) - 1)]
+            self.calls.append(payload)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        jobs.register(name, concurrency=1, max_retries=max_retries, cleanup=self.cleaned.append)(handler)
+        self.addCleanup(jobs._types.pop, name)
+
+    @staticmethod
+    def _wait(job_id, timeout=5):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = jobs.get(job_id)
+            if job['status'] in (jobs.SUCCEEDED, jobs.FAILED):
+                return job
+            time.sleep(0.01)
+        raise AssertionError(f"job {job_id} still {job['status']}")
+
+    def test_failed_attempt_is_retried_then_succeeds(self):
+        self._register('test-flaky', [RuntimeError('model busy'), {'ok': True}])
+        with self.assertLogs('api.jobs', 'ERROR'):
+            job = self._wait(jobs.submit('test-flaky', {'n': 1}))
+        self.assertEqual((job['status'], job['result'], job['error']), (jobs.SUCCEEDED, {'ok': True}, None))
+        self.assertEqual(job['attempts'], 2)
+        self.assertEqual(self.cleaned, [{'n': 1}])
+
+    def test_gives_up_after_max_retries(self):
+        self._register('test-broken', [RuntimeError('bad audio')], max_retries=1)
+        with self.assertLogs('api.jobs', 'ERROR') as logs:
+            job = self._wait(jobs.submit('test-broken', {'n': 2}))
+        self.assertEqual((job['status'], job['error'], job['attempts']), (jobs.FAILED, 'bad audio', 2))
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(self.cleaned, [{'n': 2}])
+
+    def test_a_job_is_claimed_once(self):
+        self._register('test-once', [{'ok': True}])
+        with mock.patch.object(jobs, '_schedule'):
+            job_id = jobs.submit('test-once', {})
+        barrier = threading.Barrier(4)
+
+        def run():
+            barrier.wait()
+            jobs._run(job_id)
+        threads = [threading.Thread(target=run) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(jobs.get(job_id)['attempts'], 1)
+
+    def test_expired_lease_is_requeued_and_live_one_is_not(self):
+        self._register('test-lease', [{'ok': True}])
+        with mock.patch.object(jobs, '_schedule'):
+            stale, live = jobs.submit('test-lease', {'n': 'stale'}), jobs.submit('test-lease', {'n': 'live'})
+        with jobs._db() as conn:
+            conn.execute('UPDATE ml_jobs SET status = ?, attempts = 1, updated_at = ? WHERE id = ?',
+                         (jobs.RUNNING, time.time() - jobs.LEASE_SECONDS - 1, stale))
+            conn.execute('UPDATE ml_jobs SET status = ?, attempts = 1, updated_at = ? WHERE id = ?',
+                         (jobs.RUNNING, time.time(), live))
+        with self.assertLogs('api.jobs', 'WARNING'):
+            self.assertEqual(jobs.requeue_expired(), 1)
+        self.assertEqual(self._wait(stale)['attempts'], 2)
+        self.assertEqual(jobs.get(live)['status'], jobs.RUNNING)
+        self.assertEqual(self.calls, [{'n': 'stale'}])
+
+    def test_unknown_type_and_foreign_webhook_are_rejected(self):
+        self._register('test-hook', [{'ok': True}])
+        with self.assertRaises(ValueError):
+            jobs.submit('test-missing', {})
+        with override_settings(ML_WEBHOOK_ORIGINS=['http://backend:5000']):
+            with self.assertRaises(jobs.InvalidWebhook):
+                jobs.submit('test-hook', {}, webhook='http://169.254.169.254/latest')
+            self.assertTrue(jobs.webhook_allowed('HTTP://Backend:5000/api/ml/jobs'))
+        self.assertEqual(self.calls, [])
+
+
+class IncidentClusteringTests(SimpleTestCase):
+    @staticmethod
+    def _vectors(*angles):
+        """Unit vectors in the plane; cosine similarity is the cosine of the angle between them."""
+        radians = np.radians(angles)
+        return np.stack([np.cos(radians), np.sin(radians), np.zeros(len(angles))], axis=1).astype(np.float32)
+
+    def test_disjoint_set(self):
+        groups = incidents.DisjointSet(5)
+        self.assertTrue(groups.union(0, 1))
+        self.assertTrue(groups.union(3, 1))
+        self.assertFalse(groups.union(0, 3))
+        self.assertEqual(len({groups.find(x) for x in range(5)}), 3)
+        self.assertEqual(groups.size[groups.find(3)], 3)
+
+    def test_chains_merge_across_blocks(self):
+        # 0~1 and 1~2 are above the threshold, 0~2 is not; 3 is unrelated
+        vectors = self._vectors(0, 20, 40, 120)
+        for block_size in (1, 2, 4):
+            labels, stats = incidents.cluster(vectors, threshold=0.9, block_size=block_size)
+            self.assertEqual(labels.tolist(), [0, 0, 0, 3], block_size)
+            self.assertEqual((stats['pairs'], stats['incidents']), (2, 2))
+
+    def test_radius_keeps_far_apart_issues_separate(self):
+        vectors = self._vectors(0, 1, 2)
+        coords = [[12.97, 77.59], [12.971, 77.591], [28.61, 77.21]]
+        labels, _ = incidents.cluster(vectors, threshold=0.9, coords=coords, radius_km=5)
+        self.assertEqual(labels.tolist(), [0, 0, 2])
+        # a pair with an unknown location is judged on similarity alone
+        labels, _ = incidents.cluster(vectors, threshold=0.9, coords=coords[:2] + [[np.nan, np.nan]], radius_km=5)
+        self.assertEqual(labels.tolist(), [0, 0, 0])
+
+    def test_groups_are_named_after_their_first_member(self):
+        ids = ['a', 'b', 'c', 'd', 'e']
+        groups = incidents.groups_from(ids, np.array([0, 1, 0, 1, 0]))
+        self.assertEqual(groups, [{'incident_id': 'a', 'members': ['a', 'c', 'e'], 'size': 3},
+                                  {'incident_id': 'b', 'members': ['b', 'd'], 'size': 2}])
+
+    def test_issue_rows_reject_duplicates_and_bad_coordinates(self):
+        self.assertEqual(incidents.issue_rows([{'id': 7, 'lat': '12.5', 'lng': 77}, {'id': 'x', 'lat': None}]),
+                         [{'id': '7', 'lat': 12.5, 'lng': 77.0}, {'id': 'x', 'lat': None, 'lng': None}])
+        for issues in ([{'id': 1}, {'id': '1'}], [{'id': 1, 'lat': 'north', 'lng': 0}],
+                       [{'id': 1, 'lat': 95, 'lng': 0}], [{'id': 1, 'lat': 0, 'lng': float('nan')}], [{'lat': 0}]):
+            with self.assertRaises(ValueError, msg=issues):
+                incidents.issue_rows(issues)
+
+    def test_duplicate_ids_are_a_400_before_anything_is_queued(self):
+        request = APIRequestFactory().post('/api/incidents/cluster/', {'issues': [
+            {'id': 'a', 'embedding': [1, 0]}, {'id': 'b', 'embedding': [0, 1]}, {'id': 'a', 'embedding': [1, 1]},
+        ]}, format='json')
+        with mock.patch.object(incidents, 'spool_vectors') as spool, mock.patch.object(jobs, 'submit') as submit:
+            response = views.cluster_incidents(request)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('duplicate id a', response.data['error'])
+        spool.assert_not_called()
+        submit.assert_not_called()
+
+
+class RankedQueueTests(SimpleTestCase):
+    def test_top_is_best_first_and_follows_updates(self):
+        ranked = ranking.RankedQueue()
+        for issue_id, key in (('a', 3), ('b', 9), ('c', 5), ('d', 1)):
+            ranked.put(issue_id, key)
+        self.assertEqual(ranked.top(3), [('b', 9), ('c', 5), ('a', 3)])
+        ranked.put('d', 10)
+        ranked.discard('b')
+        ranked.put('a', 5)  # leaves a stale ('a', 3) entry behind
+        self.assertEqual(ranked.top(10), [('d', 10), ('a', 5), ('c', 5)])
+        self.assertEqual(len(ranked), 3)
+
+    def test_stale_entries_are_never_returned_twice(self):
+        ranked = ranking.RankedQueue()
+        ranked.put('a', 1)
+        ranked.put('a', 5)
+        ranked.put('a', 1)  # same key as the first, now stale, entry
+        self.assertEqual(ranked.top(5), [('a', 1)])
+
+    def test_matches_a_full_sort_under_churn(self):
+        rng = random.Random(7)
+        ranked, live = ranking.RankedQueue(), {}
+        for _ in range(2000):
+            issue_id = f'i{rng.randrange(100)}'
+            if rng.random() < 0.3:
+                ranked.discard(issue_id)
+                live.pop(issue_id, None)
+            else:
+                key = rng.uniform(-50, 50)
+                ranked.put(issue_id, key)
+                live[issue_id] = key
+        expected = sorted(live.items(), key=lambda item: item[1], reverse=True)[:25]
+        self.assertEqual(ranked.top(25), expected)
+        self.assertLessEqual(len(ranked._heap), 2 * len(live) + 65)  # compaction bounds the stale entries
+
+
+class RankingQueueTests(TempDatabaseMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        for name, value in (('_queues', {}), ('_placed', {}), ('_version', None)):
+            patcher = mock.patch.object(ranking, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _issue(issue_id, **fields):
+        return {'id': issue_id, 'officer': 'o1', 'category': 'Roads', 'status': 'Pending', 'cluster_size': 1,
+                'predicted_days': 3, 'created_at': '2026-10-01T00:00:00Z', **fields}
+
+    @staticmethod
+    def _ids(**where):
+        return [issue['id'] for issue in ranking.queue(**where)['issues']]
+
+    def test_open_and_closed_transitions(self):
+        ranking.update([self._issue('a', priority='High'), self._issue('b', priority='Low'),
+                        self._issue('c', priority='Medium')])
+        self.assertEqual(self._ids(officer='o1'), ['a', 'c', 'b'])
+
+        ranking.update([{'id': 'a', 'status': 'Resolved'}, {'id': 'c', 'status': 'Spam'}])
+        self.assertEqual(ranking.queue(officer='o1')['total'], 1)
+        self.assertEqual(self._ids(category='Roads'), ['b'])
+
+        ranking.update([{'id': 'a', 'status': 'In Progress'}, {'id': 'b', 'officer': 'o2'}])
+        self.assertEqual(self._ids(officer='o1'), ['a'])
+        self.assertEqual(self._ids(officer='o2'), ['b'])
+        self.assertEqual(self._ids(category='Roads'), ['a', 'b'])
+
+    def test_another_worker_catches_up_from_the_table(self):
+        ranking.update([self._issue('a', priority='Low'), self._issue('b', priority='High')])
+        ranking.update([{'id': 'b', 'open': False}])
+        with mock.patch.object(ranking, '_queues', {}), mock.patch.object(ranking, '_placed', {}), \
+                mock.patch.object(ranking, '_version', None):
+            self.assertEqual(self._ids(officer='o1'), ['a'])
+            ranking.update([{'id': 'b', 'status': 'Pending', 'upvotes': 40}])
+            self.assertEqual(self._ids(officer='o1'), ['b', 'a'])
+
+    def test_bad_items_are_reported_and_the_rest_applied(self):
+        updated, errors = ranking.update([self._issue('a'), {'status': 'Pending'}, 'junk',
+                                          self._issue('b', upvotes='many')])
+        self.assertEqual(updated, 1)
+        self.assertEqual(len(errors), 3)
+        self.assertEqual(self._ids(officer='o1'), ['a'])
@@ -0,0 +1,177 @@
+"""
+Streaming upload handler for audio and other large multipart files.
+
+Django's default handlers keep small uploads in memory and spill large ones
+to a NamedTemporaryFile. The transcription endpoint then copied that file
+again into `temp_<name>` in the working directory, so the name could collide
+and the copy was left behind if the process died.
+
+CappedTempFileUploadHandler writes every multipart chunk straight into a
+private `mkstemp` file in the spool directory in a single pass. The file gets
+a unique name and 0600 permissions. The handler refuses bodies larger than
+ML_MAX_UPLOAD_BYTES without reading them; a view expecting bigger files
+raises its own cap with `allow()`. Views get a file whose path can go
+straight to the Gemini client. The file is deleted when Django closes the
+request's files after the response, unless `detach()` handed it to a
+background job. If the upload object is dropped without being closed, the
+file is deleted when the object is garbage-collected.
+"""
+import os
+import tempfile
+import weakref
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers, StopUpload
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
+
+from api import metrics
+
+
+def _unlink(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _suffix(name):
+    """Keep a short, harmless extension so the Gemini client can still guess the mime type."""
+    ext = os.path.splitext(os.path.basename(name or ''))[1][:10]
+    return ext if ext[1:].isalnum() else ''
+
+
+class SpooledUpload(UploadedFile):
+    """An upload already on disk under a private name; deleted on close() unless detached."""
+
+    def __init__(self, file, path, cleanup, name, content_type, size, charset, content_type_extra=None):
+        super().__init__(file, name, content_type, size, charset, content_type_extra)
+        self._path = path
+        self._cleanup = cleanup
+
+    def temporary_file_path(self):
+        return self._path
+
+    def detach(self):
+        """Take ownership of the file: it survives the request and the caller must remove it."""
+        self._cleanup.detach()
+        self.file.close()
+        return self._path
+
+    def close(self):
+        self.file.close()
+        self._cleanup()
+
+
+class CappedTempFileUploadHandler(FileUploadHandler):
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_bytes = getattr(request, 'max_upload_bytes', None) or settings.ML_MAX_UPLOAD_BYTES
+        self.received = 0
+        self.path = None
+        self._cleanup = None
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length > self.max_bytes:
+            # Answer from the header alone; the body is never read.
+            self._reject(content_length)
+            return QueryDict(encoding=encoding), MultiValueDict()
+        return None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        directory = settings.ML_UPLOAD_DIR
+        os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(prefix='upload-', suffix=_suffix(self.file_name), dir=directory)
+        self.file = os.fdopen(fd, 'w+b')
+        self._cleanup = weakref.finalize(self.file, _unlink, self.path)
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_bytes:
+            # Chunked bodies carry no Content-Length, so the cap is also enforced here.
+            self.upload_interrupted()
+            self._reject(self.received)
+            raise StopUpload(connection_reset=True)
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        self.file.flush()
+        self.file.seek(0)
+        metrics.incr('uploads.files')
+        metrics.observe('uploads.bytes', file_size)
+        upload = SpooledUpload(
+            self.file, self.path, self._cleanup, self.file_name, self.content_type,
+            file_size, self.charset, self.content_type_extra,
+        )
+        self._cleanup = None
+        return upload
+
+    def upload_interrupted(self):
+        if self._cleanup is not None:
+            self.file.close()
+            self._cleanup()
+            self._cleanup = None
+
+    def _reject(self, size):
+        metrics.incr('uploads.rejected')
+        self.request.upload_rejected = (
+            f"Upload of {size} bytes exceeds the {self.max_bytes} byte limit"
+        )
+
+
+def allow(request, max_bytes):
+    """Raise the size cap for one view. Call before anything reads request.data / FILES."""
+    getattr(request, '_request', request).max_upload_bytes = max_bytes
+
+
+def rejection(request):
+    """Why the request's upload was refused, or None. Parses the body if nothing has yet."""
+    request.FILES
+    return getattr(request, 'upload_rejected', None)
+
+
+def _copy(upload):
+    os.makedirs(settings.ML_UPLOAD_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix='upload-', suffix=_suffix(upload.name), dir=settings.ML_UPLOAD_DIR)
+    try:
+        with os.fdopen(fd, 'wb') as destination:
+            for chunk in upload.chunks():
+                destination.write(chunk)
+    except BaseException:
+        _unlink(path)
+        raise
+    return path
+
+
+@contextmanager
+def local_path(upload):
+    """
+    Yield a filesystem path for `upload`. Uploads from the streaming handler
+    are already on disk. Anything else, such as an upload that came through a
+    different handler in tests, is copied once into a private temp file that
+    is removed afterwards.
+    """
+    if hasattr(upload, 'temporary_file_path'):
+        upload.file.flush()
+        yield upload.temporary_file_path()
+        return
+    path = _copy(upload)
+    try:
+        yield path
+    finally:
+        _unlink(path)
+
+
+def detach(upload):
+    """
+    Hand the file to a caller that outlives the request, such as a background
+    job, and return its path. The caller must remove it when finished.
+    """
+    if isinstance(upload, SpooledUpload):
+        return upload.detach()
+    return _copy(upload)
@@ -0,0 +1,211 @@
+"""
+The seam between the service and the network, for capture / replay
+(api/capture.py).
+
+`genai(loader)` wraps the lazy google.generativeai loader:
+- normally it returns the SDK module itself;
+- with capture on, it returns a thin proxy that notes every
+  generate_content, embed_content and upload_file call with its latency and
+  a compact result. Results are the reply text, the stream chunks, or only
+  the embedding dimension;
+- with replay on, it answers the same calls from the recording without
+  importing the SDK or needing an API key.
+
+`fetch(url)` does the same for image downloads. Only the status, size and
+content type are kept, and a replayed download is a stand-in JPEG padded to
+the recorded size.
+"""
+import hashlib
+import time
+from functools import lru_cache
+from io import BytesIO
+
+import numpy as np
+import requests
+
+from api import capture
+from civix_ml.startup import lazy_module
+
+get_pil_image = lazy_module('PIL.Image')
+
+
+def api_key(key):
+    """Replay answers every Gemini call itself, so the key checks must pass without a real key."""
+    return key or ('replay' if capture.replaying() else None)
+
+
+def _timed(service, call, summarize=None):
+    start = time.perf_counter()
+    try:
+        result = call()
+    except Exception as e:
+        capture.record_call(service, (time.perf_counter() - start) * 1000, error=str(e))
+        raise
+    capture.record_call(service, (time.perf_counter() - start) * 1000, result=summarize(result) if summarize else None)
+    return result
+
+
+def _replayed(service):
+    call = capture.recorded_call(service)
+    capture.pause(call['ms'])
+    if 'error' in call:
+        raise RuntimeError(call['error'])
+    return call.get('result')
+
+
+def _text(response):
+    try:
+        return response.text
+    except ValueError:  # blocked / empty candidates
+        return None
+
+
+def _embedding_dim(result):
+    embedding = result['embedding']
+    return {'dim': len(embedding[0]) if embedding and isinstance(embedding[0], list) else len(embedding)}
+
+
+# --- 1. Capture ---
+
+class _RecordingModel:
+    def __init__(self, model):
+        self._model = model
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        if stream:
+            return self._stream(contents, kwargs)
+        return _timed('gemini', lambda: self._model.generate_content(contents, **kwargs), _text)
+
+    def _stream(self, contents, kwargs):
+        start = time.perf_counter()
+        chunks = []
+        try:
+            for chunk in self._model.generate_content(contents, stream=True, **kwargs):
+                chunks.append(_text(chunk))
+                yield chunk
+        except Exception as e:
+            capture.record_call('gemini.stream', (time.perf_counter() - start) * 1000, error=str(e))
+            raise
+        capture.record_call('gemini.stream', (time.perf_counter() - start) * 1000, result=chunks)
+
+
+class _RecordingGenai:
+    def __init__(self, module):
+        self._module = module
+
+    def __getattr__(self, name):
+        return getattr(self._module, name)
+
+    def GenerativeModel(self, *args, **kwargs):
+        return _RecordingModel(self._module.GenerativeModel(*args, **kwargs))
+
+    def embed_content(self, **kwargs):
+        return _timed('embeddings', lambda: self._module.embed_content(**kwargs), _embedding_dim)
+
+    def upload_file(self, *args, **kwargs):
+        return _timed('gemini.upload', lambda: self._module.upload_file(*args, **kwargs))
+
+
+# --- 2. Replay ---
+
+class _Reply:
+    def __init__(self, text):
+        self.text = text
+
+
+def _vector(text, dim):
+    """Deterministic unit vector for `text`, so replayed similarity checks are repeatable."""
+    seed = int(hashlib.sha1(text.encode('utf-8')).hexdigest()[:16], 16)
+    vector = np.random.default_rng(seed).standard_normal(dim)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class _ReplayModel:
+    def generate_content(self, contents, stream=False, **kwargs):
+        if stream:
+            return self._stream()
+        return _Reply(_replayed('gemini'))
+
+    @staticmethod
+    def _stream():
+        call = capture.recorded_call('gemini.stream')
+        if 'error' in call:
+            capture.pause(call['ms'])
+            raise RuntimeError(call['error'])
+        chunks = call.get('result') or []
+        for text in chunks:
+            capture.pause(call['ms'] / len(chunks))
+            yield _Reply(text)
+
+
+class _ReplayGenai:
+    def configure(self, **kwargs):
+        pass
+
+    def GenerativeModel(self, *args, **kwargs):
+        return _ReplayModel()
+
+    def embed_content(self, model=None, content=None, **kwargs):
+        dim = _replayed('embeddings')['dim']
+        if isinstance(content, str):
+            return {'embedding': _vector(content, dim)}
+        return {'embedding': [_vector(text, dim) for text in content]}
+
+    def upload_file(self, *args, **kwargs):
+        _replayed('gemini.upload')
+        return None
+
+
+_replay_genai = _ReplayGenai()
+
+
+def genai(loader):
+    """Wrap a lazy google.generativeai loader for capture / replay (see module docstring)."""
+    def get():
+        if capture.replaying():
+            return _replay_genai
+        if capture.capturing():
+            return _RecordingGenai(loader())
+        return loader()
+    return get
+
+
+# --- 3. Downloads ---
+
+class _Download:
+    def __init__(self, status_code, content, content_type):
+        self.status_code = status_code
+        self.content = content
+        self.headers = {'Content-Type': content_type or 'image/jpeg'}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} (replayed)")
+
+
+@lru_cache(maxsize=1)
+def _stand_in_jpeg():
+    noise = np.random.default_rng(0).integers(0, 256, (480, 640, 3), dtype=np.uint8)
+    buffer = BytesIO()
+    get_pil_image().fromarray(noise).save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def fetch(url, **kwargs):
+    """requests.get for image downloads, recorded and replayed like the Gemini calls."""
+    if capture.replaying():
+        recorded = _replayed('fetch')
+        image = _stand_in_jpeg()
+        # Decoders stop at the JPEG end marker, so padding only restores the download size.
+        content = image + bytes(max(0, recorded['bytes'] - len(image)))
+        return _Download(recorded['status'], content, recorded.get('content_type'))
+    if not capture.capturing():
+        return requests.get(url, **kwargs)
+    return _timed('fetch', lambda: requests.get(url, **kwargs), lambda response: {
+        'status': response.status_code,
+        'bytes': len(response.content),
+        'content_type': response.headers.get('Content-Type'),
+    })
@@ -4,6 +4,7 @@ from . import advanced_ai
 
 urlpatterns = [
     path('health/', views.health_check),
+    path('metrics/', views.metrics_view),
     path('predict-priority/', views.predict_priority),
     path('detect-fake/', views.detect_fake),
     path('categorize/', views.categorize),
@@ -11,12 +12,33 @@ urlpatterns = [
     path('generate-caption/', views.generate_caption_view),
     path('validate-issue-image/', views.validate_issue_image),  # NEW: Spam detection
     path('find-duplicates/', advanced_ai.check_semantic_duplicate),
+    path('index-issues/', advanced_ai.index_issues),
     path('get-embedding/', views.get_embedding),
+    path('get-embeddings/batch/', views.get_embeddings_batch),
+    path('search-embeddings/', views.search_embeddings),
+
+    # Background Jobs
+    path('jobs/submit/<str:job_type>/', views.submit_job),
+    path('jobs/<str:job_id>/', views.job_status),
+    path('jobs/<str:job_id>/result/', views.job_result),
+    path('feedback/', views.feedback_view),
+    path('category-centroids/', views.category_centroids_view),
+    path('hotspots/', views.hotspots_view),
+    path('hotspots/ingest/', views.hotspots_ingest),
+    path('incidents/cluster/', views.cluster_incidents),
+    path('incidents/<str:issue_id>/', views.incident_of_issue),
+    path('ranking/', views.ranking_update),
+    path('ranking/queue/', views.ranking_queue),
+    path('drafts/analyze/', views.draft_analyze),
+    path('drafts/resolve/', views.draft_resolve),
     
     # Advanced AI Endpoints
     path('analyze-toxicity/', advanced_ai.analyze_toxicity),
     path('transcribe-audio/', advanced_ai.transcribe_audio),
     path('check-semantic-duplicate/', advanced_ai.check_semantic_duplicate),
     path('generate-reply/', advanced_ai.generate_reply),
+    path('generate-reply/stream/', advanced_ai.generate_reply_stream),
+    path('reply-templates/', advanced_ai.reply_templates_view),
     path('predict-resolution-time/', advanced_ai.predict_resolution_time),
+    path('predict-resolution-time/batch/', advanced_ai.predict_resolution_time_batch),
 ]
@@ -1,10 +1,17 @@
 # --- IMPORTS ---
+import contextvars
 import logging
 import json
 import os
-import google.generativeai as genai
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+from django.http import HttpResponse, StreamingHttpResponse
+from django.conf import settings
 from api.advanced_ai import (
     ask_gemini, 
+    get_genai,
+    transcribe_file,
     check_semantic_duplicate, 
     analyze_toxicity, 
     generate_reply, 
@@ -14,6 +21,8 @@ from api.advanced_ai import (
 from civix_ml.image_model import analyze_image_url, generate_caption
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
+from civix_ml import startup
+from api import admission, categories, centroids, drafts, embeddings, feedback, hotspots, incidents, jobs, metrics, model_registry, prefilter, prompts, quantize, ranking, renderers, result_cache, uploads
 
 # Configure Logging
 logger = logging.getLogger(__name__)
@@ -22,118 +31,356 @@ logger = logging.getLogger(__name__)
 
 @api_view(['GET'])
 def health_check(request):
-    return Response({"status": "healthy", "service": "Civix ML"})
+    return Response({"status": "healthy", "service": "Civix ML", "imports": startup.report()})
+
+@api_view(['GET'])
+def metrics_view(request):
+    return Response({
+        **metrics.snapshot(),
+        'prefilter': prefilter.stats(),
+        'prompts': prompts.stats(),
+        'admission': admission.stats(),
+        'centroids': centroids.stats(),
+        'drafts': drafts.stats(),
+        'hotspots': hotspots.stats(),
+        'local_models': model_registry.describe(),
+        'ranking': ranking.stats(),
+        'result_cache': result_cache.stats(),
+    })
+
+def _local_model(task, txt):
+    """model_registry.classify, with a broken checkpoint treated as not confident."""
+    try:
+        return model_registry.classify(task, txt)
+    except Exception as e:
+        logger.error(f"Local {task} model error: {e}")
+        return None
+
+def _priority(txt):
+    """(verdict, cache hit kind or None) for `txt`; the verdict is None when Gemini gave no answer."""
+    if not txt: return {'priority': 'Low', 'confidence': 1.0}, None
+
+    # Rule -1: Too Short = Low Priority
+    if len(txt.split()) < 3:
+         return {'priority': 'Low', 'confidence': 0.8, 'reason': 'Description too vague'}, None
+
+    # A paraphrase of a report already classified gets the same verdict without a Gemini call
+    cached, kind = result_cache.lookup('predict_priority', txt)
+    if cached:
+        return cached, kind
+
+    # The local model (latest moderator-corrected checkpoint) when it is confident
+    local = _local_model('priority', txt)
+    if local:
+        label, confidence, version = local
+        return {'priority': str(label), 'confidence': round(confidence, 4),
+                'method': 'LOCAL_MODEL', 'model_version': version}, None
+
+    # Ask Gemini
+    response_text = ask_gemini(prompts.PREDICT_PRIORITY.build(issue=txt))
+    if response_text:
+         clean_text = response_text.replace('```json', '').replace('```', '')
+         data = json.loads(clean_text)
+         result_cache.store('predict_priority', txt, data)
+         return data, None
+    return None, None
 
 @api_view(['POST'])
+@admission.endpoint('triage')
 def predict_priority(request):
     try:
         txt = (request.data.get('title', '') + " " + request.data.get('description', '')).strip()
-        if not txt: return Response({'priority': 'Low', 'confidence': 1.0})
-        
-        # Rule -1: Too Short = Low Priority
-        if len(txt.split()) < 3:
-             return Response({'priority': 'Low', 'confidence': 0.8, 'reason': 'Description too vague'})
-
-        # Ask Gemini
-        prompt = f"""
-        Classify the priority of this civic issue.
-        Issue: "{txt}"
-        
-        Priority Options:
-        - High (Emergency, danger, life-threatening, fire, deep potholes, fraud, security)
-        - Medium (Service disruption, billing, broken infrastructure, water leaks, traffic)
-        - Low (General inquiry, feedback, routine maintenance, suggestions)
-        
-        Return ONLY a JSON: {{"priority": "High" or "Medium" or "Low", "confidence": 0.0 to 1.0}}
-        """
-        
-        response_text = ask_gemini(prompt)
-        if response_text:
-             clean_text = response_text.replace('```json', '').replace('```', '')
-             data = json.loads(clean_text)
-             return Response(data)
-            
-        return Response({'priority': 'Medium', 'confidence': 0.0})
+        data, kind = _priority(txt)
+        if data is None:
+            return Response({'priority': 'Medium', 'confidence': 0.0})
+        return Response(data, headers={'X-Cache': kind} if kind else None)
 
     except Exception as e:
         logger.error(f"Priority Error: {e}")
         return Response({'priority': 'Medium', 'confidence': 0.0, 'debug_error': str(e)})
 
+def _fake(full_text):
+    """(verdict, cache hit kind or None) for `full_text`; the verdict is None when Gemini gave no answer."""
+    # Blatant spam / clearly genuine reports never reach Gemini
+    verdict, _ = prefilter.classify(full_text, 'detect_fake')
+    if verdict:
+        return verdict, None
+
+    cached, kind = result_cache.lookup('detect_fake', full_text)
+    if cached:
+        return cached, kind
+
+    local = _local_model('fake', full_text)
+    if local:
+        label, confidence, version = local
+        is_fake = bool(int(label))
+        return {'is_fake': is_fake, 'fake_confidence': round(confidence if is_fake else 1 - confidence, 4),
+                'reason': f"Local model v{version}", 'method': 'LOCAL_MODEL', 'model_version': version}, None
+
+    response_text = ask_gemini(prompts.DETECT_FAKE.build(report=full_text))
+    if response_text:
+         clean_text = response_text.replace('```json', '').replace('```', '')
+         data = json.loads(clean_text)
+         result_cache.store('detect_fake', full_text, data)
+         return data, None
+    return None, None
+
 @api_view(['POST'])
+@admission.endpoint('triage')
 def detect_fake(request):
     try:
         title = request.data.get('title', '')
         desc = request.data.get('description', '')
-        full_text = f"{title} {desc}"
-
-        prompt = f"""
-        Analyze if this civic issue report is FAKE, SPAM, GIBBERISH, or a PRANK.
-        Report: "{full_text}"
-        
-        Return ONLY a JSON: {{"is_fake": boolean, "fake_confidence": 0.0 to 1.0, "reason": "string"}}
-        """
-        
-        response_text = ask_gemini(prompt)
-        if response_text:
-             clean_text = response_text.replace('```json', '').replace('```', '')
-             data = json.loads(clean_text)
-             return Response(data)
-
-        return Response({'is_fake': False, 'confidence': 0.0})
+        data, kind = _fake(f"{title} {desc}")
+        if data is None:
+            return Response({'is_fake': False, 'confidence': 0.0})
+        return Response(data, headers={'X-Cache': kind} if kind else None)
 
     except Exception as e:
         logger.error(f"Fake Detect Error: {e}")
         return Response({'is_fake': False, 'confidence': 0, 'debug_error': str(e)})
 
+def _categorize(txt, vector=None):
+    """
+    Nearest category centroid when the embedding is decisive (a dot product),
+    then a cached LLM verdict for the same or a paraphrased text (`source:
+    cache`), then the local model when it is confident, otherwise the LLM.
+    Categories are always from categories.CATEGORIES. `vector` is the issue's
+    embedding if the caller has it.
+    """
+    try:
+        if vector is None and centroids.ready():
+            vector = embeddings.embed_text(txt)
+        verdict = centroids.classify(vector) if vector is not None else None
+    except Exception as e:  # embedding backend down or shed (admission.Overloaded): the chain below still works
+        logger.warning(f"Centroid categorization skipped: {e}")
+        verdict = None
+    if verdict and verdict['decisive']:
+        return {'category': verdict['category'], 'confidence': verdict['confidence'],
+                'margin': verdict['margin'], 'source': 'centroid'}
+
+    cached, _ = result_cache.lookup('categorize', txt)
+    if cached:
+        return {**cached, 'source': 'cache'}
+
+    local = _local_model('category', txt)
+    category = categories.normalize(local[0]) if local else None  # its 'Spam' class isn't a category
+    if category:
+        return {'category': category, 'confidence': round(local[1], 4),
+                'source': 'local_model', 'model_version': local[2]}
+
+    response_text = ask_gemini(prompts.CATEGORIZE.build(issue=txt))
+    if response_text:
+         clean_text = response_text.replace('```json', '').replace('```', '')
+         data = json.loads(clean_text)
+         data['category'] = categories.normalize(data.get('category')) or categories.FALLBACK
+         result_cache.store('categorize', txt, data)
+         return {**data, 'source': 'llm'}
+         
+    return {'category': categories.FALLBACK}
+
 @api_view(['POST'])
+@admission.endpoint('triage')
 def categorize(request):
+    """Body: {"title", "description", "embedding"?}. Pass the embedding if you have it."""
     try:
         txt = request.data.get('title', '') + " " + request.data.get('description', '')
-        
-        prompt = f"""
-        Categorize this civic issue.
-        Issue: "{txt}"
-        
-        Categories: Roads, Electricity, Water, Sanitation, Traffic, Public Transport, Billing, Technical Support, Profile, Other
-        
-        Return ONLY a JSON: {{"category": "string", "confidence": 0.0 to 1.0}}
-        """
-        
-        response_text = ask_gemini(prompt)
-        if response_text:
-             clean_text = response_text.replace('```json', '').replace('```', '')
-             data = json.loads(clean_text)
-             return Response(data)
-             
-        return Response({'category': 'General'})
+        return Response(_categorize(txt, request.data.get('embedding') or None))
 
     except Exception as e:
         logger.error(f"Categorize Error: {e}")
-        return Response({'category': 'General'})
+        return Response({'category': categories.FALLBACK})
 
 @api_view(['POST'])
 def find_duplicates(request):
     # Delegate to the function in advanced_ai
     return check_semantic_duplicate(request)
 
+EMBEDDING_FORMATS = ('json', 'base64', 'binary')
+
+def _compact_options(options):
+    """(dtype, dim, format) from a request's quantize / dim / format. Raises ValueError when one is invalid."""
+    dtype = options.get('quantize') or 'float32'
+    if dtype not in quantize.DTYPES:
+        raise ValueError(f"quantize must be one of {', '.join(quantize.DTYPES)}")
+    dim = options.get('dim') or None
+    if dim is not None:
+        if isinstance(dim, bool) or not (isinstance(dim, int) or str(dim).strip().isdigit()) or int(dim) < 1:
+            raise ValueError("dim must be a positive integer")
+        dim = int(dim)
+    fmt = options.get('format') or 'json'
+    if fmt not in EMBEDDING_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(EMBEDDING_FORMATS)}")
+    return dtype, dim, fmt
+
+def _compact_embedding_response(vector, dtype, dim, fmt):
+    """
+    Quantised / reduced embedding: quantize (int8|float16|float32), dim
+    (optional reduction) and format: json (codes as a list), base64, or
+    binary (application/octet-stream with dtype / dim / scale headers).
+    """
+    codes, scales = quantize.quantize([vector], dtype=dtype, dim=dim)
+    scale = float(scales[0]) if scales is not None else None
+
+    if fmt == 'binary':
+        response = HttpResponse(codes.tobytes(), content_type='application/octet-stream')
+        response['X-Embedding-Dtype'] = dtype
+        response['X-Embedding-Dim'] = str(codes.shape[1])
+        if scale is not None:
+            response['X-Embedding-Scale'] = repr(scale)
+        return response
+    body = {'dtype': dtype, 'dim': codes.shape[1], 'scale': scale}
+    if fmt == 'base64':
+        body['embedding_b64'] = quantize.to_base64(codes)
+    else:
+        body['embedding'] = codes[0].tolist()
+    return Response(body)
+
 @api_view(['POST'])
+@admission.endpoint('triage')
 def get_embedding(request):
+    compact = request.data.get('quantize') or request.data.get('dim') or request.data.get('format')
+    if compact:
+        try:
+            compact = _compact_options(request.data)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
     try:
         text = request.data.get('text', '')
-        if not text or not GEMINI_API_KEY: return Response({'embedding': []})
+        if not text or not embeddings.backend_name(): return Response({'embedding': []})
         
-        # Use Gemini Embeddings
-        result = genai.embed_content(
-            model="models/embedding-001",
-            content=text,
-            task_type="retrieval_document",
-            title="Civic Issue"
-        )
-        return Response({'embedding': result['embedding']})
+        vector = embeddings.embed_text(text)
+        if compact:
+            return _compact_embedding_response(vector, *compact)
+        if request.data.get('categorize'):
+            # Same request, same vector: categorization costs a dot product unless it is ambiguous.
+            try:
+                return Response({'embedding': vector, **_categorize(text, vector)})
+            except Exception as e:
+                logger.error(f"Categorize Error: {e}")
+        return Response({'embedding': vector})
     except Exception as e:
         return Response({'embedding': []})
 
 @api_view(['POST'])
+def search_embeddings(request):
+    """
+    Nearest neighbours computed directly on quantised vectors.
+    Body: {
+        "query": "text" | "query_embedding": [floats] | "query_b64": "...",
+        "candidates": [{"id", "embedding_b64"}],   # same dtype / dim as below
+        "dtype": "int8", "dim": 768, "top_k": 10
+    }
+    """
+    try:
+        dtype = request.data.get('dtype', 'int8')
+        dim = int(request.data['dim'])
+        candidates = request.data.get('candidates', [])
+        if not candidates:
+            return Response({'matches': []})
+
+        codes = np.concatenate([quantize.from_base64(c['embedding_b64'], dtype, dim) for c in candidates])
+        if request.data.get('query_b64'):
+            query_codes = quantize.from_base64(request.data['query_b64'], dtype, dim)[0]
+        else:
+            vector = request.data.get('query_embedding') or embeddings.embed_text(request.data['query'])
+            query_codes, _ = quantize.quantize([vector], dtype=dtype, dim=dim)
+            query_codes = query_codes[0]
+
+        idx, scores = quantize.top_k(query_codes, codes, int(request.data.get('top_k', 10)))
+        return Response({'matches': [
+            {'id': candidates[i].get('id'), 'score': round(float(score), 4)} for i, score in zip(idx, scores)
+        ]})
+    except (KeyError, ValueError) as e:
+        return Response({'error': f'Invalid request: {e}'}, status=400)
+    except Exception as e:
+        logger.error(f"Embedding search error: {e}")
+        return Response({'error': str(e)}, status=500)
+
+MAX_BATCH_ITEMS = 20000
+EMBEDDING_PARALLELISM = int(os.getenv('EMBEDDING_PARALLELISM', '4'))
+
+@api_view(['POST'])
+def get_embeddings_batch(request):
+    """
+    Bulk embeddings for backfills. Body: {"items": [{"id", "text"}, ...]}.
+
+    Identical texts are embedded once and sent upstream in provider-sized
+    batches with bounded parallelism. The response is NDJSON streamed as
+    batches complete: {"id", "embedding"} (or {"id", "error"}) per item,
+    a {"progress": {...}} line after every batch and a final {"done": true}.
+    """
+    items = request.data.get('items', [])
+    if not isinstance(items, list) or not items:
+        return Response({"error": "items must be a non-empty list"}, status=400)
+    if len(items) > MAX_BATCH_ITEMS:
+        return Response({"error": f"At most {MAX_BATCH_ITEMS} items per request"}, status=413)
+    bad = next((i for i, item in enumerate(items) if not isinstance(item, dict)), None)
+    if bad is not None:
+        return Response({"error": f"items[{bad}] must be an object with id and text"}, status=400)
+    if not embeddings.backend_name():
+        return Response({"error": "No embedding backend configured"}, status=503)
+
+    # text -> ids sharing it
+    ids_by_text = {}
+    for item in items:
+        text = embeddings.normalize(item.get('text'))
+        if text:
+            ids_by_text.setdefault(text, []).append(item.get('id'))
+    unique_texts = list(ids_by_text)
+    size = embeddings.batch_size()
+    batches = [unique_texts[i:i + size] for i in range(0, len(unique_texts), size)]
+
+    def embed_batch(batch):
+        try:
+            return batch, embeddings.embed_texts(batch, endpoint_class='bulk'), None
+        except Exception as first_error:
+            logger.warning(f"Embedding batch failed, retrying once: {first_error}")
+            try:
+                return batch, embeddings.embed_texts(batch, endpoint_class='bulk'), None
+            except Exception as e:
+                return batch, None, str(e)
+
+    def lines():
+        start = time.perf_counter()
+        done_items = failed_items = 0
+        skipped = len(items) - sum(len(ids) for ids in ids_by_text.values())
+        with ThreadPoolExecutor(max_workers=EMBEDDING_PARALLELISM) as pool:
+            # Worker threads don't inherit the request context (capture / replay keep the upstream calls there)
+            futures = [pool.submit(contextvars.copy_context().run, embed_batch, batch) for batch in batches]
+            for batches_done, future in enumerate(as_completed(futures), start=1):
+                batch, vectors, error = future.result()
+                for i, text in enumerate(batch):
+                    for item_id in ids_by_text[text]:
+                        if error:
+                            failed_items += 1
+                            yield renderers.ndjson_line({"id": item_id, "error": error})
+                        else:
+                            done_items += 1
+                            yield renderers.ndjson_line({"id": item_id, "embedding": vectors[i]})
+                yield renderers.ndjson_line({"progress": {
+                    "batches_done": batches_done,
+                    "batches_total": len(batches),
+                    "items_done": done_items,
+                    "items_failed": failed_items,
+                    "items_total": len(items),
+                    "elapsed_s": round(time.perf_counter() - start, 2),
+                }})
+        metrics.incr('embeddings.batch.items', len(items))
+        metrics.incr('embeddings.batch.upstream_texts', len(unique_texts))
+        yield renderers.ndjson_line({"done": True, "summary": {
+            "items": len(items),
+            "unique_texts": len(unique_texts),
+            "skipped_empty": skipped,
+            "failed": failed_items,
+            "backend": embeddings.backend_name(),
+            "elapsed_s": round(time.perf_counter() - start, 2),
+        }})
+
+    return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+
+@api_view(['POST'])
+@admission.endpoint('media')
 def analyze_image(request):
     try:
         image_url = request.data.get('imageUrl')
@@ -143,6 +390,7 @@ def analyze_image(request):
         return Response({'tags': []})
 
 @api_view(['POST'])
+@admission.endpoint('media')
 def generate_caption_view(request):
     try:
         image_url = request.data.get('imageUrl')
@@ -154,7 +402,43 @@ def generate_caption_view(request):
         return Response({'description': ''})
 
 # --- IMAGE VALIDATION FOR SPAM DETECTION ---
+def validate_image(image_url, category='General'):
+    """
+    Classify an image as VALID civic evidence or SPAM with Gemini Vision.
+    Raises on upstream / parsing errors so callers can retry or degrade.
+    """
+    from civix_ml.image_model import fetch_image
+    img = fetch_image(image_url)
+    
+    if not img:
+        return {'is_valid': False, 'reason': 'Failed to load image'}
+    
+    # Use Gemini Vision (same model already in use)
+    model = get_genai().GenerativeModel('gemini-2.5-flash')
+    
+    with admission.admit('gemini'):
+        response = prompts.generate(model, prompts.VALIDATE_ISSUE_IMAGE.build(category=category), img)
+    
+    # Parse response
+    text = response.text.strip()
+    # Remove markdown fences if present
+    text = text.replace('```json', '').replace('```', '').strip()
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        logger.error(f"Failed to parse Gemini response: {text}")
+        raise
+    
+    return {
+        'is_valid': data.get('is_valid', True),
+        'confidence': data.get('confidence', 0.5),
+        'reason': data.get('reason', ''),
+        'detected_content': data.get('detected_content', ''),
+        'method': 'GEMINI_VISION'
+    }
+
 @api_view(['POST'])
+@admission.endpoint('media')
 def validate_issue_image(request):
     """
     Validate if uploaded image is relevant to civic issues.
@@ -177,64 +461,9 @@ def validate_issue_image(request):
         })
     
     try:
-        # Fetch image using existing utility
-        from civix_ml.image_model import fetch_image
-        img = fetch_image(image_url)
-        
-        if not img:
-            return Response({'is_valid': False, 'reason': 'Failed to load image'})
-        
-        # Use Gemini Vision (same model already in use)
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        
-        prompt = f"""
-        Analyze this image for a civic issue report (category: {category}).
-        
-        Determine if the image is VALID or SPAM:
-        
-        VALID = Shows actual civic infrastructure problems:
-        - Potholes, road damage, cracks
-        - Broken public facilities (streetlights, benches, signs)
-        - Water/sewage leaks
-        - Garbage accumulation
-        - Damaged sidewalks, curbs
-        - Any real public infrastructure issue
-        
-        SPAM = Irrelevant content:
-        - Selfies, portraits, group photos
-        - Food, meals, restaurants
-        - Memes, screenshots, text-only images
-        - Indoor scenes (unless clearly public building issue)
-        - Random objects unrelated to civic issues
-        - Pets, animals (unless stray/safety hazard)
-        
-        Return ONLY this JSON (no markdown):
-        {{
-            "is_valid": boolean,
-            "confidence": 0.0 to 1.0,
-            "reason": "brief explanation",
-            "detected_content": "what you see in the image"
-        }}
-        """
-        
-        response = model.generate_content([prompt, img])
-        
-        # Parse response
-        text = response.text.strip()
-        # Remove markdown fences if present
-        text = text.replace('```json', '').replace('```', '').strip()
-        data = json.loads(text)
-        
-        return Response({
-            'is_valid': data.get('is_valid', True),
-            'confidence': data.get('confidence', 0.5),
-            'reason': data.get('reason', ''),
-            'detected_content': data.get('detected_content', ''),
-            'method': 'GEMINI_VISION'
-        })
+        return Response(validate_image(image_url, category))
         
     except json.JSONDecodeError as e:
-        logger.error(f"Failed to parse Gemini response: {e}, Response: {text if 'text' in locals() else 'N/A'}")
         return Response({
             'is_valid': True,
             'confidence': 0.0,
@@ -251,3 +480,342 @@ def validate_issue_image(request):
             'requires_manual_review': True
         })
 
+# --- BACKGROUND JOBS ---
+def _remove_spooled_file(payload):
+    if os.path.exists(payload['path']):
+        os.remove(payload['path'])
+
+@jobs.register('transcribe_audio', concurrency=1, max_retries=2, cleanup=_remove_spooled_file)
+def _transcribe_job(payload):
+    return {'text': transcribe_file(payload['path'], payload.get('mime_type'))}
+
+def _remove_incident_inputs(payload):
+    for path in (payload['vectors'], payload['issues']):
+        if os.path.exists(path):
+            os.remove(path)
+
+@jobs.register('cluster_incidents', concurrency=1, max_retries=1, cleanup=_remove_incident_inputs)
+def _cluster_incidents_job(payload):
+    radius_km = payload.get('radius_km')
+    ids, vectors, coords = incidents.load_run(payload['vectors'], payload['issues'], with_coords=bool(radius_km))
+    labels, stats = incidents.cluster(
+        vectors, threshold=payload['threshold'], coords=coords, radius_km=radius_km, dim=payload.get('project_dim'),
+    )
+    run_id = incidents.save(ids, labels)
+    # Incident size feeds the officer queue scores
+    sizes = np.bincount(labels, minlength=len(ids))[labels]
+    reranked = ranking.set_cluster_sizes(dict(zip(ids, sizes.tolist())))
+    return {'run_id': run_id, **stats, 'reranked': reranked, 'groups': incidents.groups_from(ids, labels)}
+
+@jobs.register('validate_issue_image', concurrency=4, max_retries=2)
+def _validate_image_job(payload):
+    return validate_image(payload['imageUrl'], payload.get('category', 'General'))
+
+@jobs.register('generate_caption', concurrency=4, max_retries=1)
+def _caption_job(payload):
+    return {'description': generate_caption(payload['imageUrl'])}
+
+@api_view(['POST'])
+def submit_job(request, job_type):
+    """
+    Queue slow work and return a job id immediately (202).
+    POST /api/jobs/submit/transcribe-audio/      multipart `audio`
+    POST /api/jobs/submit/validate-issue-image/  {"imageUrl", "category"}
+    POST /api/jobs/submit/generate-caption/      {"imageUrl"}
+    An optional `webhook` URL on ML_WEBHOOK_ORIGINS receives the result when the job finishes.
+    """
+    job_type = job_type.replace('-', '_')
+    webhook = request.data.get('webhook')
+    if webhook and not jobs.webhook_allowed(webhook):
+        return Response({"error": "webhook must be on one of ML_WEBHOOK_ORIGINS"}, status=400)
+
+    if job_type == 'transcribe_audio':
+        rejected = uploads.rejection(request)
+        if rejected:
+            return Response({"error": rejected}, status=413)
+        audio_file = request.FILES.get('audio')
+        if not audio_file:
+            return Response({"error": "No audio file provided"}, status=400)
+        # The upload is already in the spool; the job takes it over without a copy.
+        payload = {'path': uploads.detach(audio_file), 'name': audio_file.name, 'mime_type': audio_file.content_type}
+    else:
+        if not request.data.get('imageUrl'):
+            return Response({"error": "imageUrl is required"}, status=400)
+        payload = {'imageUrl': request.data['imageUrl'], 'category': request.data.get('category', 'General')}
+
+    try:
+        job_id = jobs.submit(job_type, payload, webhook=webhook)
+    except ValueError as e:
+        if 'path' in payload:
+            _remove_spooled_file(payload)
+        return Response({"error": str(e)}, status=404)
+    return Response({"job_id": job_id, "status": jobs.QUEUED}, status=202)
+
+@api_view(['GET'])
+def job_status(request, job_id):
+    job = jobs.get(job_id)
+    if not job:
+        return Response({"error": "Job not found"}, status=404)
+    return Response({
+        "job_id": job['id'],
+        "type": job['type'],
+        "status": job['status'],
+        "attempts": job['attempts'],
+        "error": job['error'],
+        "created_at": job['created_at'],
+        "updated_at": job['updated_at'],
+    })
+
+@api_view(['GET'])
+def job_result(request, job_id):
+    job = jobs.get(job_id)
+    if not job:
+        return Response({"error": "Job not found"}, status=404)
+    if job['status'] == jobs.SUCCEEDED:
+        return Response({"job_id": job_id, "status": job['status'], "result": job['result']})
+    if job['status'] == jobs.FAILED:
+        return Response({"job_id": job_id, "status": job['status'], "error": job['error']}, status=409)
+    return Response({"job_id": job_id, "status": job['status']}, status=202)
+
+@api_view(['GET', 'POST'])
+def feedback_view(request):
+    """
+    Moderator corrections for the local models (see api/feedback.py).
+    POST {"corrections": [{"task": "priority" | "category" | "fake",
+                           "title", "description" (or "text"), "label", "issue_id"}]}
+    GET  -> correction counts per status and the current model versions.
+    """
+    if not model_registry.available():
+        return Response({"error": "Local models are not installed on this instance"}, status=503)
+    if request.method == 'GET':
+        return Response(feedback.stats())
+
+    corrections = request.data.get('corrections')
+    if corrections is None:
+        corrections = [request.data]
+    try:
+        accepted, errors = feedback.record(corrections)
+    except Exception as e:
+        logger.error(f"Feedback error: {e}")
+        return Response({"error": str(e)}, status=500)
+    return Response({"accepted": accepted, "errors": errors}, status=202 if accepted else 400)
+
+@api_view(['GET', 'POST'])
+def category_centroids_view(request):
+    """
+    Labelled examples for the embedding categorizer (see api/centroids.py).
+    POST {"items": [{"category", "text" | "embedding"}]}
+    GET  -> usable categories with their example counts.
+    """
+    if not embeddings.backend_name():
+        return Response({"error": "No embedding backend configured"}, status=503)
+    if request.method == 'GET':
+        return Response(centroids.stats())
+
+    items = request.data.get('items')
+    if not isinstance(items, list) or not items:
+        return Response({"error": "items must be a non-empty list"}, status=400)
+    try:
+        vectors = [(item['category'], item['embedding']) for item in items if item.get('embedding')]
+        texts = [(item['category'], item['text']) for item in items if not item.get('embedding')]
+        added = centroids.add(vectors) if vectors else {}
+        for category, n in (centroids.add_texts(texts, endpoint_class='bulk') if texts else {}).items():
+            added[category] = added.get(category, 0) + n
+    except (KeyError, ValueError) as e:
+        return Response({"error": f"Invalid item: {e}"}, status=400)
+    except Exception as e:
+        logger.error(f"Centroid update error: {e}")
+        return Response({"error": str(e)}, status=500)
+    return Response({"added": added})
+
+@api_view(['POST'])
+def hotspots_ingest(request):
+    """
+    Fold new issues into the hotspot grid (see api/hotspots.py).
+    Body: {"events": [{"id", "lat", "lng", "category", "created_at"}]} or a single event.
+    """
+    events = request.data.get('events')
+    if events is None:
+        events = [request.data]
+    if not isinstance(events, list):
+        return Response({"error": "events must be a list"}, status=400)
+    try:
+        recorded, skipped, errors = hotspots.record(events)
+    except Exception as e:
+        logger.error(f"Hotspot ingest error: {e}")
+        return Response({"error": str(e)}, status=500)
+    return Response({"recorded": recorded, "skipped": skipped, "errors": errors})
+
+@api_view(['GET'])
+def hotspots_view(request):
+    """GET /api/hotspots/?category=Roads&limit=10&bursting=1 - top emerging clusters."""
+    try:
+        limit = min(int(request.query_params.get('limit', 10)), 100)
+        return Response({
+            "generated_at": time.time(),
+            "clusters": hotspots.hotspots(
+                category=request.query_params.get('category') or None,
+                limit=limit,
+                bursting_only=request.query_params.get('bursting') in ('1', 'true'),
+            ),
+        })
+    except ValueError as e:
+        return Response({"error": f"Invalid query: {e}"}, status=400)
+    except Exception as e:
+        logger.error(f"Hotspot query error: {e}")
+        return Response({"error": str(e)}, status=500)
+
+INCIDENT_UPLOAD_BYTES = int(os.getenv('INCIDENT_UPLOAD_MB', '512')) * 1024 * 1024
+
+@api_view(['POST'])
+def cluster_incidents(request):
+    """
+    Queue a clustering run over all open issues (see api/incidents.py); 202 + job id.
+    JSON / msgpack: {"issues": [{"id", "embedding" | "embedding_b64", "lat", "lng"}], "dtype", "dim"}
+    Multipart, for large runs: `vectors` = .npy (n, d) float32 / float16 / int8 and
+        `issues` = JSON [{"id", "lat", "lng"}] in the same row order (field or file).
+    Options: threshold (0.92), radius_km, project_dim, webhook.
+    """
+    uploads.allow(request, INCIDENT_UPLOAD_BYTES)
+    rejected = uploads.rejection(request)
+    if rejected:
+        return Response({"error": rejected}, status=413)
+
+    vectors_path = issues_path = None
+    try:
+        threshold = float(request.data.get('threshold') or incidents.DEFAULT_THRESHOLD)
+        if not 0 < threshold <= 1:
+            raise ValueError("threshold must be in (0, 1]")
+        radius_km = float(request.data['radius_km']) if request.data.get('radius_km') else None
+        project_dim = int(request.data['project_dim']) if request.data.get('project_dim') else None
+
+        upload = request.FILES.get('vectors')
+        if upload:
+            # `issues` may be a file part too: form fields are capped at DATA_UPLOAD_MAX_MEMORY_SIZE.
+            issues_file = request.FILES.get('issues')
+            items = json.load(issues_file) if issues_file else json.loads(request.data.get('issues') or '[]')
+        else:
+            items = request.data.get('issues') or []
+        if len(items) < 2:
+            raise ValueError("at least two issues are required")
+        issues = incidents.issue_rows(items)
+
+        if upload:
+            vectors_path = uploads.detach(upload)
+        else:
+            if items[0].get('embedding_b64'):
+                dtype, dim = request.data.get('dtype', 'int8'), int(request.data['dim'])
+                vectors = np.concatenate([quantize.from_base64(i['embedding_b64'], dtype, dim) for i in items])
+            else:
+                vectors = np.asarray([i['embedding'] for i in items], dtype=np.float32)
+            vectors_path = incidents.spool_vectors(vectors)
+        issues_path = incidents.spool_issues(issues)
+        incidents.load_run(vectors_path, issues_path)  # shape check before queueing
+
+        payload = {'vectors': vectors_path, 'issues': issues_path, 'threshold': threshold,
+                   'radius_km': radius_km, 'project_dim': project_dim}
+        job_id = jobs.submit('cluster_incidents', payload, webhook=request.data.get('webhook'))
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        _remove_incident_inputs({'vectors': vectors_path or '', 'issues': issues_path or ''})
+        return Response({"error": f"Invalid request: {e}"}, status=400)
+    return Response({"job_id": job_id, "status": jobs.QUEUED, "issues": len(issues)}, status=202)
+
+@api_view(['GET'])
+def incident_of_issue(request, issue_id):
+    """The incident an issue was grouped into by the latest clustering run."""
+    incident = incidents.incident_of(issue_id)
+    if not incident:
+        return Response({"error": "Issue was not part of the latest clustering run"}, status=404)
+    return Response(incident)
+
+@api_view(['POST'])
+def ranking_update(request):
+    """
+    Insert or update issues in the officer work queues (see api/ranking.py).
+    Body: {"issues": [{"id", "status", "officer", "category", "priority", "upvotes", "created_at", "lat", "lng"}]}
+    or a single issue. Later updates only need "id" and the fields that changed.
+    """
+    issues = request.data.get('issues')
+    if issues is None:
+        issues = [request.data]
+    if not isinstance(issues, list):
+        return Response({"error": "issues must be a list"}, status=400)
+    try:
+        updated, errors = ranking.update(issues)
+    except Exception as e:
+        logger.error(f"Ranking update error: {e}")
+        return Response({"error": str(e)}, status=500)
+    return Response({"updated": updated, "errors": errors})
+
+@api_view(['GET'])
+def ranking_queue(request):
+    """GET /api/ranking/queue/?officer=<id> or ?category=Roads, &limit=20&offset=0 - open issues, most urgent first."""
+    officer = request.query_params.get('officer')
+    category = request.query_params.get('category')
+    if not officer and not category:
+        return Response({"error": "officer or category is required"}, status=400)
+    try:
+        limit = min(int(request.query_params.get('limit', 20)), 500)
+        offset = max(int(request.query_params.get('offset', 0)), 0)
+        return Response(ranking.queue(officer=officer, category=category, limit=limit, offset=offset))
+    except ValueError as e:
+        return Response({"error": f"Invalid query: {e}"}, status=400)
+    except Exception as e:
+        logger.error(f"Ranking query error: {e}")
+        return Response({"error": str(e)}, status=500)
+
+# --- Draft pre-classification (see api/drafts.py) ---
+
+@drafts.stage('priority', fallback={'priority': 'Medium', 'confidence': 0.0})
+def _draft_priority(title, description):
+    return _priority(f"{title} {description}".strip())[0]
+
+@drafts.stage('fake', fallback={'is_fake': False, 'confidence': 0.0})
+def _draft_fake(title, description):
+    return _fake(f"{title} {description}")[0]
+
+@drafts.stage('embedding', fallback={'embedding': []})
+def _draft_embedding(title, description):
+    text = title + " " + description
+    if not embeddings.backend_name():
+        return None
+    vector = embeddings.embed_text(text)
+    try:
+        return {'embedding': vector, **_categorize(text, vector)}
+    except Exception as e:
+        logger.error(f"Categorize Error: {e}")
+        return {'embedding': vector}
+
+@api_view(['POST'])
+def draft_analyze(request):
+    """
+    Body: {"draft_token"?, "title", "description"}. Called by the report form
+    (debounced) while the citizen types; the analysis runs in the background.
+    Returns {"draft_token", "ready": [stages], "pending": [stages]}. Keep the
+    token and send it with the submit.
+    """
+    title = request.data.get('title', '')
+    description = request.data.get('description', '')
+    if not isinstance(title, str) or not isinstance(description, str):
+        return Response({"error": "title and description must be strings"}, status=400)
+    try:
+        return Response(drafts.analyze(request.data.get('draft_token'), title, description))
+    except Exception as e:
+        logger.error(f"Draft analyze error: {e}")
+        return Response({"error": str(e)}, status=500)
+
+@api_view(['POST'])
+@admission.endpoint('triage')
+def draft_resolve(request):
+    """
+    Body: {"draft_token"?, "title", "description"} at submit time. Returns
+    {"priority", "fake", "embedding"} - the predict-priority, detect-fake and
+    get-embedding (categorize) responses - and "draft": full | partial | miss.
+    Stages the draft already has for this exact text cost nothing.
+    """
+    title = request.data.get('title', '')
+    description = request.data.get('description', '')
+    if not isinstance(title, str) or not isinstance(description, str):
+        return Response({"error": "title and description must be strings"}, status=400)
+    results, hit = drafts.resolve(request.data.get('draft_token'), title, description)
+    return Response({**results, 'draft': hit})
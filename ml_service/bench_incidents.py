@@ -0,0 +1,65 @@
+"""
+Incident clustering cost (api/incidents.py) on synthetic embeddings with
+planted duplicate chains.
+
+    python bench_incidents.py [--sizes 10000,20000] [--dim 768] [--project-dim 256]
+
+Reports wall time, tracemalloc peak and whether every planted chain came out
+as exactly one incident. The last column extrapolates to 100k issues (the
+pairwise pass is quadratic).
+"""
+import argparse
+import os
+import time
+import tracemalloc
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'civix_ml.settings_inference')
+
+import django  # noqa: E402
+
+django.setup()
+
+import numpy as np  # noqa: E402
+
+from api import incidents  # noqa: E402
+
+CHAIN_LENGTH = 3
+NOISE = 0.15  # per-dimension jitter between consecutive chain members
+
+
+def synthetic(n, dim, seed=0):
+    """Random vectors where every third of the first 10% forms a near-duplicate chain."""
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim), dtype=np.float32)
+    truth = np.arange(n)
+    for start in range(0, n // 10 - CHAIN_LENGTH, CHAIN_LENGTH):
+        for k in range(1, CHAIN_LENGTH):
+            vectors[start + k] = vectors[start + k - 1] + rng.standard_normal(dim, dtype=np.float32) * NOISE
+            truth[start + k] = start
+    return vectors, truth
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10000,20000')
+    parser.add_argument('--dim', type=int, default=768)
+    parser.add_argument('--project-dim', type=int, default=None)
+    parser.add_argument('--threshold', type=float, default=0.9)
+    args = parser.parse_args()
+
+    print(f"{'issues':>8}{'dim':>6}{'seconds':>9}{'peak MiB':>10}{'pairs':>8}{'exact':>7}{'100k est s':>12}")
+    for n in (int(s) for s in args.sizes.split(',')):
+        vectors, truth = synthetic(n, args.dim)
+        tracemalloc.start()
+        start = time.perf_counter()
+        labels, stats = incidents.cluster(vectors, threshold=args.threshold, dim=args.project_dim)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        exact = bool((labels == truth).all())
+        print(f"{n:>8}{stats['dim']:>6}{elapsed:>9.2f}{peak / 2**20:>10.0f}{stats['pairs']:>8}{str(exact):>7}"
+              f"{elapsed * (100_000 / n) ** 2:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
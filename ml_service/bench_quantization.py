@@ -0,0 +1,88 @@
+"""
+Payload / storage / recall@k report for compact embeddings.
+
+    python bench_quantization.py                       # synthetic clustered vectors
+    python bench_quantization.py embeddings.jsonl      # {"embedding": [...]} per line
+
+Every variant is compared against exact float32 cosine search: recall@k is
+the overlap between its top-k and the float32 top-k, averaged over queries.
+"""
+import json
+import sys
+import time
+
+import numpy as np
+
+from api import quantize
+
+N_VECTORS = 20000
+N_QUERIES = 200
+DIM = 768
+K = 10
+
+VARIANTS = [
+    ('float32', None),
+    ('float16', None),
+    ('int8', None),
+    ('float16', 256),
+    ('int8', 256),
+    ('int8', 128),
+]
+
+
+def synthetic(n, dim, clusters=200, seed=0):
+    """Clustered vectors, closer to real issue embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim))
+    labels = rng.integers(0, clusters, n)
+    return (centres[labels] + 0.6 * rng.standard_normal((n, dim))).astype(np.float32)
+
+
+def load(path):
+    with open(path) as f:
+        return np.array([json.loads(line)['embedding'] for line in f if line.strip()], dtype=np.float32)
+
+
+def json_bytes(vectors):
+    return np.mean([len(json.dumps(v.tolist())) for v in vectors[:500].astype(np.float64)])
+
+
+def exact_top_k(queries, corpus, k):
+    scores = quantize.normalize(queries) @ quantize.normalize(corpus).T
+    return [set(np.argsort(-row)[:k]) for row in scores]
+
+
+def main():
+    vectors = load(sys.argv[1]) if len(sys.argv) > 1 else synthetic(N_VECTORS, DIM)
+    rng = np.random.default_rng(1)
+    query_idx = rng.choice(len(vectors), min(N_QUERIES, len(vectors)), replace=False)
+    # Perturbed copies of corpus vectors, so the queries are not exact matches.
+    queries = vectors[query_idx] + 0.3 * rng.standard_normal((len(query_idx), vectors.shape[1])).astype(np.float32)
+    dim = vectors.shape[1]
+    truth = exact_top_k(queries, vectors, K)
+
+    print(f"{len(vectors)} vectors x {dim} dims, {len(queries)} queries, k={K}\n")
+    print(f"{'variant':<16}{'bytes/vec':>11}{'base64 B':>10}{'vs json':>9}{'recall@k':>10}{'ms/query':>10}")
+    print(f"{'json float64':<16}{json_bytes(vectors):>11.0f}{'-':>10}{'1.0x':>9}{'-':>10}{'-':>10}")
+
+    baseline = json_bytes(vectors)
+    for dtype, reduced in VARIANTS:
+        codes, _ = quantize.quantize(vectors, dtype=dtype, dim=reduced)
+        query_codes, _ = quantize.quantize(queries, dtype=dtype, dim=reduced)
+        out_dim = codes.shape[1]
+
+        start = time.perf_counter()
+        hits = 0
+        for q, expected in zip(query_codes, truth):
+            idx, _ = quantize.top_k(q, codes, K)
+            hits += len(expected & set(idx.tolist()))
+        elapsed = (time.perf_counter() - start) * 1000 / len(queries)
+
+        size = quantize.nbytes(dtype, out_dim)
+        b64 = len(quantize.to_base64(codes[:1]))
+        name = f"{dtype}" + (f"/{reduced}" if reduced else "")
+        print(f"{name:<16}{size:>11}{b64:>10}{baseline / b64:>8.1f}x{hits / (K * len(queries)):>10.3f}{elapsed:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Serialization cost per endpoint: DRF's stdlib JSON vs orjson (and msgpack when
+installed), plus the wire size after gzip / zstd.
+
+    python bench_serialization.py
+
+Payloads mirror what the backend actually sends: find-duplicates with the 100
+most recent open issues, full embedding vectors, resolution-time batches.
+"""
+import gzip
+import io
+import os
+import random
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'civix_ml.settings_inference')
+
+import django  # noqa: E402
+
+django.setup()
+
+from rest_framework.parsers import JSONParser  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from api import middleware, renderers  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+ROUNDS = 50
+EMBEDDING_DIM = 768
+
+WORDS = ("pothole water leak street light garbage overflow drain blocked road "
+         "broken near market school park bridge traffic signal sewage").split()
+
+
+def sentence(n, rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(n))
+
+
+def payloads():
+    rng = random.Random(0)
+    issues = [{'_id': f'{i:024x}', 'complaintId': f'CIV-{i:05d}', 'title': sentence(5, rng),
+               'description': sentence(60, rng)} for i in range(100)]
+    vectors = [[rng.uniform(-0.1, 0.1) for _ in range(EMBEDDING_DIM)] for _ in range(100)]
+    batch = [{'id': f'{i:024x}', 'category': rng.choice(['Roads', 'Water', 'Electricity']),
+              'priority': rng.choice(['Low', 'Medium', 'High']), 'lat': 28.6 + rng.random() / 10,
+              'lng': 77.2 + rng.random() / 10, 'created_at': '2026-03-01T10:00:00Z'} for i in range(500)]
+    return {
+        'find-duplicates (request)': {'candidate': issues[0], 'existing_issues': issues},
+        'index-issues (request)': {'issues': issues * 10},
+        'get-embedding (response)': {'embedding': vectors[0]},
+        'get-embeddings/batch (100 vectors)': {'items': [{'id': i, 'embedding': v} for i, v in enumerate(vectors)]},
+        'predict-resolution-time/batch (request)': {'issues': batch},
+        'predict-resolution-time/batch (response)': {'predictions': [
+            {'id': b['id'], 'p50_days': 4.5, 'p90_days': 11.25, 'confidence': 'medium'} for b in batch]},
+    }
+
+
+def timed(fn):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    return (time.perf_counter() - start) * 1000 / ROUNDS
+
+
+def codecs():
+    entries = [
+        ('drf json', JSONRenderer(), JSONParser()),
+        ('orjson', renderers.ORJSONRenderer(), renderers.ORJSONParser()),
+    ]
+    if settings.MSGPACK_ENABLED:
+        entries.append(('msgpack', renderers.MessagePackRenderer(), renderers.MessagePackParser()))
+    return entries
+
+
+def main():
+    encodings = ['gzip'] + (['zstd'] if middleware.ZSTD_AVAILABLE else [])
+    header = f"{'payload':<42}{'codec':<10}{'render ms':>10}{'parse ms':>10}{'bytes':>10}"
+    header += ''.join(f"{e:>10}" for e in encodings) + f"{'gzip ms':>9}"
+    print(header)
+    for name, data in payloads().items():
+        for codec, renderer, parser in codecs():
+            body = renderer.render(data, renderer.media_type)
+            render_ms = timed(lambda: renderer.render(data, renderer.media_type))
+            parse_ms = timed(lambda: parser.parse(io.BytesIO(body), parser.media_type, {}))
+            sizes = ''.join(f"{len(middleware.compress(body, e)):>10}" for e in encodings)
+            gzip_ms = timed(lambda: gzip.compress(body, compresslevel=middleware.GZIP_LEVEL))
+            print(f"{name:<42}{codec:<10}{render_ms:>10.3f}{parse_ms:>10.3f}{len(body):>10}{sizes}{gzip_ms:>9.3f}")
+        print()
+    if not settings.MSGPACK_ENABLED:
+        print("msgpack not installed - msgpack rows skipped")
+    if not middleware.ZSTD_AVAILABLE:
+        print("zstandard not installed - zstd column skipped")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Audio upload cost: Django's default upload handlers followed by the old
+`temp_<name>` copy in the working directory, against the streaming handler
+(api/uploads.py) that writes each chunk once into a private spool file.
+
+    python bench_upload.py [--sizes 1,2,5,20] [--rounds 5]
+
+Reports wall time per MB and peak Python heap (tracemalloc) while the
+multipart body is parsed and the file is made available on disk.
+"""
+import argparse
+import os
+import time
+import tracemalloc
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'civix_ml.settings_inference')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.files.uploadedfile import SimpleUploadedFile  # noqa: E402
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+
+from api import uploads  # noqa: E402
+
+MB = 1024 * 1024
+
+
+def make_request(size):
+    audio = SimpleUploadedFile('complaint.webm', os.urandom(size), content_type='audio/webm')
+    return RequestFactory().post('/api/transcribe-audio/', {'audio': audio})
+
+
+def legacy(request):
+    request.upload_handlers = [MemoryFileUploadHandler(request), TemporaryFileUploadHandler(request)]
+    audio_file = request.FILES['audio']
+    temp_path = f"temp_{audio_file.name}"
+    with open(temp_path, 'wb+') as destination:
+        for chunk in audio_file.chunks():
+            destination.write(chunk)
+    os.remove(temp_path)
+    request.close()
+
+
+def streaming(request):
+    audio_file = request.FILES['audio']
+    with uploads.local_path(audio_file) as path:
+        os.stat(path)
+    request.close()
+
+
+def measure(fn, size, rounds):
+    elapsed, peak = 0.0, 0
+    for _ in range(rounds):
+        request = make_request(size)
+        tracemalloc.start()
+        start = time.perf_counter()
+        fn(request)
+        elapsed += time.perf_counter() - start
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return elapsed * 1000 / rounds / (size / MB), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1,2,5,20', help='upload sizes in MB, comma separated')
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'size':>8}{'handler':>12}{'ms / MB':>10}{'peak KiB':>11}")
+    for size_mb in (float(s) for s in args.sizes.split(',')):
+        size = int(size_mb * MB)
+        for name, fn in (('default', legacy), ('streaming', streaming)):
+            ms_per_mb, peak = measure(fn, size, args.rounds)
+            print(f"{size_mb:>6g}MB{name:>12}{ms_per_mb:>10.2f}{peak / 1024:>11.0f}")
+    leftovers = [f for f in os.listdir(settings.ML_UPLOAD_DIR) if f.startswith('upload-')]
+    print(f"\nspool files left behind: {len(leftovers)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Seed the embedding categorizer (api/centroids.py) from a labelled dataset.
+
+    python build_centroids.py                               # datasets/civic_data.csv
+    python build_centroids.py --per-category 200 --reset
+    python build_centroids.py --dataset my_issues.csv --category-column category
+
+Uses whichever embedding backend the service is configured with
+(LOCAL_EMBEDDING_MODEL or Gemini) and only adds to existing centroids unless
+--reset is given. Texts are embedded in provider-sized batches, so the full
+5,000-row dataset is about 50 Gemini embedding calls.
+Labels are stored in the service vocabulary (api/categories.py), so the
+dataset's 'Water Supply' rows build the Water centroid.
+"""
+import argparse
+import os
+import time
+
+import pandas as pd
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'civix_ml.settings_inference')
+
+import django  # noqa: E402
+
+django.setup()
+
+from api import centroids, embeddings  # noqa: E402
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATASET = os.path.join(BASE_DIR, 'datasets', 'civic_data.csv')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--dataset', default=DEFAULT_DATASET)
+    parser.add_argument('--text-column', default='text')
+    parser.add_argument('--category-column', default='category')
+    parser.add_argument('--per-category', type=int, default=0, help='sample at most N rows per category (0 = all)')
+    parser.add_argument('--reset', action='store_true', help='drop the existing centroids for this backend first')
+    args = parser.parse_args()
+
+    if not embeddings.backend_name():
+        raise SystemExit("No embedding backend configured (set GEMINI_API_KEY or LOCAL_EMBEDDING_MODEL)")
+
+    df = pd.read_csv(args.dataset).dropna(subset=[args.text_column, args.category_column])
+    if args.per_category:
+        df = df.groupby(args.category_column, group_keys=False).apply(
+            lambda group: group.sample(min(len(group), args.per_category), random_state=0))
+    items = list(zip(df[args.category_column].astype(str), df[args.text_column].astype(str)))
+
+    if args.reset:
+        centroids.reset()
+    start = time.perf_counter()
+    added = centroids.add_texts(items)
+    elapsed = time.perf_counter() - start
+
+    print(f"{embeddings.backend_name()}: embedded {len(items)} examples in {elapsed:.1f}s")
+    for category, count in sorted(centroids.stats()['categories'].items()):
+        print(f"  {category:<20}{count:>6}  (+{added.get(category, 0)})")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,26 +1,31 @@
-import google.generativeai as genai
-import requests
-from PIL import Image
 from io import BytesIO
 import os
 import logging
+from civix_ml.startup import lazy_module
+from api import admission, prompts, upstream
 
 logger = logging.getLogger(__name__)
 
 # Re-use the existing Gemini configuration if possible, or re-configure safely
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+GEMINI_API_KEY = upstream.api_key(os.getenv("GEMINI_API_KEY"))
+
+def _configure_genai(module):
+    if GEMINI_API_KEY:
+        module.configure(api_key=GEMINI_API_KEY)
+
+# Heavy imports are deferred until an image endpoint is actually hit
+get_genai = upstream.genai(lazy_module('google.generativeai', on_load=_configure_genai))
+get_pil_image = lazy_module('PIL.Image')
 
 def get_gemini_vision_model():
     # Use 2.5 Flash for vision tasks
-    return genai.GenerativeModel('gemini-2.5-flash')
+    return get_genai().GenerativeModel('gemini-2.5-flash')
 
 def fetch_image(url):
     try:
-        response = requests.get(url, stream=True)
+        response = upstream.fetch(url, stream=True)
         response.raise_for_status()
-        return Image.open(BytesIO(response.content))
+        return get_pil_image().open(BytesIO(response.content))
     except Exception as e:
         logger.error(f"Failed to fetch image: {e}")
         return None
@@ -35,10 +40,9 @@ def analyze_image_url(image_url):
             return {'tags': [], 'is_safe': True, 'confidence': 0}
 
         model = get_gemini_vision_model()
-        prompt = "Identify the main objects and context in this image. Return a JSON list of tags (max 5) and a safety check."
-        
         # Gemini 2.5 Flash handles text + images
-        response = model.generate_content([prompt, img])
+        with admission.admit('gemini'):
+            response = prompts.generate(model, prompts.ANALYZE_IMAGE.build(), img)
         
         if response and response.text:
             text = response.text.lower()
@@ -65,7 +69,8 @@ def generate_caption(image_url):
         if not img: return ""
         
         model = get_gemini_vision_model()
-        response = model.generate_content(["Provide a short, descriptive caption for this image.", img])
+        with admission.admit('gemini'):
+            response = prompts.generate(model, prompts.GENERATE_CAPTION.build(), img)
         
         return response.text.strip() if response else ""
     except Exception as e:
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import importlib.util
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -46,6 +48,7 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'api.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -121,3 +124,99 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = 'static/'
+
+
+# API wire formats: orjson for application/json, msgpack as an alternative
+# content type when the package is installed (api/renderers.py). Responses
+# are compressed with zstd / gzip by api.middleware.CompressionMiddleware.
+
+MSGPACK_ENABLED = importlib.util.find_spec('msgpack') is not None
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ] + (['api.renderers.MessagePackRenderer'] if MSGPACK_ENABLED else []),
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ] + (['api.renderers.MessagePackParser'] if MSGPACK_ENABLED else []),
+}
+
+
+# Cold start
+# Modules imported (and timed) when the WSGI app boots, leaves first so each
+# entry shows its own cost. Heavy SDKs are not listed here on purpose; they are
+# loaded lazily by the endpoints that use them.
+
+STARTUP_PRELOAD = [
+    'rest_framework.decorators',
+    'api.renderers',
+    'civix_ml.image_model',
+    'api.advanced_ai',
+    'api.views',
+    'api.urls',
+]
+
+COLD_START_BUDGET_MS = int(os.getenv('COLD_START_BUDGET_MS', '1500'))
+
+COLD_START_STRICT = os.getenv('COLD_START_STRICT', '') == '1'
+
+
+# Background jobs (api/jobs.py): job table lives in the SQLite file,
+# uploaded audio waits in the spool directory until its job has run.
+# The same file holds feedback, centroids, hotspots, incidents, ranking and
+# drafts, so every worker must point at one writable, shared path.
+
+ML_JOBS_DB = os.getenv('ML_JOBS_DB', str(BASE_DIR / 'db.sqlite3'))
+
+ML_JOBS_SPOOL_DIR = BASE_DIR / 'job_spool'
+
+
+# Uploads (api/uploads.py): multipart files stream straight into private temp
+# files in the job spool, so handing one to a job needs no second copy.
+
+FILE_UPLOAD_HANDLERS = ['api.uploads.CappedTempFileUploadHandler']
+
+ML_UPLOAD_DIR = ML_JOBS_SPOOL_DIR
+
+ML_MAX_UPLOAD_BYTES = int(os.getenv('ML_MAX_UPLOAD_MB', '25')) * 1024 * 1024
+
+
+# Traffic capture / replay (api/capture.py). Off unless ML_CAPTURE_DIR or
+# ML_REPLAY_FILES is set; replay_capture.py re-sends what was captured.
+
+ML_CAPTURE_DIR = os.getenv('ML_CAPTURE_DIR') or None
+
+ML_CAPTURE_RATE = float(os.getenv('ML_CAPTURE_RATE', '0.01'))
+
+ML_CAPTURE_MAX_BODY_BYTES = int(os.getenv('ML_CAPTURE_MAX_BODY_KB', '1024')) * 1024
+
+ML_CAPTURE_REDACTORS = [
+    path for path in os.getenv('ML_CAPTURE_REDACTORS', 'api.capture.redact_contact_details').split(',') if path
+]
+
+ML_REPLAY_FILES = [path for path in os.getenv('ML_REPLAY_FILES', '').split(',') if path]
+
+ML_REPLAY_LATENCY = os.getenv('ML_REPLAY_LATENCY', '1') != '0'
+
+CAPTURE_MIDDLEWARE = ['api.capture.CaptureMiddleware'] if ML_CAPTURE_DIR or ML_REPLAY_FILES else []
+
+MIDDLEWARE = MIDDLEWARE[:1] + CAPTURE_MIDDLEWARE + MIDDLEWARE[1:]
+
+
+# Service state that is written at runtime (approved reply templates) lives
+# outside the source tree. ML_ADMIN_TOKEN guards the endpoints that write it
+# (api/permissions.py); without a token they are read-only.
+
+ML_STATE_DIR = os.getenv('ML_STATE_DIR', os.path.join(os.path.expanduser('~'), '.civix_ml'))
+
+ML_ADMIN_TOKEN = os.getenv('ML_ADMIN_TOKEN') or None
+
+# Job webhooks (api/jobs.py) are only sent to these origins.
+
+ML_WEBHOOK_ORIGINS = [
+    origin for origin in os.getenv('ML_WEBHOOK_ORIGINS', os.getenv('BACKEND_URL', 'http://localhost:5000')).split(',')
+    if origin
+]
@@ -0,0 +1,47 @@
+"""
+Slim settings profile for serving inference only.
+
+The admin, sessions, auth and messages apps are dropped and the ORM has no
+DATABASES. The service still keeps state: jobs, feedback, category
+centroids, hotspots, incidents, ranking and drafts all live in the SQLite
+file at ML_JOBS_DB. Every worker that serves the API (and the job runners)
+must see the same writable file there. Use it on the autoscaled dynos with
+DJANGO_SETTINGS_MODULE=civix_ml.settings_inference.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+DEBUG = os.getenv('DJANGO_DEBUG', '') == '1'
+
+INSTALLED_APPS = [
+    'rest_framework',
+    'corsheaders',
+    'api',
+]
+
+MIDDLEWARE = [
+    'corsheaders.middleware.CorsMiddleware',
+    *CAPTURE_MIDDLEWARE,
+    'api.middleware.CompressionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+]
+
+ROOT_URLCONF = 'civix_ml.urls_inference'
+
+TEMPLATES = []
+
+DATABASES = {}
+
+AUTH_PASSWORD_VALIDATORS = []
+
+USE_I18N = False
+
+# No auth app installed: DRF must not try to build request.user
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_RENDERER_CLASSES': ['api.renderers.ORJSONRenderer']
+    + (['api.renderers.MessagePackRenderer'] if MSGPACK_ENABLED else []),
+    'DEFAULT_AUTHENTICATION_CLASSES': [],
+    'DEFAULT_PERMISSION_CLASSES': [],
+    'UNAUTHENTICATED_USER': None,
+}
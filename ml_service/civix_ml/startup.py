@@ -0,0 +1,100 @@
+"""
+Cold-start instrumentation for the Civix ML service.
+
+Every module imported through this helper is timed, so the health endpoint can
+show where startup time goes and the WSGI entrypoint can enforce a budget.
+Heavy SDKs (Gemini, PIL, ...) are wrapped with `lazy_module` and only imported
+the first time an endpoint actually needs them.
+"""
+import importlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# module name -> {'ms': float, 'phase': 'startup' | 'lazy'}
+IMPORT_TIMES = {}
+_lock = threading.Lock()
+_startup_total_ms = None
+
+
+def timed_import(name, phase='lazy'):
+    """Import `name` and record how long the (first) import took."""
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    with _lock:
+        if name not in IMPORT_TIMES:
+            IMPORT_TIMES[name] = {'ms': round(elapsed_ms, 2), 'phase': phase}
+    if phase == 'lazy':
+        logger.info(f"Lazy import of {name} took {elapsed_ms:.1f} ms")
+    return module
+
+
+def lazy_module(name, on_load=None):
+    """
+    Return a zero-arg loader for `name`. The module is imported (and timed)
+    on the first call only; `on_load(module)` runs once right after import.
+    """
+    state = {}
+    load_lock = threading.Lock()
+
+    def loader():
+        module = state.get('module')
+        if module is not None:
+            return module
+        with load_lock:
+            if 'module' not in state:
+                module = timed_import(name)
+                if on_load:
+                    on_load(module)
+                state['module'] = module
+        return state['module']
+
+    return loader
+
+
+def preload(modules):
+    """Import the service modules eagerly at boot, timing each one."""
+    global _startup_total_ms
+    start = time.perf_counter()
+    for name in modules:
+        try:
+            timed_import(name, phase='startup')
+        except Exception as e:
+            logger.error(f"Startup import of {name} failed: {e}")
+    _startup_total_ms = round((time.perf_counter() - start) * 1000, 2)
+    return _startup_total_ms
+
+
+def check_budget(budget_ms, strict=False):
+    """
+    Compare the measured startup imports against `budget_ms`.
+    Logs the slowest modules when over budget; raises if `strict`.
+    """
+    if not budget_ms or _startup_total_ms is None:
+        return True
+    if _startup_total_ms <= budget_ms:
+        logger.info(f"Cold start imports: {_startup_total_ms:.1f} ms (budget {budget_ms} ms)")
+        return True
+
+    slowest = sorted(
+        ((n, t['ms']) for n, t in IMPORT_TIMES.items() if t['phase'] == 'startup'),
+        key=lambda item: item[1],
+        reverse=True,
+    )[:5]
+    message = (
+        f"Cold start imports took {_startup_total_ms:.1f} ms, over the {budget_ms} ms budget. "
+        f"Slowest: {', '.join(f'{n}={ms:.0f}ms' for n, ms in slowest)}"
+    )
+    if strict:
+        raise RuntimeError(message)
+    logger.warning(message)
+    return False
+
+
+def report():
+    with _lock:
+        modules = dict(IMPORT_TIMES)
+    return {'startup_ms': _startup_total_ms, 'modules': modules}
@@ -2,6 +2,7 @@ import pandas as pd
 import numpy as np
 import joblib
 import os
+import sys
 from sklearn.pipeline import Pipeline
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.linear_model import SGDClassifier
@@ -12,12 +13,16 @@ from sklearn.model_selection import train_test_split
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATASET_PATH = os.path.join(BASE_DIR, '..', 'datasets', 'civic_data.csv')
 MODELS_DIR = os.path.join(BASE_DIR, 'models')
+sys.path.insert(0, os.path.join(BASE_DIR, '..'))
+from api.model_registry import in_validation_split
 
 if not os.path.exists(MODELS_DIR):
     os.makedirs(MODELS_DIR)
 
 print(f"Loading dataset from {DATASET_PATH}...")
 df = pd.read_csv(DATASET_PATH)
+# The validation split scores online checkpoints (api/feedback.py), so it is never trained on
+df = df[~df['text'].map(in_validation_split)]
 
 # --- 1. Train Priority Model ---
 print("Training Priority Model...")
@@ -53,4 +58,10 @@ fake_pipe.fit(X, y_fake)
 joblib.dump(fake_pipe, os.path.join(MODELS_DIR, 'fake_model.pkl'))
 print("Fake Detection Model Saved.")
 
+# --- 4. Train Char N-gram Pre-filter ---
+print("Training Char N-gram Pre-filter...")
+from api.prefilter import train_char_model
+train_char_model(DATASET_PATH, os.path.join(MODELS_DIR, 'charngram_fake.json'))
+print("Char N-gram Pre-filter Saved.")
+
 print("All models trained successfully!")
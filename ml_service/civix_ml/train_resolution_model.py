@@ -0,0 +1,35 @@
+"""
+Train the local resolution-time model.
+
+Usage:
+    node backend/scripts/export_resolved_issues.js resolved.jsonl
+    python civix_ml/train_resolution_model.py resolved.jsonl
+"""
+import json
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, '..'))
+
+from api.resolution_model import MODEL_PATH, ResolutionModel
+
+
+def load_records(path):
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.json'):
+            return json.load(f)
+        return [json.loads(line) for line in f if line.strip()]
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    records = load_records(sys.argv[1])
+    print(f"Loaded {len(records)} resolved issues from {sys.argv[1]}")
+    model = ResolutionModel.fit(records)
+    model.save(MODEL_PATH)
+    print(f"Trained on {model.trained_on} issues (workload slope {model.beta:+.4f} log-days/task)")
+    print(f"Resolution Model Saved to {MODEL_PATH}")
@@ -15,15 +15,10 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path
 
-from django.http import JsonResponse
-
-def root_health(request):
-    return JsonResponse({"status": "running", "service": "Civix ML"})
+from civix_ml import urls_inference
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/', include('api.urls')),
-    path('', root_health),
-]
+] + urls_inference.urlpatterns
@@ -0,0 +1,14 @@
+"""
+URL configuration for the inference-only profile (no admin site).
+"""
+from django.urls import path, include
+
+from django.http import JsonResponse
+
+def root_health(request):
+    return JsonResponse({"status": "running", "service": "Civix ML"})
+
+urlpatterns = [
+    path('api/', include('api.urls')),
+    path('', root_health),
+]
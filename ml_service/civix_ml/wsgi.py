@@ -9,8 +9,23 @@ https://docs.djangoproject.com/en/6.0/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
+from civix_ml import startup
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'civix_ml.settings')
 
 application = get_wsgi_application()
+
+# Import the API modules now (instead of on the first request) and time them
+startup.preload(getattr(settings, 'STARTUP_PRELOAD', []))
+startup.check_budget(
+    getattr(settings, 'COLD_START_BUDGET_MS', 0),
+    strict=getattr(settings, 'COLD_START_STRICT', False),
+)
+
+# Resume background jobs interrupted by the previous shutdown
+from api import jobs  # noqa: E402
+
+jobs.recover_interrupted()
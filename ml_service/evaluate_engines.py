@@ -0,0 +1,394 @@
+"""
+Offline evaluation harness: accuracy / F1 against latency and cost for every
+engine that can answer a task.
+
+    python evaluate_engines.py                          # local engines only
+    python evaluate_engines.py --engines all --limit 100   # + Gemini-backed endpoints
+    python evaluate_engines.py --json eval_report.json
+
+Tasks and engines:
+    priority / category / fake   sklearn models (current registry checkpoint), batched
+    fake                         local pre-filter (abstains on unclear text)
+    category                     embedding centroids (api/centroids.py; abstains
+                                 when the margin is too small for the LLM-free path)
+    duplicate                    MinHash signature similarity
+    all of the above             `service`: the live view functions, i.e. the
+                                 pre-filter / MinHash stage + Gemini cascade
+
+Datasets: datasets/civic_data.csv (the sklearn models were trained on all of
+it except the validation split, so their numbers there are mostly in-sample)
+and the hand-labelled hold-outs datasets/holdout_labelled.csv and
+datasets/holdout_duplicates.csv.
+
+The threshold sweep under the matrix shows, per confidence cut-off, how much
+traffic an engine could answer on its own and how accurate it is there.
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASETS_DIR = os.path.join(BASE_DIR, 'datasets')
+
+LABELLED_SETS = {
+    'civic_data': os.path.join(DATASETS_DIR, 'civic_data.csv'),
+    'holdout': os.path.join(DATASETS_DIR, 'holdout_labelled.csv'),
+}
+DUPLICATE_SET = os.path.join(DATASETS_DIR, 'holdout_duplicates.csv')
+
+TASK_COLUMNS = {'priority': 'priority', 'category': 'category', 'fake': 'is_fake'}
+
+LATENCY_SAMPLE = 200  # single-request timings per local engine
+CONFIDENCE_THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.98]
+SIMILARITY_THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.9]
+
+# USD per 1M tokens (gemini-1.5-flash list price); ~4 characters per token.
+GEMINI_INPUT_PRICE = float(os.getenv('GEMINI_INPUT_PRICE_PER_M', '0.075'))
+GEMINI_OUTPUT_PRICE = float(os.getenv('GEMINI_OUTPUT_PRICE_PER_M', '0.30'))
+CHARS_PER_TOKEN = 4
+
+
+# --- 1. Metrics ---
+
+def accuracy(y_true, y_pred):
+    return float(np.mean(np.asarray(y_true) == np.asarray(y_pred))) if len(y_true) else 0.0
+
+
+def macro_f1(y_true, y_pred):
+    y_true, y_pred = np.asarray(y_true), np.asarray(y_pred)
+    scores = []
+    for label in np.unique(y_true):
+        tp = np.sum((y_pred == label) & (y_true == label))
+        fp = np.sum((y_pred == label) & (y_true != label))
+        fn = np.sum((y_pred != label) & (y_true == label))
+        scores.append(2 * tp / (2 * tp + fp + fn) if tp else 0.0)
+    return float(np.mean(scores)) if scores else 0.0
+
+
+def binary_scores(y_true, y_pred):
+    y_true, y_pred = np.asarray(y_true, dtype=bool), np.asarray(y_pred, dtype=bool)
+    tp = np.sum(y_true & y_pred)
+    precision = tp / max(1, np.sum(y_pred))
+    recall = tp / max(1, np.sum(y_true))
+    f1 = 2 * precision * recall / (precision + recall) if tp else 0.0
+    return float(precision), float(recall), float(f1)
+
+
+def percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 3) if samples else None
+
+
+# --- 2. Engines ---
+# Each engine returns (predictions, confidences, single_request_latencies, cost_per_1k).
+# A prediction of None means the engine abstained.
+
+class GeminiMeter:
+    """Counts Gemini calls made by the view functions to estimate cost."""
+
+    def __init__(self):
+        self.calls = self.input_chars = self.output_chars = 0
+
+    def wrap(self, ask):
+        def metered(prompt, *args, **kwargs):
+            reply = ask(prompt, *args, **kwargs)
+            self.calls += 1
+            self.input_chars += len(prompt)
+            self.output_chars += len(reply or '')
+            return reply
+        return metered
+
+    def cost_per_1k(self, requests):
+        if not requests:
+            return 0.0
+        dollars = (self.input_chars * GEMINI_INPUT_PRICE + self.output_chars * GEMINI_OUTPUT_PRICE) / CHARS_PER_TOKEN / 1e6
+        return round(dollars / requests * 1000, 4)
+
+
+def sklearn_engine(task, texts):
+    from api import model_registry
+    _, model = model_registry.current(task)  # latest checkpoint, including online updates
+    probabilities = model.predict_proba(texts)  # one vectorized pass over the whole set
+    predictions = model.classes_[probabilities.argmax(axis=1)]
+
+    latencies = []
+    for text in random.Random(0).sample(list(texts), min(LATENCY_SAMPLE, len(texts))):
+        start = time.perf_counter()
+        model.predict_proba([text])
+        latencies.append(time.perf_counter() - start)
+    return list(predictions), list(probabilities.max(axis=1)), latencies, 0.0
+
+
+def prefilter_engine(task, texts):
+    from api import prefilter
+    predictions, confidences, latencies = [], [], []
+    for text in texts:
+        start = time.perf_counter()
+        verdict, signals = prefilter.classify(text, 'detect_fake')
+        latencies.append(time.perf_counter() - start)
+        if verdict is None:
+            predictions.append(None)
+            confidences.append(None)
+        else:
+            predictions.append(int(verdict['is_fake']))
+            confidences.append(max(signals['spam_probability'], 1 - signals['spam_probability']))
+    return predictions, confidences, latencies, 0.0
+
+
+def _setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'civix_ml.settings_inference')
+    import django
+    django.setup()
+
+
+def _call_view(view, body):
+    from rest_framework.test import APIRequestFactory
+    request = APIRequestFactory().post('/', body, format='json')
+    return view(request).data
+
+
+def service_engine(task, texts):
+    _setup_django()
+    from api import views
+    meter = GeminiMeter()
+    original = views.ask_gemini
+    views.ask_gemini = meter.wrap(original)
+    view, field = {
+        'priority': (views.predict_priority, 'priority'),
+        'category': (views.categorize, 'category'),
+        'fake': (views.detect_fake, 'is_fake'),
+    }[task]
+
+    predictions, confidences, latencies = [], [], []
+    try:
+        for text in texts:
+            start = time.perf_counter()
+            data = _call_view(view, {'title': '', 'description': text})
+            latencies.append(time.perf_counter() - start)
+            value = data.get(field)
+            predictions.append(int(bool(value)) if task == 'fake' else value)
+            confidences.append(data.get('confidence', data.get('fake_confidence')))
+    finally:
+        views.ask_gemini = original
+    return predictions, confidences, latencies, meter.cost_per_1k(len(texts))
+
+
+def centroid_engine(task, texts):
+    """Latency covers the dot product only: in the service the embedding already exists."""
+    _setup_django()
+    from api import centroids, embeddings
+    vectors = []
+    for offset in range(0, len(texts), embeddings.batch_size()):
+        vectors.extend(embeddings.embed_texts(texts[offset:offset + embeddings.batch_size()]))
+
+    predictions, confidences, latencies = [], [], []
+    for vector in vectors:
+        start = time.perf_counter()
+        verdict = centroids.classify(vector)
+        latencies.append(time.perf_counter() - start)
+        if verdict and verdict['decisive']:
+            predictions.append(verdict['category'])
+            confidences.append(verdict['confidence'])
+        else:
+            predictions.append(None)
+            confidences.append(None)
+    return predictions, confidences, latencies, 0.0
+
+
+def centroids_ready():
+    _setup_django()
+    from api import centroids
+    return centroids.ready()
+
+
+def minhash_similarity(pairs):
+    """Estimated Jaccard from MinHash signatures: one numpy comparison per pair."""
+    from api import minhash
+    start = time.perf_counter()
+    left = np.stack([minhash.signature(minhash.shingles(a)) for a, _ in pairs])
+    right = np.stack([minhash.signature(minhash.shingles(b)) for _, b in pairs])
+    similarity = (left == right).mean(axis=1)
+    per_pair = (time.perf_counter() - start) / max(1, len(pairs))
+    return similarity, [per_pair] * len(pairs)
+
+
+def duplicate_minhash_engine(pairs):
+    from api import minhash
+    similarity, latencies = minhash_similarity(pairs)
+    return list((similarity >= minhash.NEAR_DUPLICATE_THRESHOLD).astype(int)), list(similarity), latencies, 0.0
+
+
+def duplicate_service_engine(pairs):
+    _setup_django()
+    from api import advanced_ai, views
+    meter = GeminiMeter()
+    original = advanced_ai.ask_gemini
+    advanced_ai.ask_gemini = meter.wrap(original)
+    predictions, confidences, latencies = [], [], []
+    try:
+        for a, b in pairs:
+            start = time.perf_counter()
+            data = _call_view(views.find_duplicates, {'description': a, 'existing_reports': [b]})
+            latencies.append(time.perf_counter() - start)
+            predictions.append(int(bool(data.get('is_duplicate'))))
+            confidences.append(data.get('score'))
+    finally:
+        advanced_ai.ask_gemini = original
+    return predictions, confidences, latencies, meter.cost_per_1k(len(pairs))
+
+
+ENGINES = {
+    'priority': {'sklearn': sklearn_engine, 'service': service_engine},
+    'category': {'sklearn': sklearn_engine, 'centroid': centroid_engine, 'service': service_engine},
+    'fake': {'sklearn': sklearn_engine, 'prefilter': prefilter_engine, 'service': service_engine},
+}
+DUPLICATE_ENGINES = {'minhash': duplicate_minhash_engine, 'service': duplicate_service_engine}
+LOCAL_ENGINES = {'sklearn', 'prefilter', 'minhash'}
+
+
+# --- 3. Evaluation ---
+
+def summarize(task, engine, dataset, y_true, predictions, confidences, latencies, cost):
+    decided = [i for i, p in enumerate(predictions) if p is not None]
+    truth = [y_true[i] for i in decided]
+    chosen = [predictions[i] for i in decided]
+    row = {
+        'task': task,
+        'engine': engine,
+        'dataset': dataset,
+        'n': len(y_true),
+        'coverage': round(len(decided) / len(y_true), 4) if y_true else 0.0,
+        'accuracy': round(accuracy(truth, chosen), 4),
+        'f1': round(macro_f1(truth, chosen), 4),
+        'p50_ms': percentile_ms(latencies, 50),
+        'p99_ms': percentile_ms(latencies, 99),
+        'cost_per_1k_usd': cost,
+    }
+    if task in ('fake', 'duplicate'):
+        row['precision'], row['recall'], row['f1'] = (round(v, 4) for v in binary_scores(truth, chosen))
+    return row
+
+
+def threshold_sweep(y_true, predictions, confidences, thresholds):
+    """Coverage and accuracy when only answers at or above each confidence are kept."""
+    sweep = []
+    for t in thresholds:
+        kept = [i for i, c in enumerate(confidences)
+                if c is not None and predictions[i] is not None and c >= t]
+        sweep.append({
+            'threshold': t,
+            'coverage': round(len(kept) / len(y_true), 4) if y_true else 0.0,
+            'accuracy': round(accuracy([y_true[i] for i in kept], [predictions[i] for i in kept]), 4),
+        })
+    return sweep
+
+
+def sample_rows(df, limit, seed=0):
+    if limit and len(df) > limit:
+        return df.sample(limit, random_state=seed).reset_index(drop=True)
+    return df
+
+
+def selected(engine, wanted):
+    return 'all' in wanted or engine in wanted or (engine in LOCAL_ENGINES and 'local' in wanted)
+
+
+def evaluate(wanted, limit):
+    from api import categories
+    rows, sweeps, skipped = [], [], []
+    gemini_ready = bool(os.getenv('GEMINI_API_KEY'))
+
+    for dataset, path in LABELLED_SETS.items():
+        df = pd.read_csv(path)
+        for task, column in TASK_COLUMNS.items():
+            for engine, run in ENGINES[task].items():
+                if not selected(engine, wanted):
+                    continue
+                if engine == 'service' and not gemini_ready:
+                    skipped.append(f"{task}/{engine}/{dataset}: GEMINI_API_KEY not set")
+                    continue
+                if engine == 'centroid' and not centroids_ready():
+                    skipped.append(f"{task}/{engine}/{dataset}: no category centroids (run build_centroids.py)")
+                    continue
+                # Remote engines are slow and billed: score a fixed random sample.
+                data = df if engine in LOCAL_ENGINES else sample_rows(df, limit)
+                texts = data['text'].astype(str).tolist()
+                y_true = data[column].tolist()
+                predictions, confidences, latencies, cost = run(task, texts)
+                if task == 'category':
+                    # The service answers in api/categories.py's vocabulary; the datasets use older names
+                    y_true, predictions = ([categories.normalize(label) or label for label in labels]
+                                           for labels in (y_true, predictions))
+                rows.append(summarize(task, engine, dataset, y_true, predictions, confidences, latencies, cost))
+                sweeps.append({'task': task, 'engine': engine, 'dataset': dataset,
+                               'sweep': threshold_sweep(y_true, predictions, confidences, CONFIDENCE_THRESHOLDS)})
+
+    pairs_df = pd.read_csv(DUPLICATE_SET)
+    for engine, run in DUPLICATE_ENGINES.items():
+        if not selected(engine, wanted):
+            continue
+        if engine == 'service' and not gemini_ready:
+            skipped.append(f"duplicate/{engine}/holdout: GEMINI_API_KEY not set")
+            continue
+        data = pairs_df if engine in LOCAL_ENGINES else sample_rows(pairs_df, limit)
+        pairs = list(zip(data['text_a'], data['text_b']))
+        y_true = data['is_duplicate'].tolist()
+        predictions, confidences, latencies, cost = run(pairs)
+        rows.append(summarize('duplicate', engine, 'holdout', y_true, predictions, confidences, latencies, cost))
+        if engine == 'minhash':
+            similarity = np.asarray(confidences)
+            sweeps.append({'task': 'duplicate', 'engine': engine, 'dataset': 'holdout', 'sweep': [
+                {'threshold': t, **dict(zip(('precision', 'recall', 'f1'),
+                                            (round(v, 4) for v in binary_scores(y_true, similarity >= t))))}
+                for t in SIMILARITY_THRESHOLDS
+            ]})
+    return rows, sweeps, skipped
+
+
+# --- 4. Report ---
+
+def print_report(rows, sweeps, skipped):
+    header = (f"{'task':<10}{'engine':<11}{'dataset':<12}{'n':>6}{'cover':>7}{'acc':>7}{'F1':>7}"
+              f"{'p50 ms':>9}{'p99 ms':>9}{'$/1k':>8}")
+    print(header)
+    print('-' * len(header))
+    for r in rows:
+        print(f"{r['task']:<10}{r['engine']:<11}{r['dataset']:<12}{r['n']:>6}{r['coverage']:>7.2f}"
+              f"{r['accuracy']:>7.3f}{r['f1']:>7.3f}{r['p50_ms']:>9.3f}{r['p99_ms']:>9.3f}{r['cost_per_1k_usd']:>8.3f}")
+    print("\n(sklearn rows on civic_data are mostly in-sample: the pickles were trained on all but its validation split)")
+
+    print("\nThreshold sweep (answers kept at confidence >= t):")
+    for s in sweeps:
+        cells = '  '.join(
+            f"{p['threshold']:.2f}: " + (f"P={p['precision']:.2f} R={p['recall']:.2f}" if 'precision' in p
+                                          else f"cov={p['coverage']:.2f} acc={p['accuracy']:.2f}")
+            for p in s['sweep']
+        )
+        print(f"  {s['task']}/{s['engine']}/{s['dataset']}: {cells}")
+
+    for note in skipped:
+        print(f"skipped {note}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score every engine on the labelled datasets.")
+    parser.add_argument('--engines', nargs='+', default=['local'],
+                        help="local (default), all, or names: sklearn prefilter minhash service")
+    parser.add_argument('--limit', type=int, default=100, help="Rows per dataset for remote (billed) engines")
+    parser.add_argument('--json', help="Also write the full report to this file")
+    args = parser.parse_args()
+
+    rows, sweeps, skipped = evaluate(set(args.engines), args.limit)
+    print_report(rows, sweeps, skipped)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'matrix': rows, 'thresholds': sweeps, 'skipped': skipped}, f, indent=2)
+        print(f"\nReport written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
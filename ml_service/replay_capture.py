@@ -0,0 +1,173 @@
+"""
+Replay captured production traffic (api/capture.py) against a local instance.
+
+    ML_REPLAY_FILES='captures/*.jsonl.gz' gunicorn civix_ml.wsgi      # the server under test
+    python replay_capture.py 'captures/*.jsonl.gz' [--url http://localhost:8000]
+                             [--speed 1] [--workers 16] [--save run.json] [--baseline old.json]
+
+Requests are sent at their recorded spacing divided by --speed. With
+--speed 0 they go back to back, limited only by --workers. The server answers
+every upstream call from the same files, so two runs of one capture differ
+only by the code under test. Multipart uploads are re-sent as random bytes of
+the recorded sizes. Latency is counted from each request's scheduled time, so
+it includes any wait for a free worker. Restart the server between runs you
+compare, otherwise in-process caches such as api/result_cache.py start warm.
+
+Prints count, errors and p50 / p95 / p99 per endpoint next to the latency
+recorded in production, plus overall throughput. With --baseline it also
+prints the change against a run saved with --save.
+"""
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from api.capture import CAPTURE_ID_HEADER, read
+
+_ID_SEGMENT = re.compile(r'/(?=[^/]*\d)[^/]{8,}(?=/|$)')
+
+
+def endpoint(record):
+    """`POST /api/jobs/<id>/` style key, so per-id paths are grouped."""
+    return f"{record['method']} {_ID_SEGMENT.sub('/<id>', record['path'].split('?')[0])}"
+
+
+def request_kwargs(record):
+    headers = {CAPTURE_ID_HEADER: record['id']}
+    for key, value in record.get('headers', {}).items():
+        headers[key[len('HTTP_'):].replace('_', '-').title()] = value
+    if record.get('files') is not None:
+        return {'headers': headers, 'data': record.get('fields', {}), 'files': [
+            (f['field'], (f['name'], os.urandom(f['size']), f['content_type'])) for f in record['files']
+        ]}
+    if 'body' not in record:
+        return {'headers': headers}
+    headers['Content-Type'] = record['content_type'] or 'application/json'
+    body = record['body']
+    return {'headers': headers, 'data': body if isinstance(body, str) else json.dumps(body)}
+
+
+def percentiles(values):
+    if not values:
+        return {'p50': None, 'p95': None, 'p99': None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50': round(float(p50), 1), 'p95': round(float(p95), 1), 'p99': round(float(p99), 1)}
+
+
+def replay(records, url, speed, workers):
+    """Send every record; returns {endpoint: [(latency ms, ok)]} and the wall time."""
+    results = {}
+    lock = threading.Lock()
+    local = threading.local()
+
+    def send(record, scheduled):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        try:
+            response = local.session.request(record['method'], url + record['path'], timeout=300, **request_kwargs(record))
+            ok = response.status_code == record.get('status', response.status_code)
+        except requests.RequestException:
+            ok = False
+        latency = (time.perf_counter() - scheduled) * 1000
+        with lock:
+            results.setdefault(endpoint(record), []).append((latency, ok))
+
+    start = time.perf_counter()
+    t0 = records[0]['t']
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for record in records:
+            scheduled = start + ((record['t'] - t0) / speed if speed else 0)
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, record, scheduled if speed else time.perf_counter())
+    return results, time.perf_counter() - start
+
+
+def summarize(records, results, seconds):
+    recorded = {}
+    for record in records:
+        recorded.setdefault(endpoint(record), []).append(record.get('ms', 0))
+    summary = {'endpoints': {}}
+    for name, samples in sorted(results.items()):
+        summary['endpoints'][name] = {
+            'count': len(samples),
+            'errors': sum(not ok for _, ok in samples),
+            **percentiles([latency for latency, _ in samples]),
+            'recorded_p50': percentiles(recorded.get(name, []))['p50'],
+        }
+    total = sum(len(samples) for samples in results.values())
+    summary['total'] = {
+        'requests': total,
+        'errors': sum(e['errors'] for e in summary['endpoints'].values()),
+        'seconds': round(seconds, 2),
+        'throughput_rps': round(total / seconds, 2) if seconds else None,
+        **percentiles([latency for samples in results.values() for latency, _ in samples]),
+    }
+    return summary
+
+
+def change(new, old):
+    if new is None or not old:
+        return ''
+    return f"{(new - old) / old:+.0%}"
+
+
+def report(summary, baseline=None):
+    base = (baseline or {}).get('endpoints', {})
+    print(f"{'endpoint':<42}{'n':>6}{'err':>5}{'p50':>9}{'p95':>9}{'p99':>9}{'prod p50':>10}"
+          + (f"{'Δp50':>8}{'Δp95':>8}" if baseline else ''))
+    for name, e in summary['endpoints'].items():
+        line = f"{name[:41]:<42}{e['count']:>6}{e['errors']:>5}{e['p50']:>9}{e['p95']:>9}{e['p99']:>9}{e['recorded_p50']:>10}"
+        if baseline:
+            old = base.get(name, {})
+            line += f"{change(e['p50'], old.get('p50')):>8}{change(e['p95'], old.get('p95')):>8}"
+        print(line)
+    t = summary['total']
+    print(f"\n{t['requests']} requests, {t['errors']} errors in {t['seconds']}s: {t['throughput_rps']} req/s, "
+          f"p50 {t['p50']} ms, p95 {t['p95']} ms, p99 {t['p99']} ms")
+    if baseline:
+        b = baseline['total']
+        print(f"baseline: {b['throughput_rps']} req/s ({change(t['throughput_rps'], b['throughput_rps'])}), "
+              f"p95 {b['p95']} ms ({change(t['p95'], b['p95'])})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('files', nargs='+', help='capture files or globs')
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--speed', type=float, default=1.0, help='1 = recorded pace, 10 = ten times faster, 0 = flat out')
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--save', help='write the summary here as JSON')
+    parser.add_argument('--baseline', help='summary of an earlier run to compare against')
+    args = parser.parse_args()
+
+    captured = list(read(args.files))
+    records = [r for r in captured if not r.get('body_truncated')]
+    skipped = len(captured) - len(records)
+    if not records:
+        raise SystemExit("No replayable records in the capture files")
+    records.sort(key=lambda r: r['t'])
+    print(f"Replaying {len(records)} requests ({skipped} skipped: body over the capture limit) "
+          f"spanning {records[-1]['t'] - records[0]['t']:.0f}s at {args.speed or 'max'}x against {args.url}\n")
+
+    results, seconds = replay(records, args.url.rstrip('/'), args.speed, args.workers)
+    summary = summarize(records, results, seconds)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    report(summary, baseline)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
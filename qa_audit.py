@@ -1,10 +1,24 @@
+import argparse
+import bisect
+import hashlib
+import json
 import os
 import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 # ----------------- CONFIGURATION -----------------
 SRC_DIR = "src"
 BACKEND_DIR = "backend"
 SAFE_EXTENSIONS = {".jsx", ".js", ".tsx", ".ts"}
+SKIP_DIRS = {"node_modules", ".git", "dist", "build"}
+
+CACHE_FILE = ".qa_audit_cache.json"
+REPORT_FILE = "qa_audit_report.txt"
+ENGINE_VERSION = 2
+SERIAL_THRESHOLD = 32  # below this many files a process pool costs more than it saves
+SLOWEST_FILES = 10
 
 # ----------------- PATTERNS -----------------
 # 1. Missing Imports (Expanded)
@@ -16,6 +30,7 @@ COMMON_COMPONENTS = [
     "Helmet", "Loader2", "Lucide", # Icons/Utils
     "useState", "useEffect", "useRef", "useCallback", "useMemo" # React
 ]
+COMMON_COMPONENTS_SET = frozenset(COMMON_COMPONENTS)
 
 # 2. Mixed Config (Vite vs CRA)
 ENV_VARS_VITE_REGEX = r"import\.meta\.env"
@@ -24,115 +39,296 @@ ENV_VARS_CRA_REGEX = r"process\.env\.REACT_APP_"
 # 3. Backend Security
 BACKEND_ROUTE_REGEX = r"router\.(get|post|put|delete|patch)\s*\(\s*['\"]([^'\"]+)['\"]"
 AUTH_MIDDLEWARE_REGEX = r"(verifyToken|requireAuth|checkAuth|isAdmin|isModerator|clerkMiddleware)"
+PUBLIC_ROUTE_HINTS = ["login", "signup", "register", "public", "webhook"]
+
+# One alternation, scanned once per file. Order matters: comments and strings
+# are consumed before anything inside them can look like code.
+TOKEN_REGEX = re.compile(r"""
+      (?P<comment>//[^\n]*|/\*.*?\*/)
+    | (?P<import>\bimport\s+(?P<bindings>[\w$*{}\s,]+?)\s+from\s*['"][^'"\n]+['"])
+    | (?P<string>'(?:\\.|[^'\\\n])*'|"(?:\\.|[^"\\\n])*")
+    | (?P<vite_env>\bimport\.meta\.env\b)
+    | (?P<process_env>\bprocess\.env\b)
+    | (?P<require>\brequire\s*\()
+    | \b(?:const|let|var|function|class)\s+(?P<declared>[A-Za-z_$][\w$]*)
+    | (?P<ident>[A-Za-z_$][\w$]*)
+""", re.VERBOSE | re.DOTALL)
+ROUTE_REGEX = re.compile(BACKEND_ROUTE_REGEX)
+AUTH_REGEX = re.compile(AUTH_MIDDLEWARE_REGEX)
+
+# ----------------- RULES -----------------
+RULES = {
+    "QA001": ("missing-import", "warning", "Component or hook used without being imported or defined"),
+    "QA002": ("legacy-process-env", "note", "Legacy 'process.env' usage in a Vite project"),
+    "QA003": ("commonjs-require", "note", "CommonJS 'require()' usage in frontend code"),
+    "QA004": ("unprotected-route", "warning", "Backend route without auth middleware"),
+}
+CATEGORY = {"QA001": "FRONTEND", "QA002": "CONFIG", "QA003": "CONFIG", "QA004": "BACKEND-SEC"}
+
+
+def rules_fingerprint():
+    """Hash of this script: editing the scanners or patterns invalidates every cache entry."""
+    with open(os.path.abspath(__file__), "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+class LineIndex:
+    """Offset -> 1-based line number, only computed for offsets that become findings."""
+
+    def __init__(self, content):
+        self.starts = [m.end() for m in re.finditer("\n", content)]
+
+    def line(self, offset):
+        return bisect.bisect_right(self.starts, offset) + 1
+
+
+def finding(rule, line, message):
+    return {"rule": rule, "line": line, "message": message}
 
-def get_file_content(path):
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return f.read()
-    except:
-        return ""
 
-def scan_missing_imports(content, file_path):
+def parse_bindings(bindings):
+    """`React, { useState, Link as RouterLink }` -> {'React', 'useState', 'RouterLink'}"""
+    names = set()
+    for part in bindings.replace("{", ",").replace("}", ",").split(","):
+        words = part.split()
+        if words:
+            names.add(words[-1])  # `X as Y` and `* as Y` bind Y
+    return names
+
+
+# ----------------- SCANNERS -----------------
+def scan_frontend(content):
+    """Single tokenizing pass collecting usages, imports, declarations and env usage."""
+    first_use = {}
+    imported = set()
+    declared = set()
+    process_env_at = require_at = None
+
+    for match in TOKEN_REGEX.finditer(content):
+        kind = match.lastgroup
+        if kind == "ident":
+            name = match.group("ident")
+            if name in COMMON_COMPONENTS_SET and name not in first_use:
+                first_use[name] = match.start()
+        elif kind == "import":
+            imported |= parse_bindings(match.group("bindings"))
+        elif kind == "declared":
+            declared.add(match.group("declared"))
+        elif kind == "process_env" and process_env_at is None:
+            process_env_at = match.start()
+        elif kind == "require" and require_at is None:
+            require_at = match.start()
+
+    lines = LineIndex(content)
     issues = []
     for item in COMMON_COMPONENTS:
-        # Avoid matching substring (e.g. "Link" in "NavLink" or "Linked")
-        used_pattern = r'\b' + re.escape(item) + r'\b'
-        
-        # Ignored usage contexts:
-        # - Comments (// ...) -> Hard to filter perfectly with regex, but we assume code is cleanish
-        # - Variable definitions (const Link = ...)
-        
-        if re.search(used_pattern, content):
-            # Check if imported OR defined
-            is_imported = False
-            is_defined = False
-            
-            for line in content.splitlines():
-                if f"import" in line and item in line and "//" not in line:
-                    is_imported = True
-                    break
-                if re.search(r'\b(const|let|var|function|class)\s+' + re.escape(item) + r'\b', line):
-                     is_defined = True 
-                     break
-            
-            if not is_imported and not is_defined:
-                issues.append(f"Missing import for: {item}")
+        if item in first_use and item not in imported and item not in declared:
+            issues.append(finding("QA001", lines.line(first_use[item]), f"Missing import for: {item}"))
+    if process_env_at is not None:
+        issues.append(finding("QA002", lines.line(process_env_at),
+                              "Legacy 'process.env' usage detected (Use 'import.meta.env')"))
+    if require_at is not None:
+        issues.append(finding("QA003", lines.line(require_at),
+                              "CommonJS 'require()' usage detected (Use ES 'import')"))
     return issues
 
-def scan_env_conflicts(content, file_path):
-    issues = []
-    # If Vite project
-    if "process.env" in content:
-        issues.append("Legacy 'process.env' usage detected (Use 'import.meta.env')")
-    if "require(" in content:
-        issues.append("CommonJS 'require()' usage detected (Use ES 'import')")
-    return issues
 
 def scan_backend_security(content):
     issues = []
-    # Naive check: does the file define routes but usually lacks 'verifyToken'?
-    # Ideally we parse line by line.
-    
-    lines = content.splitlines()
-    for i, line in enumerate(lines):
-        match = re.search(BACKEND_ROUTE_REGEX, line)
+    for number, line in enumerate(content.splitlines(), start=1):
+        match = ROUTE_REGEX.search(line)
         if match:
             method, route = match.groups()
-            # Check if middleware is present in this line or nearby
-            if not re.search(AUTH_MIDDLEWARE_REGEX, line):
-                # Exceptions (Login/Signup/Public)
-                if any(x in route for x in ["login", "signup", "register", "public", "webhook"]):
-                    continue
-                issues.append(f"Potential Unprotected Route: {method.upper()} {route}")
+            # Middleware must be on the route line itself
+            if AUTH_REGEX.search(line):
+                continue
+            # Exceptions (Login/Signup/Public)
+            if any(x in route for x in PUBLIC_ROUTE_HINTS):
+                continue
+            issues.append(finding("QA004", number, f"Potential Unprotected Route: {method.upper()} {route}"))
     return issues
 
-def main():
-    print("--- 🕵️‍♂️ Senior Tester Audit Running ---")
-    
-    all_issues = []
-    
-    # SCAN FRONTEND
-    start_dir = os.path.join(os.getcwd(), SRC_DIR)
-    for root, dirs, files in os.walk(start_dir):
-        if "node_modules" in root: continue
-        for file in files:
-            if any(file.endswith(ext) for ext in SAFE_EXTENSIONS):
-                path = os.path.join(root, file)
-                rel_path = os.path.relpath(path, os.getcwd())
-                content = get_file_content(path)
-                
-                # Check 1: Imports
-                missing = scan_missing_imports(content, path)
-                for m in missing:
-                    all_issues.append(f"[FRONTEND] {rel_path}: {m}")
-                
-                # Check 2: Env Vars
-                envs = scan_env_conflicts(content, path)
-                for e in envs:
-                    all_issues.append(f"[CONFIG] {rel_path}: {e}")
-
-    # SCAN BACKEND
-    backend_dir = os.path.join(os.getcwd(), BACKEND_DIR)
-    for root, dirs, files in os.walk(backend_dir):
-        if "node_modules" in root: continue
+
+SCANNERS = {"frontend": scan_frontend, "backend": scan_backend_security}
+
+
+def audit_file(task):
+    """Worker: read, hash, and scan one file unless its hash matches the cached one."""
+    path, rel_path, kind, cached_hash = task
+    start = time.perf_counter()
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+    except OSError:
+        raw = b""
+    digest = hashlib.sha1(raw).hexdigest()
+    if digest == cached_hash:
+        return rel_path, digest, None, (time.perf_counter() - start) * 1000
+    content = raw.decode("utf-8", errors="replace")
+    issues = SCANNERS[kind](content)
+    return rel_path, digest, issues, (time.perf_counter() - start) * 1000
+
+
+# ----------------- DISCOVERY -----------------
+def walk(root, extensions):
+    for dirpath, dirs, files in os.walk(root):
+        dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
         for file in files:
-            if file.endswith(".js"):
-                path = os.path.join(root, file)
-                rel_path = os.path.relpath(path, os.getcwd())
-                content = get_file_content(path)
-                
-                # Check 3: Security
-                if "routes" in rel_path:
-                    sec_issues = scan_backend_security(content)
-                    for s in sec_issues:
-                        all_issues.append(f"[BACKEND-SEC] {rel_path}: {s}")
+            if os.path.splitext(file)[1] in extensions:
+                yield os.path.join(dirpath, file)
+
+
+def collect_tasks(base, cache):
+    tasks = []
+    for path in walk(os.path.join(base, SRC_DIR), SAFE_EXTENSIONS):
+        tasks.append((path, os.path.relpath(path, base), "frontend"))
+    for path in walk(os.path.join(base, BACKEND_DIR), {".js"}):
+        rel_path = os.path.relpath(path, base)
+        if "routes" in rel_path:
+            tasks.append((path, rel_path, "backend"))
+    return [(path, rel, kind, cache.get(rel, {}).get("hash")) for path, rel, kind in tasks]
+
+
+# ----------------- CACHE -----------------
+def load_cache(path, fingerprint):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data.get("files", {}) if data.get("fingerprint") == fingerprint else {}
+
+
+def save_cache(path, fingerprint, files):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": fingerprint, "files": files}, f)
+    os.replace(tmp, path)
+
+
+# ----------------- REPORTS -----------------
+def flatten(files):
+    results = []
+    for rel_path in sorted(files):
+        for issue in files[rel_path]["issues"]:
+            results.append({"path": rel_path.replace(os.sep, "/"), **issue})
+    return results
+
+
+def to_text(results):
+    return [f"[{CATEGORY[r['rule']]}] {r['path']}:{r['line']}: {r['message']}" for r in results]
+
+
+def to_json(results, stats):
+    return {"version": ENGINE_VERSION, "stats": stats, "results": results}
+
+
+def to_sarif(results, stats):
+    rule_ids = sorted(RULES)
+    return {
+        "$schema": "https://json.schemastore.org/sarif-2.1.0.json",
+        "version": "2.1.0",
+        "runs": [{
+            "tool": {"driver": {
+                "name": "qa_audit",
+                "version": str(ENGINE_VERSION),
+                "rules": [{
+                    "id": rule_id,
+                    "name": RULES[rule_id][0],
+                    "shortDescription": {"text": RULES[rule_id][2]},
+                    "defaultConfiguration": {"level": RULES[rule_id][1]},
+                } for rule_id in rule_ids],
+            }},
+            "results": [{
+                "ruleId": r["rule"],
+                "ruleIndex": rule_ids.index(r["rule"]),
+                "level": RULES[r["rule"]][1],
+                "message": {"text": r["message"]},
+                "locations": [{"physicalLocation": {
+                    "artifactLocation": {"uri": r["path"]},
+                    "region": {"startLine": r["line"]},
+                }}],
+            } for r in results],
+            "properties": {"stats": stats},
+        }],
+    }
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Static QA audit for the Civix frontend and backend.")
+    parser.add_argument("--root", default=os.getcwd(), help="Repository root (default: cwd)")
+    parser.add_argument("--format", choices=["text", "json", "sarif"], default="text")
+    parser.add_argument("--output", help=f"Report path (default: {REPORT_FILE} for text, stdout otherwise)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--no-cache", action="store_true", help="Rescan every file")
+    parser.add_argument("--fail-on-findings", action="store_true", help="Exit 1 when anything is reported")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    verbose = args.format == "text"
+    if verbose:
+        print("--- 🕵️‍♂️ Senior Tester Audit Running ---")
+
+    start = time.perf_counter()
+    base = os.path.abspath(args.root)
+    cache_path = os.path.join(base, CACHE_FILE)
+    fingerprint = rules_fingerprint()
+    cache = {} if args.no_cache else load_cache(cache_path, fingerprint)
+    tasks = collect_tasks(base, cache)
+
+    if args.jobs > 1 and len(tasks) >= SERIAL_THRESHOLD:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            outcomes = list(pool.map(audit_file, tasks, chunksize=max(1, len(tasks) // (args.jobs * 4))))
+    else:
+        outcomes = [audit_file(task) for task in tasks]
+
+    files = {}
+    timings = {}
+    cache_hits = 0
+    for rel_path, digest, issues, elapsed_ms in outcomes:
+        if issues is None:
+            issues = cache[rel_path]["issues"]
+            cache_hits += 1
+        files[rel_path] = {"hash": digest, "issues": issues}
+        timings[rel_path] = round(elapsed_ms, 3)
+    save_cache(cache_path, fingerprint, files)
+
+    results = flatten(files)
+    slowest = sorted(timings.items(), key=lambda item: item[1], reverse=True)[:SLOWEST_FILES]
+    stats = {
+        "files": len(files),
+        "scanned": len(files) - cache_hits,
+        "cached": cache_hits,
+        "findings": len(results),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        "file_ms": {path.replace(os.sep, "/"): ms for path, ms in sorted(timings.items())},
+    }
 
     # REPORT
-    print(f"\nTotal Issues Found: {len(all_issues)}")
-    with open("qa_audit_report.txt", "w", encoding="utf-8") as f:
-        for i, issue in enumerate(all_issues):
-            f.write(f"{i+1}. {issue}\n")
-            print(f"{i+1}. {issue}")
+    if args.format == "text":
+        lines = to_text(results)
+        print(f"\nTotal Issues Found: {len(lines)}")
+        with open(args.output or REPORT_FILE, "w", encoding="utf-8") as f:
+            for i, issue in enumerate(lines):
+                f.write(f"{i+1}. {issue}\n")
+                print(f"{i+1}. {issue}")
+        print(f"\nScanned {stats['scanned']} files ({stats['cached']} unchanged, cached) in {stats['elapsed_ms']} ms")
+        print("Slowest files:")
+        for path, ms in slowest:
+            print(f"  {ms:8.2f} ms  {path}")
+    else:
+        report = to_sarif(results, stats) if args.format == "sarif" else to_json(results, stats)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+        else:
+            json.dump(report, sys.stdout, indent=2)
+            print()
+
+    return 1 if args.fail_on_findings and results else 0
+
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -598,7 +598,7 @@ export default function ModeratorDashboard() {
                                         setAnalyzing(true); // Reuse analyzing state or local
                                         try {
                                             const token = await getToken();
-                                            const res = await csrfManager.secureFetch('/api/ml/generate-reply/', {
+                                            const res = await csrfManager.secureFetch('/api/ml/generate-reply/stream/', {
                                                 method: 'POST',
                                                 headers: {
                                                     'Content-Type': 'application/json',
@@ -607,11 +607,30 @@ export default function ModeratorDashboard() {
                                                 body: JSON.stringify({
                                                     description: selectedIssue.description,
                                                     status: statusAction.status,
+                                                    category: selectedIssue.category,
                                                     severity: selectedIssue.priority || 'Medium'
                                                 })
                                             });
-                                            const data = await res.json();
-                                            setActionRemarks(data.reply);
+                                            // Server-sent events: show tokens as they arrive
+                                            const reader = res.body.getReader();
+                                            const decoder = new TextDecoder();
+                                            let buffer = '';
+                                            let draft = '';
+                                            setActionRemarks('');
+                                            while (true) {
+                                                const { done, value } = await reader.read();
+                                                if (done) break;
+                                                buffer += decoder.decode(value, { stream: true });
+                                                const events = buffer.split('\n\n');
+                                                buffer = events.pop();
+                                                for (const evt of events) {
+                                                    const dataLine = evt.split('\n').find(line => line.startsWith('data: '));
+                                                    if (!dataLine) continue;
+                                                    const payload = JSON.parse(dataLine.slice(6));
+                                                    draft = evt.startsWith('event: done') ? payload.reply : draft + payload.delta;
+                                                    setActionRemarks(draft);
+                                                }
+                                            }
                                         } catch (e) { toast.error("AI Draft Failed"); }
                                         finally { setAnalyzing(false); }
                                     }}
@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useUser, useAuth } from "@clerk/clerk-react";
 import { toast } from 'react-hot-toast';
@@ -41,6 +41,28 @@ const ReportIssue = () => {
   const [isAnalyzingFiles, setIsAnalyzingFiles] = useState(false);
   const [aiCaption, setAiCaption] = useState(null);
 
+  // Draft Analysis: the ML service triages the text while it's typed, so submit doesn't wait on it
+  const draftTokenRef = useRef(null);
+  useEffect(() => {
+    const text = `${formData.title} ${formData.description}`.trim();
+    if (step !== 'form' || text.split(/\s+/).length < 3) return;
+
+    const timer = setTimeout(async () => {
+      try {
+        const token = await getToken();
+        const response = await csrfManager.secureFetch(`${API_BASE_URL}/api/ml/drafts/analyze/`, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json', 'Authorization': `Bearer ${token}` },
+          body: JSON.stringify({ draft_token: draftTokenRef.current, title: formData.title, description: formData.description })
+        });
+        if (response.ok) draftTokenRef.current = (await response.json()).draft_token;
+      } catch (error) {
+        console.warn("Draft analysis skipped:", error); // submit analyses the text itself
+      }
+    }, 1000);
+    return () => clearTimeout(timer);
+  }, [step, formData.title, formData.description]);
+
   // Type Selection Handler
   const handleTypeSelect = (type) => {
     setIssueType(type);
@@ -209,6 +231,7 @@ const ReportIssue = () => {
     data.append("issueType", issueType);
 
     data.append("phone", formData.contact);
+    if (draftTokenRef.current) data.append("draftToken", draftTokenRef.current);
     if (finalCoords) {
       data.append("lat", finalCoords.lat);
       data.append("lng", finalCoords.lng);